@@ -1,9 +1,9 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-import joblib
 import shap
-import os
+
+from gdm import GDMPredictor, shap_js
 
 # =========================
 # 页面设置
@@ -65,13 +65,14 @@ feature_labels = {
 THRESHOLD = 0.30
 
 # =========================
-# 加载模型
+# 加载预测器
 # =========================
 @st.cache_resource
-def load_model():
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"未找到模型文件：{MODEL_PATH}")
-    return joblib.load(MODEL_PATH)
+def load_predictor():
+    predictor = GDMPredictor(MODEL_PATH, metrics_path=None, feature_names=feature_names, threshold=THRESHOLD)
+    # 解释器随模型一起准备一次，之后每次解释直接复用
+    predictor.prepare_explainer()
+    return predictor
 
 # =========================
 # 构造输入
@@ -99,7 +100,7 @@ def get_input():
 # 主程序
 # =========================
 try:
-    model = load_model()
+    predictor = load_predictor()
     st.success("✅ 模型加载成功")
 except Exception as e:
     st.error(f"❌ 模型加载失败：{e}")
@@ -118,14 +119,9 @@ user_input = get_input()
 # =========================
 if st.button("🔍 预测 GDM 风险"):
     try:
-        if hasattr(model, "predict_proba"):
-            proba = model.predict_proba(user_input)[0][1]
-        else:
-            st.error("❌ 当前模型不支持 predict_proba。")
-            st.stop()
-
-        pred_label = 1 if proba >= THRESHOLD else 0
-        pred_text = "阳性（GDM）" if pred_label == 1 else "阴性（非GDM）"
+        prediction = predictor.predict(user_input)
+        proba = prediction.proba
+        pred_text = prediction.text
 
         st.markdown("---")
         st.markdown(f"## 🧪 预测结果：**{proba * 100:.2f}%**")
@@ -135,63 +131,26 @@ if st.button("🔍 预测 GDM 风险"):
         st.markdown("---")
         st.subheader("🎯 特征贡献解释（SHAP）")
 
-        if hasattr(model, "named_steps"):
-            step_names = list(model.named_steps.keys())
-            st.caption(f"检测到 Pipeline 步骤：{step_names}")
-            scaler = model.named_steps.get("scaler", None)
-            last_step_name = step_names[-1]
-            base_model = model.named_steps[last_step_name]
-            input_data = scaler.transform(user_input) if scaler is not None else user_input
-        else:
-            base_model = model
-            input_data = user_input
-
-        try:
-            explainer = shap.TreeExplainer(base_model)
-            shap_values = explainer.shap_values(input_data)
-
-            if isinstance(shap_values, list):
-                shap_values_single = shap_values[1][0] if len(shap_values) > 1 else shap_values[0][0]
-            else:
-                shap_values_single = shap_values[0]
-
-            expected_value = explainer.expected_value
-            if isinstance(expected_value, (list, np.ndarray)):
-                expected_value = expected_value[1] if len(expected_value) > 1 else expected_value[0]
-
-            force_plot = shap.force_plot(
-                expected_value,
-                shap_values_single,
-                input_data[0],
-                feature_names=[feature_labels.get(f, f) for f in feature_names],
-                matplotlib=False
-            )
-
-            st.components.v1.html(
-                shap.getjs() + force_plot.html(),
-                height=320,
-                width=900
-            )
-
-        except Exception as e1:
-            st.warning(f"⚠️ TreeExplainer 失败，尝试通用 Explainer：{e1}")
-
-            explainer = shap.Explainer(base_model, input_data)
-            shap_values = explainer(input_data)
-
-            force_plot = shap.force_plot(
-                explainer.expected_value,
-                shap_values.values[0],
-                input_data[0],
-                feature_names=[feature_labels.get(f, f) for f in feature_names],
-                matplotlib=False
-            )
-
-            st.components.v1.html(
-                shap.getjs() + force_plot.html(),
-                height=320,
-                width=900
-            )
+        if hasattr(predictor.model, "named_steps"):
+            st.caption(f"检测到 Pipeline 步骤：{list(predictor.model.named_steps.keys())}")
+
+        explanation = predictor.explain(user_input)
+        if explanation.fallback_reason is not None:
+            st.warning(f"⚠️ TreeExplainer 失败，已使用通用 Explainer：{explanation.fallback_reason}")
+
+        force_plot = shap.force_plot(
+            explanation.base_value,
+            explanation.values,
+            explanation.data,
+            feature_names=[feature_labels.get(f, f) for f in feature_names],
+            matplotlib=False
+        )
+
+        st.components.v1.html(
+            shap_js() + force_plot.html(),
+            height=320,
+            width=900
+        )
 
         st.markdown("🔴 红色特征推动预测为 GDM，🔵 蓝色特征推动预测为非 GDM。")
 
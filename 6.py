@@ -1,9 +1,10 @@
 import streamlit as st
-import numpy as np
 import pandas as pd
-import joblib
-import shap
-import os
+
+from gdm import FEATURE_NAMES, FEATURE_LABELS, INPUT_LABELS, INPUT_ORDER, GDMPredictor, build_model_input, quantize_raw_inputs
+from gdm.async_explain import ResultTimer, explain_and_render, submit
+from gdm.cache import input_key
+from gdm.worker_pool import get_scorer
 
 # =========================
 # 页面设置
@@ -21,65 +22,11 @@ st.markdown("本工具基于 XGBoost 模型预测个体是否患有 GDM。")
 MODEL_PATH = r"E:\新建文件夹\GDM相关\GDM\分析用的数据及代码\best_model_xgboost_14vars.pkl"
 
 # =========================
-# 模型内部实际使用的14个变量
-# 顺序必须与训练模型完全一致
-# =========================
-feature_names = [
-    "HDL-C",
-    "TC",
-    "LDL-C",
-    "TG",
-    "Glucose",
-    "lnCu+10",
-    "lnAs+10",
-    "lnPb+10",
-    "GGT",
-    "SF",
-    "ChE",
-    "PTA",
-    "lnCd+10",
-    "Tg"
-]
-
-# =========================
-# 网页输入名称（输入原始值）
-# =========================
-input_labels = {
-    "HDL-C": "高密度脂蛋白胆固醇（HDL-C）",
-    "TC": "总胆固醇（TC）",
-    "LDL-C": "低密度脂蛋白胆固醇（LDL-C）",
-    "TG": "甘油三酯（TG）",
-    "Glucose": "葡萄糖（Glucose）",
-    "Cu": "铜原始值（Cu）",
-    "As": "砷原始值（As）",
-    "Pb": "铅原始值（Pb）",
-    "GGT": "γ-谷氨酰转肽酶（GGT）",
-    "SF": "铁蛋白（SF）",
-    "ChE": "胆碱酯酶（ChE）",
-    "PTA": "凝血酶原活动度（PTA）",
-    "Cd": "镉原始值（Cd）",
-    "Tg": "甲状腺球蛋白（Tg）"
-}
-
-# =========================
-# 模型变量中文名称（SHAP/回显）
+# 变量名称（见 gdm/config.py）
 # =========================
-feature_labels = {
-    "HDL-C": "高密度脂蛋白胆固醇（HDL-C）",
-    "TC": "总胆固醇（TC）",
-    "LDL-C": "低密度脂蛋白胆固醇（LDL-C）",
-    "TG": "甘油三酯（TG）",
-    "Glucose": "葡萄糖（Glucose）",
-    "lnCu+10": "ln(Cu)+10（铜）",
-    "lnAs+10": "ln(As)+10（砷）",
-    "lnPb+10": "ln(Pb)+10（铅）",
-    "GGT": "γ-谷氨酰转肽酶（GGT）",
-    "SF": "铁蛋白（SF）",
-    "ChE": "胆碱酯酶（ChE）",
-    "PTA": "凝血酶原活动度（PTA）",
-    "lnCd+10": "ln(Cd)+10（镉）",
-    "Tg": "甲状腺球蛋白（Tg）"
-}
+feature_names = FEATURE_NAMES
+input_labels = INPUT_LABELS
+feature_labels = FEATURE_LABELS
 
 # =========================
 # 阈值
@@ -87,21 +34,17 @@ feature_labels = {
 THRESHOLD = 0.30
 
 # =========================
-# 加载模型
+# 加载预测器
+# 本页面不读取 metrics.json，固定使用上面的阈值
 # =========================
 @st.cache_resource
-def load_model():
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"未找到模型文件：{MODEL_PATH}")
-    return joblib.load(MODEL_PATH)
-
-# =========================
-# 原始值转换为 ln(x)+10
-# =========================
-def transform_ln_plus_10(x, var_name):
-    if x <= 0:
-        raise ValueError(f"{var_name} 原始值必须大于 0，才能进行 ln(x)+10 转换。")
-    return np.log(x) + 10
+def load_predictor():
+    predictor = GDMPredictor(MODEL_PATH, metrics_path=None, threshold=THRESHOLD)
+    # 解释器随模型一起准备一次，之后每次解释直接复用
+    predictor.prepare_explainer()
+    # 评分进程池随模型一起启动：判定与 SHAP 值在评分进程中计算，本进程只负责控件与图表
+    get_scorer(predictor)
+    return predictor
 
 # =========================
 # 构造输入
@@ -114,24 +57,7 @@ def get_input():
     raw_inputs_display = {}
     col1, col2 = st.columns(2)
 
-    input_order = [
-        "HDL-C",
-        "TC",
-        "LDL-C",
-        "TG",
-        "Glucose",
-        "Cu",
-        "As",
-        "Pb",
-        "GGT",
-        "SF",
-        "ChE",
-        "PTA",
-        "Cd",
-        "Tg"
-    ]
-
-    for i, item in enumerate(input_order):
+    for i, item in enumerate(INPUT_ORDER):
         label = input_labels.get(item, item)
         with col1 if i % 2 == 0 else col2:
             value = st.number_input(
@@ -144,126 +70,68 @@ def get_input():
             raw_inputs_display[item] = value
 
     try:
-        model_inputs = [
-            raw_inputs_display["HDL-C"],
-            raw_inputs_display["TC"],
-            raw_inputs_display["LDL-C"],
-            raw_inputs_display["TG"],
-            raw_inputs_display["Glucose"],
-            transform_ln_plus_10(raw_inputs_display["Cu"], "Cu"),
-            transform_ln_plus_10(raw_inputs_display["As"], "As"),
-            transform_ln_plus_10(raw_inputs_display["Pb"], "Pb"),
-            raw_inputs_display["GGT"],
-            raw_inputs_display["SF"],
-            raw_inputs_display["ChE"],
-            raw_inputs_display["PTA"],
-            transform_ln_plus_10(raw_inputs_display["Cd"], "Cd"),
-            raw_inputs_display["Tg"]
-        ]
+        user_input = build_model_input(quantize_raw_inputs(raw_inputs_display))
     except ValueError as e:
         st.error(f"❌ 输入值错误：{e}")
         return None, raw_inputs_display
 
-    return np.array([model_inputs], dtype=float), raw_inputs_display
+    return user_input, raw_inputs_display
 
 # =========================
 # 主程序
 # =========================
 try:
-    model = load_model()
+    predictor = load_predictor()
+    scorer = get_scorer(predictor)
     st.success("✅ 模型加载成功")
 except Exception as e:
     st.error(f"❌ 模型加载失败：{e}")
     st.stop()
 
-user_input, raw_inputs_display = get_input()
+# =========================
+# 输入表单：修改指标时不重跑脚本，点击提交后才计算
+# =========================
+with st.form("patient_form"):
+    user_input, raw_inputs_display = get_input()
+    submitted = st.form_submit_button("🔍 预测 GDM 风险")
 
 # =========================
 # 预测按钮
+# 本会话上一次的结果按输入保存在 session_state，无关的重跑直接显示，不重新计算解释
 # =========================
-if st.button("🔍 预测 GDM 风险"):
-    try:
-        if user_input is None:
-            st.stop()
+result_key = input_key(user_input) if user_input is not None else None
+last_result = st.session_state.get("last_result")
+if last_result is not None and last_result["key"] != result_key:
+    last_result = None
 
-        if hasattr(model, "predict_proba"):
-            proba = model.predict_proba(user_input)[0][1]
-        else:
-            st.error("❌ 当前模型不支持 predict_proba。")
-            st.stop()
-
-        pred_label = 1 if proba >= THRESHOLD else 0
-        pred_text = "阳性（GDM）" if pred_label == 1 else "阴性（非GDM）"
+# 输入有误（get_input 已提示）时跳过结果区，页面其余部分照常显示
+if user_input is not None and (submitted or last_result is not None):
+    try:
+        timer = ResultTimer()
+        prediction = scorer.predict(user_input)
+        proba = prediction.proba
+        pred_text = prediction.text
 
         st.markdown("---")
         st.markdown(f"## 🧪 预测结果：**{proba * 100:.2f}%**")
         st.markdown(f"### 🩺 判定：**{pred_text}**（阈值：{THRESHOLD:.2f}）")
         st.progress(min(max(float(proba), 0.0), 1.0))
+        timer.mark("verdict")
+        timing_slot = st.empty()
+        timing_slot.caption(timer.caption())
+
+        # SHAP 解释与力图 HTML 交给后台线程，先输出输入回显
+        shap_labels = [feature_labels.get(f, f) for f in feature_names]
+        if last_result is None:
+            explanation_job = submit(explain_and_render, scorer, user_input, shap_labels)
 
         # =========================
         # SHAP解释
         # =========================
         st.markdown("---")
         st.subheader("🎯 特征贡献解释（SHAP）")
-
-        if hasattr(model, "named_steps"):
-            step_names = list(model.named_steps.keys())
-            scaler = model.named_steps.get("scaler", None)
-            last_step_name = step_names[-1]
-            base_model = model.named_steps[last_step_name]
-            input_data = scaler.transform(user_input) if scaler is not None else user_input
-        else:
-            base_model = model
-            input_data = user_input
-
-        try:
-            explainer = shap.TreeExplainer(base_model)
-            shap_values = explainer.shap_values(input_data)
-
-            if isinstance(shap_values, list):
-                shap_values_single = shap_values[1][0] if len(shap_values) > 1 else shap_values[0][0]
-            else:
-                shap_values_single = shap_values[0]
-
-            expected_value = explainer.expected_value
-            if isinstance(expected_value, (list, np.ndarray)):
-                expected_value = expected_value[1] if len(expected_value) > 1 else expected_value[0]
-
-            force_plot = shap.force_plot(
-                expected_value,
-                shap_values_single,
-                input_data[0],
-                feature_names=[feature_labels.get(f, f) for f in feature_names],
-                matplotlib=False
-            )
-
-            st.components.v1.html(
-                shap.getjs() + force_plot.html(),
-                height=320,
-                width=900
-            )
-
-        except Exception as e1:
-            st.warning(f"⚠️ TreeExplainer 失败，尝试通用 Explainer：{e1}")
-
-            explainer = shap.Explainer(base_model, input_data)
-            shap_values = explainer(input_data)
-
-            force_plot = shap.force_plot(
-                explainer.expected_value,
-                shap_values.values[0],
-                input_data[0],
-                feature_names=[feature_labels.get(f, f) for f in feature_names],
-                matplotlib=False
-            )
-
-            st.components.v1.html(
-                shap.getjs() + force_plot.html(),
-                height=320,
-                width=900
-            )
-
-        st.markdown("🔴 红色特征推动预测为 GDM，🔵 蓝色特征推动预测为非 GDM。")
+        explanation_slot = st.empty()
+        explanation_slot.info("⏳ SHAP 解释计算中……")
 
         # =========================
         # 输入回显
@@ -313,6 +181,22 @@ if st.button("🔍 预测 GDM 风险"):
 
         st.dataframe(display_df, use_container_width=True)
 
+        # =========================
+        # 等待后台解释（或取本会话保存的结果），填入占位符
+        # =========================
+        if last_result is None:
+            explanation, explanation_parts = explanation_job.result()
+            st.session_state["last_result"] = {"key": result_key, "explanation": (explanation, explanation_parts)}
+        else:
+            explanation, explanation_parts = last_result["explanation"]
+        with explanation_slot.container():
+            if explanation.fallback_reason is not None:
+                st.warning(f"⚠️ TreeExplainer 失败，已使用通用 Explainer：{explanation.fallback_reason}")
+            st.components.v1.html(explanation_parts[0], height=320, width=900)
+            st.markdown("🔴 红色特征推动预测为 GDM，🔵 蓝色特征推动预测为非 GDM。")
+        timer.mark("explanation")
+        timing_slot.caption(timer.caption() + ("（本会话已保存的结果）" if last_result is not None else ""))
+
     except Exception as e:
         st.error(f"❌ 预测过程中出错：{e}")
 
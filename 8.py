@@ -1,13 +1,22 @@
 import os
-import json
 from pathlib import Path
 
-import joblib
-import numpy as np
 import pandas as pd
-import shap
 import streamlit as st
 
+from gdm import FEATURE_NAMES, FEATURE_LABELS, INPUT_LABELS, INPUT_ORDER, GDMPredictor, build_model_input, quantize_raw_inputs, explanation_svg
+from gdm.global_summary import dependence_frame, get_global_summary, importance_frame
+from gdm.artifacts import file_signature
+from gdm.async_explain import ResultTimer, explanation_html, submit
+from gdm.bulk import PAGE_SIZES, page_slice, read_upload, score_frame, to_download
+from gdm.cache import input_key
+from gdm.config import WHATIF_EXPLAIN
+from gdm.interactions import get_cohort_interactions, top_pairs
+from gdm.neighbors import get_neighbor_index
+from gdm.pdp import get_pdp, pdp_chart
+from gdm.sweep import raw_name, sweep, sweep_chart
+from gdm.worker_pool import get_scorer
+
 
 # =========================
 # 页面设置
@@ -28,104 +37,30 @@ METRICS_PATH = BASE_DIR / "best_model_xgboost_14vars_metrics.json"
 
 
 # =========================
-# 默认阈值
-# 若 metrics 文件中有 threshold，则自动覆盖
-# =========================
-THRESHOLD = 0.30
-
-
-# =========================
-# 模型内部实际使用的14个变量
-# 顺序必须与训练模型完全一致
-# =========================
-feature_names = [
-    "HDL-C",
-    "TC",
-    "LDL-C",
-    "TG",
-    "Glucose",
-    "lnCu+10",
-    "lnAs+10",
-    "lnPb+10",
-    "GGT",
-    "SF",
-    "ChE",
-    "PTA",
-    "lnCd+10",
-    "Tg"
-]
-
-
-# =========================
-# 网页输入名称（输入原始值）
-# =========================
-input_labels = {
-    "HDL-C": "高密度脂蛋白胆固醇（HDL-C）",
-    "TC": "总胆固醇（TC）",
-    "LDL-C": "低密度脂蛋白胆固醇（LDL-C）",
-    "TG": "甘油三酯（TG）",
-    "Glucose": "葡萄糖（Glucose）",
-    "Cu": "铜原始值（Cu）",
-    "As": "砷原始值（As）",
-    "Pb": "铅原始值（Pb）",
-    "GGT": "γ-谷氨酰转肽酶（GGT）",
-    "SF": "铁蛋白（SF）",
-    "ChE": "胆碱酯酶（ChE）",
-    "PTA": "凝血酶原活动度（PTA）",
-    "Cd": "镉原始值（Cd）",
-    "Tg": "甲状腺球蛋白（Tg）"
-}
-
-
-# =========================
-# 模型变量中文名称（SHAP/回显）
+# 变量名称（见 gdm/config.py）
 # =========================
-feature_labels = {
-    "HDL-C": "高密度脂蛋白胆固醇（HDL-C）",
-    "TC": "总胆固醇（TC）",
-    "LDL-C": "低密度脂蛋白胆固醇（LDL-C）",
-    "TG": "甘油三酯（TG）",
-    "Glucose": "葡萄糖（Glucose）",
-    "lnCu+10": "ln(Cu)+10（铜）",
-    "lnAs+10": "ln(As)+10（砷）",
-    "lnPb+10": "ln(Pb)+10（铅）",
-    "GGT": "γ-谷氨酰转肽酶（GGT）",
-    "SF": "铁蛋白（SF）",
-    "ChE": "胆碱酯酶（ChE）",
-    "PTA": "凝血酶原活动度（PTA）",
-    "lnCd+10": "ln(Cd)+10（镉）",
-    "Tg": "甲状腺球蛋白（Tg）"
-}
+feature_names = FEATURE_NAMES
+input_labels = INPUT_LABELS
+feature_labels = FEATURE_LABELS
 
 
 # =========================
-# 加载模型
+# 加载预测器
+# 若 metrics 文件中有 threshold，则自动覆盖默认阈值 0.30
 # =========================
+# model_signature：模型文件的修改时间 + 大小，文件被替换后重新加载（哈希与各项缓存随之更新）
 @st.cache_resource
-def load_model():
-    if not MODEL_PATH.exists():
-        raise FileNotFoundError(f"未找到模型文件：{MODEL_PATH}")
-    return joblib.load(MODEL_PATH)
-
-
-# =========================
-# 加载指标文件
-# =========================
-@st.cache_data
-def load_metrics():
-    if not METRICS_PATH.exists():
-        return None
-    with open(METRICS_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-# =========================
-# 原始值转换为 ln(x)+10
-# =========================
-def transform_ln_plus_10(x, var_name):
-    if x <= 0:
-        raise ValueError(f"{var_name} 原始值必须大于 0，才能进行 ln(x)+10 转换。")
-    return np.log(x) + 10
+def load_predictor(model_signature):
+    predictor = GDMPredictor(MODEL_PATH, METRICS_PATH)
+    # 解释器随模型一起准备一次，之后每次解释直接复用
+    predictor.prepare_explainer()
+    # 部分依赖按树结构精确计算（不遍历数据），随模型一起算好并按模型哈希缓存
+    get_pdp(predictor)
+    # 相似病例检索：训练数据的 SHAP 向量按模型哈希缓存，启动时建 KDTree（没有包含模型变量的训练数据表时跳过）
+    get_neighbor_index(predictor)
+    # 评分进程池随模型一起启动：判定与 SHAP 值在评分进程中计算，本进程只负责控件与图表
+    get_scorer(predictor)
+    return predictor
 
 
 # =========================
@@ -137,24 +72,7 @@ def get_input():
     raw_inputs_display = {}
     col1, col2 = st.columns(2)
 
-    input_order = [
-        "HDL-C",
-        "TC",
-        "LDL-C",
-        "TG",
-        "Glucose",
-        "Cu",
-        "As",
-        "Pb",
-        "GGT",
-        "SF",
-        "ChE",
-        "PTA",
-        "Cd",
-        "Tg"
-    ]
-
-    for i, item in enumerate(input_order):
+    for i, item in enumerate(INPUT_ORDER):
         label = input_labels.get(item, item)
         with col1 if i % 2 == 0 else col2:
             value = st.number_input(
@@ -167,54 +85,21 @@ def get_input():
             raw_inputs_display[item] = value
 
     try:
-        model_inputs = [
-            raw_inputs_display["HDL-C"],
-            raw_inputs_display["TC"],
-            raw_inputs_display["LDL-C"],
-            raw_inputs_display["TG"],
-            raw_inputs_display["Glucose"],
-            transform_ln_plus_10(raw_inputs_display["Cu"], "Cu"),
-            transform_ln_plus_10(raw_inputs_display["As"], "As"),
-            transform_ln_plus_10(raw_inputs_display["Pb"], "Pb"),
-            raw_inputs_display["GGT"],
-            raw_inputs_display["SF"],
-            raw_inputs_display["ChE"],
-            raw_inputs_display["PTA"],
-            transform_ln_plus_10(raw_inputs_display["Cd"], "Cd"),
-            raw_inputs_display["Tg"]
-        ]
+        user_input = build_model_input(quantize_raw_inputs(raw_inputs_display))
     except ValueError as e:
         st.error(f"❌ 输入值错误：{e}")
         return None, raw_inputs_display
 
-    return np.array([model_inputs], dtype=float), raw_inputs_display
-
-
-# =========================
-# 对 pipeline 做前处理
-# 用于 SHAP
-# =========================
-def transform_for_base_model(model, user_input):
-    if hasattr(model, "named_steps"):
-        step_names = list(model.named_steps.keys())
-        x = user_input.copy()
-
-        for step_name in step_names[:-1]:
-            step_obj = model.named_steps[step_name]
-            if hasattr(step_obj, "transform"):
-                x = step_obj.transform(x)
-
-        base_model = model.named_steps[step_names[-1]]
-        return base_model, x
-
-    return model, user_input
+    return user_input, raw_inputs_display
 
 
 # =========================
 # 加载模型
 # =========================
 try:
-    model = load_model()
+    predictor = load_predictor(file_signature(MODEL_PATH))
+    scorer = get_scorer(predictor)
+    neighbor_index = get_neighbor_index(predictor)
     st.success("✅ 模型加载成功")
 except Exception as e:
     st.error(f"❌ 模型加载失败：{e}")
@@ -223,18 +108,7 @@ except Exception as e:
     st.write("模型路径：", str(MODEL_PATH))
     st.stop()
 
-
-# =========================
-# 加载指标文件
-# =========================
-metrics_data = load_metrics()
-if metrics_data is not None:
-    try:
-        threshold_from_metrics = metrics_data.get("metrics", {}).get("threshold", None)
-        if threshold_from_metrics is not None:
-            THRESHOLD = float(threshold_from_metrics)
-    except Exception:
-        pass
+THRESHOLD = predictor.threshold
 
 
 # =========================
@@ -247,69 +121,167 @@ with st.expander("🔧 文件路径调试信息"):
     st.write("指标路径：", str(METRICS_PATH))
     st.write("模型文件是否存在：", MODEL_PATH.exists())
     st.write("指标文件是否存在：", METRICS_PATH.exists())
+    st.write("预测缓存：", predictor.cache.stats())
 
 
-user_input, raw_inputs_display = get_input()
+# =========================
+# 输入表单
+# 14 项指标与各选项放在同一个表单里，修改时不重跑脚本，点击提交后才计算
+# SHAP 图渲染方式：静态 SVG 在服务器端生成，不加载 SHAP 脚本，也不需要 matplotlib
+# =========================
+with st.form("patient_form"):
+    user_input, raw_inputs_display = get_input()
+
+    render_mode = st.radio(
+        "SHAP 图渲染方式",
+        ["交互式力图（SHAP JS）", "静态 SVG（力图 + 瀑布图）"],
+        horizontal=True
+    )
+    show_interactions = st.checkbox("同时显示变量两两交互（SHAP 交互值）")
+    show_counterfactual = st.checkbox("同时给出反事实建议（改动最少的指标使判定翻转）")
+    # 只有真实训练数据才能作为“相似病例”，没有时不提供此选项
+    show_neighbors = neighbor_index is not None and st.checkbox("同时显示最相似的训练病例（SHAP 空间近邻）")
+    sweep_features = st.multiselect(
+        "敏感性分析：选择 1~2 个变量（其余变量保持当前输入）",
+        feature_names,
+        max_selections=2,
+        format_func=lambda f: input_labels.get(raw_name(f), f)
+    )
+    submitted = st.form_submit_button("🔍 预测 GDM 风险")
 
 
 # =========================
-# 预测
+# SHAP 解释（在后台线程中运行，不调用 st.*）
+# 默认 SHAP 值由评分进程池计算；
+# WHATIF_EXPLAIN 打开或没有评分进程池时 what-if 增量重算：与本会话上一次输入相比只改动少数变量时，只重算相关的树；
+# 图表 HTML 也在后台生成
 # =========================
-if st.button("🔍 预测 GDM 风险"):
-    try:
-        if user_input is None:
-            st.stop()
+def build_explanation(user_input, previous_state, static):
+    if WHATIF_EXPLAIN or scorer is predictor:
+        _, explanation, state = predictor.what_if(user_input, previous_state)
+    else:
+        explanation, state = scorer.explain(user_input), None
+    shap_labels = [feature_labels.get(f, f) for f in feature_names]
+    return explanation, state, explanation_html(explanation, shap_labels, static)
 
-        if not hasattr(model, "predict_proba"):
-            st.error("❌ 当前模型不支持 predict_proba。")
-            st.stop()
 
-        proba = model.predict_proba(user_input)[0][1]
-        pred_label = 1 if proba >= THRESHOLD else 0
-        pred_text = "阳性（GDM）" if pred_label == 1 else "阴性（非GDM）"
+# =========================
+# 预测
+# 本会话上一次的结果按输入与选项保存在 session_state；
+# 其他控件（PDP / 依赖图变量等）引起的重跑直接显示保存的结果，不重新计算解释
+# =========================
+result_key = None
+if user_input is not None:
+    result_key = (
+        predictor.model_hash, input_key(user_input), render_mode,
+        show_interactions, show_counterfactual, show_neighbors, tuple(sweep_features)
+    )
+last_result = st.session_state.get("last_result")
+if last_result is not None and last_result["key"] != result_key:
+    last_result = None
+
+# 输入有误（get_input 已提示）时跳过结果区，页面其余部分照常显示
+if user_input is not None and (submitted or last_result is not None):
+    try:
+        timer = ResultTimer()
+
+        # 判定：只调用 predict_proba（在评分进程中计算，结果进入预测缓存），立即输出
+        prediction = scorer.predict(user_input)
+        proba = prediction.proba
+        pred_text = prediction.text
 
         st.markdown("---")
         st.markdown(f"## 🧪 预测结果：**{proba * 100:.2f}%**")
         st.markdown(f"### 🩺 判定：**{pred_text}**（阈值：{THRESHOLD:.2f}）")
         st.progress(min(max(float(proba), 0.0), 1.0))
+        timer.mark("verdict")
+        timing_slot = st.empty()
+        timing_slot.caption(timer.caption())
+
+        # SHAP 解释交给后台线程，先预留占位符，其余内容照常输出；本会话已有结果时直接复用
+        static_svg = render_mode.startswith("静态 SVG")
+        if last_result is None:
+            explanation_job = submit(build_explanation, user_input, st.session_state.get("whatif_state"), static_svg)
 
         # SHAP解释
         st.markdown("---")
         st.subheader("🎯 特征贡献解释（SHAP）")
-
-        try:
-            base_model, input_data = transform_for_base_model(model, user_input)
-
-            explainer = shap.TreeExplainer(base_model)
-            shap_values = explainer.shap_values(input_data)
-
-            if isinstance(shap_values, list):
-                shap_values_single = shap_values[1][0] if len(shap_values) > 1 else shap_values[0][0]
-            else:
-                shap_values_single = shap_values[0]
-
-            expected_value = explainer.expected_value
-            if isinstance(expected_value, (list, np.ndarray)):
-                expected_value = expected_value[1] if len(expected_value) > 1 else expected_value[0]
-
-            force_plot = shap.force_plot(
-                expected_value,
-                shap_values_single,
-                input_data[0],
-                feature_names=[feature_labels.get(f, f) for f in feature_names],
-                matplotlib=False
-            )
-
-            st.components.v1.html(
-                shap.getjs() + force_plot.html(),
-                height=320,
-                width=900
-            )
-
-            st.markdown("🔴 红色特征推动预测为 GDM，🔵 蓝色特征推动预测为非 GDM。")
-
-        except Exception as e:
-            st.warning(f"⚠️ SHAP 解释暂时无法显示：{e}")
+        explanation_slot = st.empty()
+        explanation_slot.info("⏳ SHAP 解释计算中……")
+
+        # =========================
+        # 变量两两交互（SHAP 交互值）
+        # 队列交互值离线缓存（python -m gdm.interactions），单个患者复用已缓存的 explainer
+        # =========================
+        if show_interactions:
+            st.markdown("---")
+            st.subheader("🔗 变量两两交互（SHAP 交互值）")
+            try:
+                interaction_matrix = predictor.explain_interactions(user_input)
+                # 没有真实训练数据时不显示队列列
+                cohort = get_cohort_interactions(predictor)
+                st.dataframe(
+                    top_pairs(interaction_matrix, feature_names, k=10, labels=feature_labels,
+                              cohort_mean_abs=cohort["mean_abs"] if cohort is not None else None),
+                    hide_index=True,
+                    use_container_width=True
+                )
+                st.caption("交互值为两变量共同作用对 log-odds 的贡献（正值推动预测为 GDM）"
+                           + (f"；队列数据：{cohort['source']}" if cohort is not None else "。"))
+            except Exception as e:
+                st.warning(f"⚠️ SHAP 交互值暂时无法显示：{e}")
+
+        # =========================
+        # 反事实建议：以分裂阈值为候选点搜索，按改动指标数最少、改动量最小排序
+        # =========================
+        if show_counterfactual:
+            st.markdown("---")
+            st.subheader("🔄 反事实建议")
+            try:
+                cf = predictor.counterfactual(user_input)
+                target = "降到阈值以下" if prediction.label == 1 else "升到阈值以上"
+                if cf.found:
+                    st.markdown(
+                        f"改动以下 **{len(cf.changes)}** 项指标，预测概率可由 {cf.proba_before * 100:.2f}% "
+                        f"变为 **{cf.proba_after * 100:.2f}%**（{target}，阈值 {THRESHOLD:.2f}）："
+                    )
+                    st.dataframe(cf.to_frame(input_labels), hide_index=True, use_container_width=True)
+                else:
+                    st.info(f"在允许的改动指标数内，未找到使概率{target}的组合。")
+                st.caption(
+                    f"搜索耗时 {cf.seconds * 1e3:.1f} ms，评估 {cf.sets_evaluated} 个指标组合"
+                    f"（按概率界剪枝 {cf.sets_pruned} 个）"
+                    + ("" if cf.complete else "；已达到时间预算，结果可能不是最少改动")
+                )
+            except Exception as e:
+                st.warning(f"⚠️ 反事实建议暂时无法显示：{e}")
+
+        # =========================
+        # 敏感性分析：整个网格交给评分进程批量评分（原始单位，ln 变量自动转换），按输入缓存
+        # =========================
+        if sweep_features:
+            st.markdown("---")
+            st.subheader("📈 敏感性分析")
+            try:
+                sweep_result = sweep(predictor, user_input, sweep_features, scorer=scorer)
+                st.altair_chart(sweep_chart(sweep_result, input_labels), use_container_width=True)
+                st.caption(
+                    f"网格 {sweep_result.proba.size} 个点，批量评分；"
+                    + ("虚线为判定阈值，红点为当前输入。" if len(sweep_features) == 1
+                       else f"颜色以判定阈值 {THRESHOLD:.2f} 为中点。")
+                )
+            except Exception as e:
+                st.warning(f"⚠️ 敏感性分析暂时无法显示：{e}")
+
+        # =========================
+        # 相似病例：当前患者的 SHAP 向量在训练数据 SHAP 向量上的 k 近邻（KDTree），
+        # 需要 SHAP 解释，先预留位置
+        # =========================
+        if show_neighbors:
+            st.markdown("---")
+            st.subheader("👥 最相似的训练病例（SHAP 空间）")
+            neighbors_slot = st.empty()
+            neighbors_slot.info("⏳ 等待 SHAP 解释……")
 
         # 输入回显
         st.markdown("---")
@@ -357,10 +329,171 @@ if st.button("🔍 预测 GDM 风险"):
 
         st.dataframe(display_df, use_container_width=True)
 
+        # 等待后台解释（或取本会话保存的结果），填入占位符
+        try:
+            if last_result is None:
+                explanation, whatif_state, explanation_parts = explanation_job.result()
+                st.session_state["whatif_state"] = whatif_state
+                st.session_state["last_result"] = {
+                    "key": result_key, "explanation": (explanation, whatif_state, explanation_parts)
+                }
+            else:
+                explanation, whatif_state, explanation_parts = last_result["explanation"]
+            with explanation_slot.container():
+                if explanation.fallback_reason is not None:
+                    st.warning(f"⚠️ TreeExplainer 失败，已使用通用 Explainer：{explanation.fallback_reason}")
+                if static_svg:
+                    for part in explanation_parts:
+                        st.html(part)
+                else:
+                    st.components.v1.html(explanation_parts[0], height=320, width=900)
+                st.markdown("🔴 红色特征推动预测为 GDM，🔵 蓝色特征推动预测为非 GDM。")
+        except Exception as e:
+            explanation = whatif_state = None
+            explanation_slot.warning(f"⚠️ SHAP 解释暂时无法显示：{e}")
+        timer.mark("explanation")
+        timing_slot.caption(
+            timer.caption()
+            + (f"；本次重算 {whatif_state.trees_evaluated}/{len(whatif_state.leaves)} 棵树" if whatif_state is not None else "")
+            + ("（本会话已保存的结果）" if last_result is not None else "")
+        )
+
+        if show_neighbors and explanation is None:
+            neighbors_slot.warning("⚠️ 相似病例按 SHAP 解释检索，解释失败时无法显示。")
+        elif show_neighbors:
+            with neighbors_slot.container():
+                try:
+                    st.dataframe(
+                        neighbor_index.to_frame(explanation.values, labels=feature_labels),
+                        hide_index=True,
+                        use_container_width=True
+                    )
+                    st.caption(
+                        f"数据来源：{neighbor_index.source}；距离为 SHAP 值（log-odds）之间的欧氏距离。"
+                        + ("" if neighbor_index.has_outcome else "该数据没有真实结局，仅显示模型概率。")
+                    )
+                except Exception as e:
+                    st.warning(f"⚠️ 相似病例暂时无法显示：{e}")
+
     except Exception as e:
         st.error(f"❌ 预测过程中出错：{e}")
 
 
+# =========================
+# 批量上传评分
+# 整表向量化校验与转换 + 一次 predict_proba；结果按上传文件保存在 session_state，翻页、下载不重新评分
+# 选中表格中的某一行时才计算该行的 SHAP 解释
+# =========================
+with st.expander("📂 批量上传评分（xlsx / CSV）"):
+    uploaded = st.file_uploader(
+        "上传表格：每行一位患者，列为 14 项指标的原始值（列名同网页输入项或中文名称）",
+        type=["xlsx", "xls", "csv"]
+    )
+    if uploaded is not None:
+        try:
+            bulk_key = (predictor.model_hash, uploaded.file_id)
+            bulk = st.session_state.get("bulk_result")
+            if bulk is None or bulk["key"] != bulk_key:
+                upload_df = read_upload(uploaded, uploaded.name)
+                bulk_result = score_frame(predictor, upload_df)
+                bulk = {"key": bulk_key, "result": bulk_result, "frame": bulk_result.to_frame(upload_df), "downloads": {}}
+                st.session_state["bulk_result"] = bulk
+            bulk_result, bulk_frame = bulk["result"], bulk["frame"]
+            st.caption(
+                f"共 {bulk_result.rows} 行，可评分 {bulk_result.n_valid} 行；"
+                f"校验转换 {bulk_result.validate_seconds * 1e3:.0f} ms，评分 {bulk_result.score_seconds * 1e3:.0f} ms"
+            )
+
+            col_size, col_page = st.columns(2)
+            page_size = col_size.selectbox("每页行数", PAGE_SIZES)
+            _, n_pages = page_slice(bulk_result.rows, 1, page_size)
+            page = col_page.number_input(f"页码（共 {n_pages} 页）", min_value=1, max_value=n_pages, value=1, step=1)
+            page_rows, _ = page_slice(bulk_result.rows, page, page_size)
+            table_event = st.dataframe(
+                bulk_frame.iloc[page_rows],
+                hide_index=True,
+                use_container_width=True,
+                on_select="rerun",
+                selection_mode="single-row",
+                key="bulk_table"
+            )
+
+            download_format = st.radio("下载格式", ["csv", "xlsx"], horizontal=True)
+            if download_format not in bulk["downloads"]:
+                bulk["downloads"][download_format] = to_download(bulk_frame, download_format)
+            data, mime = bulk["downloads"][download_format]
+            st.download_button(
+                "⬇️ 下载全部评分结果",
+                data,
+                file_name=f"{Path(uploaded.name).stem}_GDM评分.{download_format}",
+                mime=mime
+            )
+
+            # 选中行的 SHAP 解释（按需计算，进入预测缓存）
+            if table_event.selection.rows:
+                row = page_rows.start + table_event.selection.rows[0]
+                if not bulk_result.valid[row]:
+                    st.warning(f"第 {row + 1} 行无法评分：{bulk_result.issues[row]}")
+                else:
+                    row_explanation = scorer.explain(bulk_result.X[row:row + 1])
+                    st.markdown(f"**第 {row + 1} 行**：GDM 概率 {bulk_result.proba[row] * 100:.2f}%")
+                    st.html(explanation_svg(row_explanation, [feature_labels.get(f, f) for f in feature_names], "waterfall"))
+            else:
+                st.caption("选中表格中的一行可查看该患者的 SHAP 解释。")
+        except Exception as e:
+            st.warning(f"⚠️ 批量评分失败：{e}")
+
+
+# =========================
+# 全局特征重要性
+# 离线计算并按模型文件哈希缓存（python -m gdm.global_summary），此处直接读取
+# 只在真实训练数据上计算；没有包含模型变量的训练数据表时不显示
+# =========================
+try:
+    summary = get_global_summary(predictor)
+except Exception as e:
+    summary = None
+    st.warning(f"⚠️ 全局 SHAP 汇总暂时无法显示：{e}")
+
+if summary is not None:
+    with st.expander("🌐 全局特征重要性（训练队列 SHAP 汇总）"):
+        try:
+            importance_df = importance_frame(summary, feature_labels)
+            st.caption(f"数据来源：{summary['source']}，共 {summary['rows']} 行")
+            st.bar_chart(importance_df, x="变量", y="mean |SHAP|", horizontal=True, sort="-mean |SHAP|")
+            st.dataframe(importance_df, hide_index=True, use_container_width=True)
+
+            dependence_feature = st.selectbox(
+                "依赖图变量",
+                [summary["feature_names"][i] for i in summary["order"]],
+                format_func=lambda f: feature_labels.get(f, f)
+            )
+            st.scatter_chart(dependence_frame(summary, dependence_feature), x="变量值", y="SHAP 值")
+        except Exception as e:
+            st.warning(f"⚠️ 全局 SHAP 汇总暂时无法显示：{e}")
+
+
+# =========================
+# 部分依赖图（PDP）
+# 由树的分裂阈值与 cover 统计精确得到，标出当前输入所在位置
+# =========================
+with st.expander("📉 部分依赖图（PDP，含当前患者）"):
+    try:
+        pdp = get_pdp(predictor)
+        pdp_feature = st.selectbox(
+            "PDP 变量",
+            pdp["feature_names"],
+            format_func=lambda f: input_labels.get(raw_name(f), f)
+        )
+        st.altair_chart(
+            pdp_chart(pdp, pdp_feature, user_input, title=input_labels.get(raw_name(pdp_feature), pdp_feature)),
+            use_container_width=True
+        )
+        st.caption("纵轴为其余变量按训练样本分布平均后的 GDM 概率（由 log-odds 换算）；红点为当前输入。")
+    except Exception as e:
+        st.warning(f"⚠️ 部分依赖图暂时无法显示：{e}")
+
+
 # =========================
 # 页脚
 # =========================
@@ -0,0 +1,20 @@
+from .config import (
+    DEFAULT_THRESHOLD,
+    FEATURE_LABELS,
+    FEATURE_NAMES,
+    FEATURE_NAMES_9VARS,
+    FEATURE_NAMES_9VARS_EN,
+    INPUT_LABELS,
+    INPUT_ORDER,
+    LOG_INPUTS,
+    METRICS_PATH,
+    MODEL_9VARS_PATH,
+    MODEL_PATH,
+)
+from .cache import LRUCache, get_prediction_cache
+from .preprocess import build_model_input, quantize_raw_inputs, transform_for_base_model, transform_ln_plus_10
+from .predictor import ENGINES, EXPLAIN_BACKENDS, Explanation, GDMPredictor, Prediction
+from .quickscorer import QuickScorerEnsemble, QuickScorerModel
+from .shap_js import shap_js
+from .svg_plots import explanation_svg, force_svg, waterfall_svg
+from .tree_engine import FlatTreeEnsemble, FlatTreeModel
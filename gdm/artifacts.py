@@ -0,0 +1,90 @@
+import hashlib
+import json
+from pathlib import Path, PureWindowsPath
+
+import joblib
+
+from .config import BASE_DIR
+
+
+# =========================
+# 查找文件路径
+# 先尝试给定路径，再尝试项目目录下的同名文件
+# （Windows 绝对路径在其他系统上也能取到文件名）
+# =========================
+def resolve_existing_path(path_str) -> Path | None:
+    if path_str is None:
+        return None
+
+    p = Path(path_str)
+    if p.exists():
+        return p
+
+    alt = BASE_DIR / PureWindowsPath(path_str).name
+    if alt.exists():
+        return alt
+
+    return None
+
+
+# =========================
+# 加载模型
+# =========================
+def load_model(model_path):
+    resolved_model_path = resolve_existing_path(model_path)
+    if resolved_model_path is None:
+        raise FileNotFoundError(
+            f"未找到模型文件：{model_path}\n"
+            f"当前工作目录：{Path.cwd()}"
+        )
+    return joblib.load(resolved_model_path), resolved_model_path
+
+
+# =========================
+# 文件内容哈希（模型身份）
+# 同一模型文件无论放在哪个路径，哈希都相同；文件被替换后哈希改变
+# =========================
+def file_hash(path, length=16):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+# =========================
+# 文件签名（修改时间 + 大小）
+# 不读文件内容，页面每次重跑都可以调用；签名变化时再重新加载模型并计算哈希
+# =========================
+def file_signature(path):
+    resolved = resolve_existing_path(path)
+    if resolved is None:
+        return None
+    stat = resolved.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+# =========================
+# 加载指标文件
+# 文件不存在时返回 (None, None)
+# =========================
+def load_metrics(metrics_path):
+    resolved_metrics_path = resolve_existing_path(metrics_path)
+    if resolved_metrics_path is None:
+        return None, None
+
+    with open(resolved_metrics_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data, resolved_metrics_path
+
+
+# =========================
+# 从指标文件读取阈值
+# =========================
+def threshold_from_metrics(metrics_data, default):
+    if not isinstance(metrics_data, dict):
+        return default
+    threshold = metrics_data.get("metrics", {}).get("threshold", None)
+    if threshold is None:
+        return default
+    return float(threshold)
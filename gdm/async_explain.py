@@ -0,0 +1,132 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .config import EXPLAIN_WORKERS
+from .utils import cli_parser
+
+
+# =========================
+# 后台解释
+# 页面先用 predict_proba 给出判定并立即输出，SHAP 计算与图表 HTML 生成交给后台线程；
+# 脚本线程继续输出其余内容，最后等待结果并填入预留的占位符。
+# 后台线程不调用任何 st.* 函数，只返回解释结果与 HTML 字符串
+# =========================
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers=EXPLAIN_WORKERS):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gdm-explain")
+        return _executor
+
+
+def submit(fn, *args, **kwargs):
+    return get_executor().submit(fn, *args, **kwargs)
+
+
+# =========================
+# 分步计时：从点击按钮开始，记录各步骤完成的时刻
+# =========================
+class ResultTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = {}
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter() - self.start
+        return self.marks[name]
+
+    def caption(self):
+        parts = []
+        if "verdict" in self.marks:
+            parts.append(f"出判定 {self.marks['verdict'] * 1e3:.0f} ms")
+        if "explanation" in self.marks:
+            parts.append(f"出解释 {self.marks['explanation'] * 1e3:.0f} ms")
+        return "，".join(parts)
+
+
+# =========================
+# SHAP 图表 HTML（可在后台线程中生成）
+# static=True：静态 SVG 力图 + 瀑布图；否则为 shap.js 交互力图（单个 HTML）
+# =========================
+def explanation_html(explanation, labels, static=False):
+    from .shap_js import shap_js
+    from .svg_plots import explanation_svg
+
+    if static:
+        return [explanation_svg(explanation, labels, "force"), explanation_svg(explanation, labels, "waterfall")]
+
+    import shap
+
+    force_plot = shap.force_plot(
+        explanation.base_value,
+        explanation.values,
+        explanation.data,
+        feature_names=labels,
+        matplotlib=False
+    )
+    return [shap_js() + force_plot.html()]
+
+
+# 解释 + 图表 HTML，返回 (Explanation, HTML 列表)
+def explain_and_render(predictor, user_input, labels, static=False):
+    explanation = predictor.explain(user_input)
+    return explanation, explanation_html(explanation, labels, static)
+
+
+def main(argv=None):
+    from .predictor import EXPLAIN_BACKENDS, GDMPredictor
+
+    parser = cli_parser(
+        "async_explain",
+        "对比同步与后台解释两种页面流程下，出判定与出解释的耗时。"
+    )
+    parser.add_argument("--patients", type=int, default=30)
+    parser.add_argument("--explain-backend", default="auto", choices=EXPLAIN_BACKENDS)
+    parser.add_argument("--static", action="store_true", help="生成静态 SVG（默认 shap.js 交互力图）")
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec, cache=None, explain_backend=args.explain_backend)
+    predictor.prepare_explainer()
+    labels = list(predictor.feature_names)
+    rng = np.random.default_rng(0)
+    rows = predictor.transform(rng.normal(size=(args.patients + 1, len(labels))))
+    explain_and_render(predictor, rows[:1], labels, args.static)
+
+    # 同步：判定要等解释与图表都完成后才一起输出
+    sync = []
+    for x in rows[1:]:
+        timer = ResultTimer()
+        predictor.predict(x.reshape(1, -1))
+        explain_and_render(predictor, x.reshape(1, -1), labels, args.static)
+        timer.mark("verdict")
+        timer.mark("explanation")
+        sync.append(timer.marks)
+
+    # 后台：判定立即输出，解释由后台线程完成后填入
+    background = []
+    for x in rows[1:]:
+        timer = ResultTimer()
+        predictor.predict(x.reshape(1, -1))
+        timer.mark("verdict")
+        job = submit(explain_and_render, predictor, x.reshape(1, -1), labels, args.static)
+        job.result()
+        timer.mark("explanation")
+        background.append(timer.marks)
+
+    print(f"模型文件：{predictor.model_path}（解释后端：{predictor.explain_backend}）；{args.patients} 个患者，"
+          f"图表：{'静态 SVG' if args.static else 'shap.js 交互力图'}（中位数）")
+    for name, marks in (("同步", sync), ("后台", background)):
+        verdict = np.median([m["verdict"] for m in marks]) * 1e3
+        explanation = np.median([m["explanation"] for m in marks]) * 1e3
+        print(f"  {name}：出判定 {verdict:7.2f} ms，出解释 {explanation:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
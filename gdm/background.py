@@ -0,0 +1,211 @@
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .config import BACKGROUND_METHOD, BACKGROUND_SIZE, CACHE_DIR
+from .utils import cli_parser
+
+
+# =========================
+# 通用 shap.Explainer 的背景数据
+# 原来回退时用患者本人这一行作背景，SHAP 值几乎全为 0，且每次都重新构建。
+# 这里从训练队列数据表（见 cohort.py）取样并汇总：
+#   "stratified" 按 GDM 结局分层随机抽样
+#   "kmeans"     k-means 聚类中心（每类样本数作为权重，构建 explainer 时按权重重复各中心）
+# 样本先经过与 transform_for_base_model 相同的前处理，
+# 结果按模型文件哈希保存到 CACHE_DIR，只计算一次。
+# 没有包含模型变量的训练数据表时报错，不用独立抽样的合成样本代替
+# （合成样本不保留变量之间的相关性，期望值与 SHAP 值都会偏离）
+# =========================
+METHODS = ("stratified", "kmeans")
+
+_backgrounds = {}
+_backgrounds_lock = threading.Lock()
+
+
+def _training_rows(predictor):
+    from .cohort import require_training_cohort
+
+    cohort = require_training_cohort(predictor.feature_names)
+    X = predictor.transform(cohort.X)
+    keep = ~np.isnan(X).any(axis=1)
+    y = cohort.outcome[keep] if cohort.has_outcome else None
+    return X[keep], y, cohort.source
+
+
+def summarize(X, y=None, size=BACKGROUND_SIZE, method=BACKGROUND_METHOD, seed=0):
+    if method not in METHODS:
+        raise ValueError(f"未知的背景汇总方式：{method}，可选：{list(METHODS)}")
+    if len(X) <= size:
+        return X.copy(), np.ones(len(X))
+
+    rng = np.random.default_rng(seed)
+    if method == "kmeans":
+        from sklearn.cluster import KMeans
+
+        km = KMeans(n_clusters=size, n_init=1, random_state=seed).fit(X)
+        return km.cluster_centers_, np.bincount(km.labels_, minlength=size).astype(float)
+
+    # 分层抽样：各结局按比例分配名额
+    if y is None:
+        return X[rng.choice(len(X), size, replace=False)], np.ones(size)
+    index = []
+    classes, counts = np.unique(y, return_counts=True)
+    quotas = np.maximum(1, np.round(counts / counts.sum() * size).astype(int))
+    quotas[np.argmax(quotas)] -= quotas.sum() - size
+    for cls, quota in zip(classes, quotas):
+        members = np.flatnonzero(y == cls)
+        index.extend(rng.choice(members, min(quota, len(members)), replace=False))
+    index = np.sort(index)
+    return X[index], np.ones(len(index))
+
+
+# =========================
+# 带权重的背景 -> 等权样本（shap.maskers.Independent 不接受权重）
+# 按权重比例分配 size 个名额（最大余数法），每行重复相应次数；
+# 权重全为 1 时原样返回。k-means 的聚类中心因此按所代表的样本数参与期望值与 SHAP 值
+# =========================
+def weighted_rows(data, weights, size=None):
+    weights = np.asarray(weights, dtype=float)
+    if np.all(weights == weights[0]):
+        return data
+    size = int(size or len(data))
+    quota = weights / weights.sum() * size
+    counts = np.floor(quota).astype(int)
+    counts[np.argsort(counts - quota)[:size - counts.sum()]] += 1
+    return np.repeat(data, counts, axis=0)
+
+
+def background_path(model_hash, size=BACKGROUND_SIZE, method=BACKGROUND_METHOD):
+    return CACHE_DIR / f"background-{model_hash}-{method}-{size}.npz"
+
+
+# =========================
+# 取背景数据：内存 -> 磁盘 -> 重新计算并保存
+# 返回 (背景样本, 权重, 数据来源)
+# =========================
+def get_background(predictor, size=BACKGROUND_SIZE, method=BACKGROUND_METHOD):
+    key = (predictor.model_hash, method, size)
+    with _backgrounds_lock:
+        if key in _backgrounds:
+            return _backgrounds[key]
+
+        path = background_path(predictor.model_hash, size, method)
+        if path.exists():
+            with np.load(path) as data:
+                result = (data["data"], data["weights"], str(data["source"]))
+        else:
+            X, y, source = _training_rows(predictor)
+            data, weights = summarize(X, y, size, method)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp.npz")
+            np.savez(tmp, data=data, weights=weights, source=source)
+            tmp.replace(path)
+            result = (data, weights, source)
+
+        _backgrounds[key] = result
+        return result
+
+
+# =========================
+# 模型输出的 log-odds（与 TreeExplainer 同一尺度）
+# =========================
+def margin_function(base_model):
+    if hasattr(base_model, "get_booster"):
+        return lambda X: base_model.predict(X, output_margin=True)
+
+    def margin(X):
+        p = np.clip(base_model.predict_proba(X)[:, 1], 1e-12, 1 - 1e-12)
+        return np.log(p / (1.0 - p))
+    return margin
+
+
+# =========================
+# 通用 shap.Explainer（模型无关的解释路径）
+# 背景数据与 explainer 按模型文件哈希只构建一次，所有会话共用
+# =========================
+@dataclass
+class AgnosticExplainerEntry:
+    explainer: object
+    background_rows: int
+    source: str
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def shap_values(self, input_data):
+        with self.lock:
+            result = self.explainer(input_data)
+        values = np.asarray(result.values, dtype=float)
+        base_values = np.ravel(result.base_values)
+        return values, float(base_values[0])
+
+
+_agnostic = {}
+_agnostic_lock = threading.Lock()
+
+
+def get_agnostic_explainer(predictor, size=BACKGROUND_SIZE, method=BACKGROUND_METHOD):
+    import shap
+
+    key = (predictor.model_hash, method, size)
+    with _agnostic_lock:
+        entry = _agnostic.get(key)
+        if entry is None:
+            background, weights, source = get_background(predictor, size, method)
+            background = weighted_rows(background, weights, size)
+            masker = shap.maskers.Independent(background, max_samples=len(background))
+            entry = AgnosticExplainerEntry(
+                explainer=shap.Explainer(margin_function(predictor.base_model), masker),
+                background_rows=len(background),
+                source=source
+            )
+            _agnostic[key] = entry
+        return entry
+
+
+def main(argv=None):
+    import shap
+
+    from .predictor import GDMPredictor
+
+    parser = cli_parser(
+        "background",
+        "生成 / 读取通用 shap.Explainer 的背景数据，并统计不同背景大小下的单次解释耗时。",
+        spec="9vars", repeat=5
+    )
+    parser.add_argument("--method", default=BACKGROUND_METHOD, choices=METHODS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 25, 50, 100, 200])
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec, cache=None)
+    margin = margin_function(predictor.base_model)
+    input_data = predictor.transform(np.zeros((1, len(predictor.feature_names))))
+    expected, _ = predictor.tree_explainer().shap_values(input_data)
+
+    print(f"模型文件：{predictor.model_path}（哈希：{predictor.model_hash}）")
+
+    # 旧写法：患者本人作为背景
+    explainer = shap.Explainer(margin, shap.maskers.Independent(input_data))
+    degenerate = explainer(input_data).values[0]
+    print(f"患者本人作背景：SHAP 绝对值之和 {np.abs(degenerate).sum():.4f}（TreeExplainer：{np.abs(expected).sum():.4f}）")
+
+    for size in args.sizes:
+        start = time.perf_counter()
+        background, weights, source = get_background(predictor, size, args.method)
+        background = weighted_rows(background, weights, size)
+        t_build = time.perf_counter() - start
+
+        explainer = shap.Explainer(margin, shap.maskers.Independent(background, max_samples=len(background)))
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            values = explainer(input_data).values[0]
+            times.append(time.perf_counter() - start)
+        corr = float(np.corrcoef(values, expected[0])[0, 1])
+        print(f"背景 {len(background):>4} 行（{source}，准备 {t_build * 1e3:7.1f} ms）："
+              f"单次解释 {np.median(times) * 1e3:8.1f} ms，与 TreeExplainer 相关系数 {corr:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .bulk import validate_frame
+from .config import MODEL_SPECS
+from .predictor import ENGINES, GDMPredictor
+
+
+DEFAULT_CHUNKSIZE = 10000
+
+PROBA_COLUMN = "GDM_proba"
+LABEL_COLUMN = "GDM_pred"
+ISSUES_COLUMN = "GDM_issues"
+
+
+# =========================
+# 分块读取数据表（xlsx / csv）
+# xlsx 使用 openpyxl 只读模式逐行读取，避免一次性载入整张表
+# =========================
+def iter_table_chunks(path, chunksize=DEFAULT_CHUNKSIZE, sheet_name=None):
+    path = Path(path)
+
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+            rows = ws.iter_rows(values_only=True)
+            header = [str(c) for c in next(rows)]
+
+            buffer = []
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) >= chunksize:
+                    yield pd.DataFrame(buffer, columns=header)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=header)
+        finally:
+            wb.close()
+        return
+
+    yield from pd.read_csv(path, chunksize=chunksize)
+
+
+# =========================
+# 单块评分：向量化校验转换（与上传评分共用 bulk.validate_frame）+ 一次 predict_proba
+# 非数字、ln 变量原始值 <= 0 的行不评分（概率与判定为空），问题写入 ISSUES_COLUMN；
+# 缺少变量列时抛出 KeyError
+# =========================
+def score_chunk(predictor, df):
+    X, valid, _, issues = validate_frame(df, predictor.feature_names)
+    proba = np.full(len(X), np.nan)
+    labels = pd.array(np.zeros(len(X), dtype=int), dtype="Int64")
+    if valid.any():
+        proba[valid], labels[valid] = predictor.predict_batch(X[valid])
+    labels[~valid] = pd.NA
+
+    out = df.copy()
+    out[PROBA_COLUMN] = proba
+    out[LABEL_COLUMN] = labels
+    out[ISSUES_COLUMN] = issues
+    return out
+
+
+# =========================
+# 整个文件评分
+# csv 输出逐块追加；xlsx 输出在最后一次性写入
+# =========================
+def score_file(predictor, input_path, output_path, chunksize=DEFAULT_CHUNKSIZE, sheet_name=None):
+    output_path = Path(output_path)
+    to_excel = output_path.suffix.lower() == ".xlsx"
+
+    n_rows = 0
+    n_skipped = 0
+    scoring_seconds = 0.0
+    excel_parts = []
+
+    start = time.perf_counter()
+    for i, chunk in enumerate(iter_table_chunks(input_path, chunksize, sheet_name)):
+        t0 = time.perf_counter()
+        scored = score_chunk(predictor, chunk)
+        scoring_seconds += time.perf_counter() - t0
+
+        if to_excel:
+            excel_parts.append(scored)
+        else:
+            scored.to_csv(output_path, mode="w" if i == 0 else "a", header=(i == 0),
+                          index=False, encoding="utf-8-sig" if i == 0 else "utf-8")
+        n_rows += len(scored)
+        n_skipped += int((scored[ISSUES_COLUMN] != "").sum())
+
+    if to_excel:
+        pd.concat(excel_parts, ignore_index=True).to_excel(output_path, index=False)
+    total_seconds = time.perf_counter() - start
+
+    return {
+        "rows": n_rows,
+        "skipped": n_skipped,
+        "total_seconds": total_seconds,
+        "scoring_seconds": scoring_seconds,
+        "rows_per_sec": n_rows / total_seconds if total_seconds > 0 else float("inf"),
+        "scoring_rows_per_sec": n_rows / scoring_seconds if scoring_seconds > 0 else float("inf")
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m gdm.batch",
+        description="批量评分：读取 xlsx/csv 队列数据，输出 GDM 概率与判定。"
+    )
+    parser.add_argument("input", help="输入文件（.xlsx / .csv），表头与数据表一致")
+    parser.add_argument("-o", "--output", required=True, help="输出文件（.csv / .xlsx）")
+    parser.add_argument("--spec", default="14vars", choices=sorted(MODEL_SPECS),
+                        help="模型配置（默认 14vars）")
+    parser.add_argument("--model", help="模型文件路径（覆盖 --spec 中的路径）")
+    parser.add_argument("--metrics", help="指标文件路径（覆盖 --spec 中的路径）")
+    parser.add_argument("--engine", default="xgboost", choices=ENGINES,
+                        help="推理引擎（默认 xgboost；numpy 为展平树数组推理；quickscorer 为位向量推理）")
+    parser.add_argument("--threshold", type=float, help="判定阈值（默认读取指标文件，缺省 0.30）")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="每块行数")
+    parser.add_argument("--sheet", help="xlsx 工作表名（默认第一个）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    overrides = {"threshold": args.threshold, "engine": args.engine}
+    if args.model:
+        overrides["model_path"] = args.model
+    if args.metrics:
+        overrides["metrics_path"] = args.metrics
+    predictor = GDMPredictor.from_spec(args.spec, **overrides)
+
+    try:
+        stats = score_file(predictor, args.input, args.output, args.chunksize, args.sheet)
+    except KeyError as e:
+        raise SystemExit(f"❌ {args.input} 不能用于模型配置 {args.spec}：{e.args[0]}")
+
+    print(f"模型文件：{predictor.model_path}（阈值：{predictor.threshold:.2f}，引擎：{predictor.engine}）")
+    print(f"已评分 {stats['rows']} 行 -> {args.output}")
+    if stats["skipped"]:
+        print(f"其中 {stats['skipped']} 行数据有误未评分，原因见 {ISSUES_COLUMN} 列")
+    print(f"总耗时 {stats['total_seconds']:.3f} s（其中评分 {stats['scoring_seconds']:.3f} s）")
+    print(f"吞吐量：{stats['rows_per_sec']:.0f} 行/秒（仅评分：{stats['scoring_rows_per_sec']:.0f} 行/秒）")
+
+
+if __name__ == "__main__":
+    main()
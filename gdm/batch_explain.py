@@ -0,0 +1,287 @@
+import argparse
+import multiprocessing as mp
+import os
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cohort import synthetic_cohort
+from .config import MODEL_SPECS
+from .predictor import EXPLAIN_BACKENDS, GDMPredictor
+from .preprocess import transform_frame
+
+
+DEFAULT_CHUNKSIZE = 5000
+
+BASE_VALUE_COLUMN = "SHAP_base"
+SHAP_PREFIX = "SHAP_"
+
+
+# =========================
+# 批量 SHAP 解释（整个队列）
+# - 主进程读表、向量化转换并做 pipeline 前处理，结果放入共享内存
+# - 进程池中每个 worker 只加载一次模型，按行区间分块计算 SHAP，
+#   直接写入共享内存中的输出矩阵（行数 x 变量数）与基准值向量，
+#   不经过 pickle 传回结果
+# - worker 内 xgboost 固定单线程，并行度完全由进程数决定
+# =========================
+class SharedArray:
+    def __init__(self, shape, dtype=np.float64, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            # 子进程与主进程共用同一个资源跟踪器，只由创建方 unlink
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    def spec(self):
+        return self.shm.name, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, dtype = spec
+        return cls(shape, dtype, name=name)
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# =========================
+# 计算类型：
+#   "contributions" SHAP 值，行数 x 变量数（float64）
+#   "interactions"  SHAP 交互值，行数 x 变量数 x 变量数（float32，见 interactions.py）
+# =========================
+KINDS = ("contributions", "interactions")
+
+
+def _output_layout(kind, n_rows, n_features):
+    if kind == "interactions":
+        return (n_rows, n_features, n_features), np.float32
+    return (n_rows, n_features), np.float64
+
+
+def _compute(predictor, kind, input_data):
+    if kind == "interactions":
+        values, base_values = predictor.interactions(input_data)
+        return values, base_values, None
+    return predictor.contributions(input_data)
+
+
+# =========================
+# worker 进程状态（由 _init_worker 设置）
+# =========================
+_worker = {}
+
+
+def _init_worker(predictor_kwargs, kind, input_spec, values_spec, base_spec, ready):
+    predictor = GDMPredictor(cache=None, **predictor_kwargs)
+    if predictor.booster is not None:
+        predictor.booster.set_param({"nthread": 1})
+    predictor.prepare_explainer()
+
+    _worker["predictor"] = predictor
+    _worker["kind"] = kind
+    _worker["input"] = SharedArray.attach(input_spec)
+    _worker["values"] = SharedArray.attach(values_spec)
+    _worker["base"] = SharedArray.attach(base_spec)
+    ready.wait()  # 所有 worker 初始化完成后再开始计算
+
+
+def _explain_chunk(bounds):
+    start, stop = bounds
+    if stop <= start:
+        return 0, None
+    values, base_values, fallback_reason = _compute(_worker["predictor"], _worker["kind"], _worker["input"].array[start:stop])
+    _worker["values"].array[start:stop] = values
+    _worker["base"].array[start:stop] = base_values
+    return stop - start, fallback_reason
+
+
+def _chunk_bounds(n_rows, chunksize):
+    return [(start, min(start + chunksize, n_rows)) for start in range(0, n_rows, chunksize)]
+
+
+# =========================
+# 计算前处理后数据的 SHAP 矩阵（或交互值张量）
+# workers=1 时在当前进程内计算（不启动进程池）
+# 返回 (values, base_values, stats)
+# =========================
+def explain_matrix(predictor, input_data, workers=None, chunksize=DEFAULT_CHUNKSIZE, start_method="spawn",
+                   kind="contributions"):
+    if kind not in KINDS:
+        raise ValueError(f"未知的计算类型：{kind}，可选：{list(KINDS)}")
+    input_data = np.ascontiguousarray(input_data, dtype=np.float64)
+    n_rows, n_features = input_data.shape
+    shape, dtype = _output_layout(kind, n_rows, n_features)
+    workers = int(workers or os.cpu_count() or 1)
+    bounds = _chunk_bounds(n_rows, chunksize)
+    fallback_reasons = set()
+
+    if workers == 1:
+        start = time.perf_counter()
+        values = np.empty(shape, dtype=dtype)
+        base_values = np.empty(n_rows)
+        for lo, hi in bounds:
+            values[lo:hi], base_values[lo:hi], reason = _compute(predictor, kind, input_data[lo:hi])
+            fallback_reasons.add(reason)
+        seconds = time.perf_counter() - start
+        return values, base_values, {
+            "rows": n_rows, "workers": 1, "chunks": len(bounds),
+            "startup_seconds": 0.0, "explain_seconds": seconds,
+            "fallback_reasons": sorted(r for r in fallback_reasons if r)
+        }
+
+    shared_input = SharedArray(input_data.shape)
+    shared_values = SharedArray(shape, dtype)
+    shared_base = SharedArray((n_rows,))
+    try:
+        shared_input.array[:] = input_data
+        predictor_kwargs = {
+            "model_path": predictor.model_path,
+            "metrics_path": predictor.metrics_path,
+            "feature_names": predictor.feature_names,
+            "threshold": predictor.threshold,
+            "explain_backend": predictor.explain_backend
+        }
+
+        t0 = time.perf_counter()
+        ctx = mp.get_context(start_method)
+        ready = ctx.Barrier(workers)
+        initargs = (predictor_kwargs, kind, shared_input.spec(), shared_values.spec(), shared_base.spec(), ready)
+        with ctx.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            # 空任务返回时所有 worker 均已初始化：启动开销与计算耗时分开统计
+            pool.map(_explain_chunk, [(0, 0)] * workers, chunksize=1)
+            t1 = time.perf_counter()
+            for _, reason in pool.imap_unordered(_explain_chunk, bounds):
+                fallback_reasons.add(reason)
+            t2 = time.perf_counter()
+
+        values = shared_values.array.copy()
+        base_values = shared_base.array.copy()
+    finally:
+        shared_input.close()
+        shared_values.close()
+        shared_base.close()
+
+    return values, base_values, {
+        "rows": n_rows, "workers": workers, "chunks": len(bounds),
+        "startup_seconds": t1 - t0, "explain_seconds": t2 - t1,
+        "fallback_reasons": sorted(r for r in fallback_reasons if r)
+    }
+
+
+def read_cohort(path, feature_names, sheet_name=None):
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xlsm", ".xls"):
+        df = pd.read_excel(path, sheet_name=sheet_name or 0)
+    else:
+        df = pd.read_csv(path)
+    return transform_frame(df, feature_names)
+
+
+# =========================
+# 输出：.npz（values / base_values / feature_names）
+# 或 .csv / .xlsx（每个变量一列 SHAP_<变量>，另加 SHAP_base）
+# =========================
+def write_contributions(path, values, base_values, feature_names):
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".npz":
+        np.savez(path, values=values, base_values=base_values, feature_names=np.array(feature_names))
+        return
+
+    df = pd.DataFrame(values, columns=[f"{SHAP_PREFIX}{name}" for name in feature_names])
+    df[BASE_VALUE_COLUMN] = base_values
+    if suffix == ".xlsx":
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m gdm.batch_explain",
+        description="批量 SHAP 解释：读取 xlsx/csv 队列（或生成合成队列），多进程分块计算，"
+                    "输出 行数 x 变量数 的 SHAP 矩阵与基准值。"
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("input", nargs="?", help="输入文件（.xlsx / .csv），表头与数据表一致")
+    source.add_argument("--synthetic", type=int, help="不读文件，生成指定行数的合成队列（用于测速）")
+    parser.add_argument("-o", "--output", help="输出文件（.npz / .csv / .xlsx）")
+    parser.add_argument("--spec", default="14vars", choices=sorted(MODEL_SPECS),
+                        help="模型配置（默认 14vars）")
+    parser.add_argument("--model", help="模型文件路径（覆盖 --spec 中的路径）")
+    parser.add_argument("--metrics", help="指标文件路径（覆盖 --spec 中的路径）")
+    parser.add_argument("--explain-backend", default="auto", choices=EXPLAIN_BACKENDS,
+                        help="解释后端（默认 auto：xgboost 模型用原生 pred_contribs）")
+    parser.add_argument("--workers", type=int, nargs="+", default=[os.cpu_count() or 1],
+                        help="进程数；给出多个值时依次运行并报告加速比（默认 CPU 核数）")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="每块行数")
+    parser.add_argument("--start-method", default="spawn", choices=mp.get_all_start_methods(),
+                        help="进程启动方式（默认 spawn，避免 fork 继承 xgboost 的 OpenMP 线程状态）")
+    parser.add_argument("--sheet", help="xlsx 工作表名（默认第一个）")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    overrides = {"cache": None, "explain_backend": args.explain_backend}
+    if args.model:
+        overrides["model_path"] = args.model
+    if args.metrics:
+        overrides["metrics_path"] = args.metrics
+    predictor = GDMPredictor.from_spec(args.spec, **overrides)
+    if predictor.booster is not None:
+        predictor.booster.set_param({"nthread": 1})
+
+    start = time.perf_counter()
+    if args.synthetic:
+        X = synthetic_cohort(predictor, args.synthetic, args.seed)
+        source = f"合成队列 {args.synthetic} 行"
+    else:
+        X = read_cohort(args.input, predictor.feature_names, args.sheet)
+        source = args.input
+    input_data = predictor.transform(X)
+    t_prepare = time.perf_counter() - start
+
+    print(f"模型文件：{predictor.model_path}（解释后端：{predictor.explain_backend}）")
+    print(f"数据：{source}，{len(input_data)} 行 x {input_data.shape[1]} 变量（读取 + 前处理 {t_prepare:.3f} s）")
+    print(f"可用 CPU：{len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}")
+
+    baseline = None
+    base_workers = args.workers[0]
+    for workers in args.workers:
+        values, base_values, stats = explain_matrix(predictor, input_data, workers, args.chunksize, args.start_method)
+        rate = stats["rows"] / stats["explain_seconds"] if stats["explain_seconds"] > 0 else float("inf")
+        baseline = baseline or stats["explain_seconds"]
+        speedup = baseline / stats["explain_seconds"] if stats["explain_seconds"] > 0 else float("inf")
+        print(f"进程数 {workers:>2}：启动 {stats['startup_seconds']:.2f} s，计算 {stats['explain_seconds']:.3f} s"
+              f"（{rate:,.0f} 行/秒，{stats['chunks']} 块），相对 {base_workers} 进程加速 {speedup:.2f}x")
+        for reason in stats["fallback_reasons"]:
+            print(f"  已回退到通用 Explainer：{reason}")
+
+    # 可加性校验：SHAP 之和 + 基准值 = 模型 log-odds
+    if predictor.booster is not None:
+        margin = predictor.base_model.predict(input_data, output_margin=True)
+        print(f"可加性误差（SHAP 之和 + 基准值 vs log-odds）：{np.max(np.abs(values.sum(axis=1) + base_values - margin)):.2e}")
+
+    if args.output:
+        write_contributions(args.output, values, base_values, predictor.feature_names)
+        print(f"已写出 {values.shape[0]} x {values.shape[1]} 的 SHAP 矩阵与基准值 -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import io
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .config import FEATURE_ALIASES_9VARS, FEATURE_LABELS, INPUT_LABELS, LOG_INPUTS
+from .utils import cli_parser
+
+
+# =========================
+# 批量上传评分
+# 上传表格（xlsx / CSV，与内置数据表相同的一行一人布局）：
+#   - 列名可以是模型变量名、英文别名、ln 变量的原始值列（Cu / As / Pb / Cd），或网页上的中文名称
+#   - 整表一次向量化校验与转换：非数字、ln 变量原始值 <= 0 的行标记问题并跳过；空值保留给模型插补
+#   - 所有有效行一次 predict_proba 评分
+# 单行 SHAP 不在这里计算，页面选中某一行时再调用 predictor.explain（进入预测缓存）
+# =========================
+PAGE_SIZES = (50, 100, 500)
+
+
+@dataclass
+class BulkResult:
+    X: np.ndarray
+    valid: np.ndarray
+    proba: np.ndarray
+    labels: np.ndarray
+    missing: np.ndarray
+    issues: np.ndarray
+    threshold: float
+    validate_seconds: float
+    score_seconds: float
+
+    @property
+    def rows(self):
+        return len(self.X)
+
+    @property
+    def n_valid(self):
+        return int(self.valid.sum())
+
+    # 原始表格后追加评分列；df 为 None 时只返回评分列
+    def to_frame(self, df=None):
+        import pandas as pd
+
+        verdict = np.where(self.labels == 1, "GDM", "非 GDM").astype(object)
+        verdict[~self.valid] = "—"
+        scores = pd.DataFrame({
+            "行号": np.arange(1, self.rows + 1),
+            "GDM 概率": np.round(self.proba, 4),
+            "判定": verdict,
+            "缺失项数": self.missing,
+            "问题": self.issues
+        })
+        if df is None:
+            return scores
+        return pd.concat([scores, df.reset_index(drop=True)], axis=1)
+
+
+def read_upload(file, name=None):
+    import pandas as pd
+
+    name = str(name or getattr(file, "name", file))
+    if Path(name).suffix.lower() in (".xlsx", ".xlsm", ".xls"):
+        return pd.read_excel(file)
+    return pd.read_csv(file, encoding="utf-8-sig")
+
+
+# =========================
+# 每个模型变量对应的列：依次尝试模型变量名、英文别名、原始值列（ln 变量）、中文名称
+# 返回 {模型变量: (列名, 是否需要 ln(x)+10 转换)}；缺少的列一次全部报出
+# =========================
+def resolve_columns(columns, feature_names):
+    columns = set(columns)
+    reverse_aliases = {v: k for k, v in FEATURE_ALIASES_9VARS.items()}
+    resolved, missing = {}, []
+    for feature in feature_names:
+        raw = LOG_INPUTS.get(feature)
+        candidates = [
+            (feature, False),
+            (reverse_aliases.get(feature), False),
+            (FEATURE_LABELS.get(feature), False),
+            (raw, True),
+            (INPUT_LABELS.get(raw), True)
+        ]
+        for column, log in candidates:
+            if column is not None and column in columns:
+                resolved[feature] = (column, log)
+                break
+        else:
+            missing.append(raw or feature)
+    if missing:
+        raise KeyError(f"表格缺少以下列：{missing}")
+    return resolved
+
+
+# =========================
+# 整表校验与转换（向量化）
+# 返回 (模型输入 n x p（前处理前）, 有效行, 每行缺失项数, 每行问题说明)
+# =========================
+def validate_frame(df, feature_names):
+    import pandas as pd
+
+    resolved = resolve_columns(df.columns, feature_names)
+    n, p = len(df), len(feature_names)
+    X = np.empty((n, p))
+    not_numeric = np.zeros((n, p), dtype=bool)
+    not_positive = np.zeros((n, p), dtype=bool)
+
+    for j, feature in enumerate(feature_names):
+        column, log = resolved[feature]
+        original = df[column]
+        values = pd.to_numeric(original, errors="coerce").to_numpy(dtype=float)
+        # 转换失败的格子中，空值与空白字符串视为缺失，其余为非数字
+        failed = np.flatnonzero(np.isnan(values))
+        if len(failed):
+            cells = original.iloc[failed]
+            blank = cells.isna().to_numpy() | (cells.astype(str).str.strip() == "").to_numpy()
+            not_numeric[failed[~blank], j] = True
+        if log:
+            not_positive[:, j] = values <= 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = np.log(values) + 10
+        X[:, j] = values
+
+    bad = not_numeric | not_positive
+    valid = ~bad.any(axis=1)
+    X[bad] = np.nan
+    missing = (np.isnan(X) & ~bad).sum(axis=1)
+
+    issues = np.full(n, "", dtype=object)
+    names = np.array([LOG_INPUTS.get(f, f) for f in feature_names], dtype=object)
+    for i in np.flatnonzero(~valid):
+        parts = []
+        if not_numeric[i].any():
+            parts.append("非数字：" + "、".join(names[not_numeric[i]]))
+        if not_positive[i].any():
+            parts.append("须大于 0：" + "、".join(names[not_positive[i]]))
+        issues[i] = "；".join(parts)
+    return X, valid, missing, issues
+
+
+def score_frame(predictor, df):
+    start = time.perf_counter()
+    X, valid, missing, issues = validate_frame(df, predictor.feature_names)
+    validate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    proba = np.full(len(X), np.nan)
+    labels = np.full(len(X), -1)
+    if valid.any():
+        proba[valid], labels[valid] = predictor.predict_batch(X[valid])
+    score_seconds = time.perf_counter() - start
+
+    return BulkResult(
+        X=X, valid=valid, proba=proba, labels=labels, missing=missing, issues=issues,
+        threshold=predictor.threshold, validate_seconds=validate_seconds, score_seconds=score_seconds
+    )
+
+
+def page_slice(n_rows, page, page_size):
+    n_pages = max(1, -(-n_rows // page_size))
+    page = min(max(int(page), 1), n_pages)
+    return slice((page - 1) * page_size, min(page * page_size, n_rows)), n_pages
+
+
+def to_download(frame, fmt="csv"):
+    if fmt == "xlsx":
+        buffer = io.BytesIO()
+        frame.to_excel(buffer, index=False)
+        return buffer.getvalue(), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return frame.to_csv(index=False).encode("utf-8-sig"), "text/csv"
+
+
+# =========================
+# 生成与网页输入布局相同的示例表格（原始值），用于测速
+# =========================
+def synthetic_upload(predictor, n_rows, seed=0, bad_rows=10):
+    import pandas as pd
+
+    from .cohort import synthetic_cohort
+
+    X = synthetic_cohort(predictor, n_rows, seed)
+    df = pd.DataFrame({
+        LOG_INPUTS.get(f, f): np.exp(X[:, j] - 10) if f in LOG_INPUTS else X[:, j].round(2)
+        for j, f in enumerate(predictor.feature_names)
+    })
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(n_rows, min(bad_rows, n_rows), replace=False)
+    df = df.astype(object)
+    for k, i in enumerate(rows):
+        column = df.columns[k % df.shape[1]]
+        df.loc[i, column] = "未测" if k % 3 == 0 else (None if k % 3 == 1 else -1.0)
+    return df
+
+
+def main(argv=None):
+    from .predictor import ENGINES, GDMPredictor
+
+    parser = cli_parser(
+        "bulk",
+        "批量上传评分：整表向量化校验 + 一次 predict_proba，对比逐行评分的耗时。"
+    )
+    parser.add_argument("path", nargs="?", help="xlsx / CSV 文件（默认生成合成表格）")
+    parser.add_argument("--engine", default="xgboost", choices=ENGINES)
+    parser.add_argument("--rows", type=int, default=10000, help="合成表格行数")
+    parser.add_argument("--loop-rows", type=int, default=500, help="逐行评分对照的行数（按比例换算到整表）")
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec, engine=args.engine, cache=None)
+    if args.path:
+        start = time.perf_counter()
+        df = read_upload(args.path)
+        source = f"{args.path}（读取 {time.perf_counter() - start:.2f} s）"
+    else:
+        df = synthetic_upload(predictor, args.rows)
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False)
+        start = time.perf_counter()
+        df = read_upload(io.BytesIO(buffer.getvalue().encode("utf-8-sig")), "upload.csv")
+        source = f"合成表格（CSV 读取 {time.perf_counter() - start:.3f} s）"
+
+    score_frame(predictor, df.head(10))
+    result = score_frame(predictor, df)
+    total = result.validate_seconds + result.score_seconds
+    print(f"模型文件：{predictor.model_path}（引擎：{predictor.engine}）；数据：{source}")
+    print(f"{result.rows} 行，有效 {result.n_valid} 行；校验转换 {result.validate_seconds * 1e3:.1f} ms，"
+          f"评分 {result.score_seconds * 1e3:.1f} ms，合计 {total * 1e3:.1f} ms")
+
+    # 对照：逐行按同样的列对应关系构造输入并单独评分
+    from .preprocess import transform_ln_plus_10
+
+    resolved = [resolve_columns(df.columns, predictor.feature_names)[f] for f in predictor.feature_names]
+    records = df.head(args.loop_rows).to_dict("records")
+    start = time.perf_counter()
+    for record in records:
+        try:
+            row = [
+                transform_ln_plus_10(float(record[column]), column) if log else float(record[column])
+                for column, log in resolved
+            ]
+            predictor.predict_batch(np.array([row]))
+        except (TypeError, ValueError):
+            continue
+    t_loop = (time.perf_counter() - start) / max(len(records), 1) * result.rows
+    print(f"逐行评分（按 {len(records)} 行换算到整表）：{t_loop:.2f} s（{t_loop / total:.0f}x）")
+
+    frame = result.to_frame(df)
+    start = time.perf_counter()
+    data, _ = to_download(frame, "csv")
+    print(f"结果 CSV {len(data) / 2 ** 20:.2f} MB，生成 {(time.perf_counter() - start) * 1e3:.0f} ms")
+    problems = frame[frame["问题"] != ""]
+    if len(problems):
+        print(problems[["行号", "问题"]].head().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import PREDICTION_CACHE_SIZE
+
+
+# =========================
+# 模型输入的精确缓存键（-0.0 统一为 0.0）
+# 不取整：不同调用方的输入只要有差别就不会共用缓存；
+# 网页输入在进入模型前已按控件精度取整（见 preprocess.quantize_raw_inputs）
+# =========================
+def input_key(user_input):
+    return (np.asarray(user_input, dtype=float).ravel() + 0.0).tobytes()
+
+
+# =========================
+# 线程安全的 LRU 缓存
+# 进程内所有会话共享，超过容量时淘汰最久未使用的条目
+# =========================
+class LRUCache:
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE):
+        if maxsize <= 0:
+            raise ValueError(f"缓存容量必须大于 0：{maxsize}")
+        self.maxsize = int(maxsize)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# =========================
+# 进程级共享的预测 / 解释缓存
+# 键：(模型文件哈希, 阈值, 种类, 取整后的输入)
+# 值：Prediction 或 Explanation（数组只读，避免被页面代码改动）
+# =========================
+_prediction_cache = LRUCache(PREDICTION_CACHE_SIZE)
+
+
+def get_prediction_cache():
+    return _prediction_cache
+
+
+def freeze_explanation(explanation):
+    for array in (explanation.values, explanation.data):
+        array.flags.writeable = False
+    return explanation
@@ -0,0 +1,82 @@
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from .artifacts import file_signature
+from .config import TARGET, TRAINING_DATA_PATHS
+
+
+# =========================
+# 训练队列数据
+# 全局 SHAP 汇总、队列交互值、相似病例、通用 Explainer 背景与各命令行工具共用：
+# 依次读取 TRAINING_DATA_PATHS 中的数据表，取第一个包含全部模型变量的表
+# （中文 / 英文数据表为同一队列的两种表头）。
+# 没有任何表包含模型变量时不生成替代样本：
+#   load_training_cohort 返回 None（页面隐藏相应面板），require_training_cohort 报错
+# 读取结果按 (变量, 各数据表的修改时间 + 大小) 缓存在进程内，数据表被替换后重新读取
+# =========================
+@dataclass
+class TrainingCohort:
+    X: np.ndarray        # 模型输入（前处理前，ln 变量已转换）
+    outcome: np.ndarray  # 真实 GDM 结局；数据表没有结局列时为 NaN
+    source: str
+
+    @property
+    def has_outcome(self):
+        return not np.isnan(self.outcome).all()
+
+
+_cohorts = {}
+_cohorts_lock = threading.Lock()
+
+
+def _read_cohort(feature_names, data_paths):
+    import pandas as pd
+
+    from .preprocess import transform_frame
+
+    for path in data_paths:
+        try:
+            df = pd.read_excel(path)
+            X = transform_frame(df, feature_names)
+        except (OSError, KeyError):
+            continue
+        outcome = df[TARGET].to_numpy(dtype=float) if TARGET in df.columns else np.full(len(df), np.nan)
+        X.flags.writeable = False
+        outcome.flags.writeable = False
+        return TrainingCohort(X=X, outcome=outcome, source=path.name)
+    return None
+
+
+def load_training_cohort(feature_names, data_paths=TRAINING_DATA_PATHS):
+    key = (tuple(feature_names), tuple((str(path), file_signature(path)) for path in data_paths))
+    with _cohorts_lock:
+        if key not in _cohorts:
+            _cohorts[key] = _read_cohort(list(feature_names), data_paths)
+        return _cohorts[key]
+
+
+def require_training_cohort(feature_names, data_paths=TRAINING_DATA_PATHS):
+    cohort = load_training_cohort(feature_names, data_paths)
+    if cohort is None:
+        names = "、".join(path.name for path in data_paths)
+        raise ValueError(
+            f"训练数据表（{names}）都不包含模型变量 {list(feature_names)}；"
+            "请把包含这些变量的训练数据表加入 config.TRAINING_DATA_PATHS。"
+        )
+    return cohort
+
+
+# =========================
+# 合成队列：在 StandardScaler 的训练分布上独立抽样（模型输入尺度），
+# 没有 StandardScaler 时按 N(0, 1) 生成。
+# 不反映变量之间的相关性，只用于命令行测速，结果中须标明“合成”
+# =========================
+def synthetic_cohort(predictor, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    z = rng.standard_normal((n_rows, len(predictor.feature_names)))
+    for step_obj in predictor.preprocess_steps:
+        if hasattr(step_obj, "mean_") and hasattr(step_obj, "scale_"):
+            return z * step_obj.scale_ + step_obj.mean_
+    return z
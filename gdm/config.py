@@ -0,0 +1,240 @@
+from pathlib import Path
+
+
+# =========================
+# 项目根目录
+# 模型文件、指标文件、数据表与各页面脚本在同一文件夹
+# =========================
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MODEL_PATH = BASE_DIR / "best_model_xgboost_14vars.pkl"
+METRICS_PATH = BASE_DIR / "best_model_xgboost_14vars_metrics.json"
+
+# 早期 9 变量模型（标准化值输入）
+MODEL_9VARS_PATH = BASE_DIR / "best_model_xgboost.pkl"
+
+DATA_EN_PATH = BASE_DIR / "英文数据.xlsx"
+DATA_CN_PATH = BASE_DIR / "中文数据.xlsx"
+
+# 训练队列数据表（见 cohort.py），依次尝试，取第一个包含全部模型变量的表
+# 内置的中文 / 英文数据表为同一队列，只含 9 变量模型的变量；
+# 14 变量模型的全局汇总、交互值、相似病例与通用 Explainer 背景需要在此加入含 14 个变量的训练数据表
+TRAINING_DATA_PATHS = (DATA_CN_PATH, DATA_EN_PATH)
+
+# streamlit 静态文件目录（server.enableStaticServing 开启时以 /app/static/ 提供）
+STATIC_DIR = BASE_DIR / "static"
+
+
+# =========================
+# 默认阈值
+# 若 metrics 文件中有 threshold，则自动覆盖
+# =========================
+DEFAULT_THRESHOLD = 0.30
+
+TARGET = "GDM"
+
+
+# =========================
+# 预测 / 解释缓存（进程内共享，LRU）
+# 缓存键为精确的模型输入；网页原始输入先按控件精度取整：
+# Cu / As / Pb / Cd 保留 4 位小数，其余保留 2 位
+# =========================
+PREDICTION_CACHE_SIZE = 4096
+INPUT_DECIMALS = 2
+LOG_INPUT_DECIMALS = 4
+
+
+# =========================
+# 通用 shap.Explainer 的背景数据（见 background.py）
+# 从训练队列数据表（TRAINING_DATA_PATHS）汇总，按模型文件哈希保存在 CACHE_DIR
+# BACKGROUND_METHOD："stratified" 分层抽样 / "kmeans" 聚类中心
+# =========================
+CACHE_DIR = BASE_DIR / ".gdm_cache"
+BACKGROUND_SIZE = 100
+BACKGROUND_METHOD = "stratified"
+
+
+# =========================
+# matplotlib 渲染（见 mpl_render.py）
+# 图对象池大小；PNG 字节缓存容量（每张图约 50~70 KB）
+# =========================
+FIGURE_POOL_SIZE = 2
+PNG_CACHE_SIZE = 256
+
+
+# =========================
+# 反事实搜索（见 counterfactual.py）
+# 最多同时改动的指标数；单次搜索的时间预算（毫秒）
+# =========================
+COUNTERFACTUAL_MAX_CHANGES = 3
+COUNTERFACTUAL_BUDGET_MS = 500
+
+
+# =========================
+# SHAP 空间相似病例检索（见 neighbors.py）
+# 返回的近邻数；KDTree 叶子大小
+# =========================
+NEIGHBORS_K = 5
+NEIGHBORS_LEAF_SIZE = 40
+
+
+# =========================
+# 后台解释（见 async_explain.py）
+# 页面先显示判定，SHAP 解释在后台线程中计算；线程池大小（所有会话共用）
+# =========================
+EXPLAIN_WORKERS = 2
+
+
+# =========================
+# HTTP 评分服务（见 service.py）
+# 同时到达的请求合并成一批：每批最多 SERVICE_MAX_BATCH 行，
+# 第一条请求最多等待 SERVICE_MAX_WAIT_MS 毫秒
+# =========================
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_MAX_BATCH = 64
+SERVICE_MAX_WAIT_MS = 5.0
+
+
+# =========================
+# 评分进程池（见 worker_pool.py）
+# 推理与 SHAP 在预先启动的 WORKER_POOL_SIZE 个进程中计算（0 为在页面进程内计算）；
+# 请求与结果经共享内存环形缓冲区传递，每个环 WORKER_RING_SLOTS 个槽位；
+# 进程每次最多取 WORKER_MAX_BATCH 条请求合并计算；等待结果超过 WORKER_TIMEOUT 秒报错
+# 单个患者的 SHAP 值二选一（页面 7 / 8）：
+#   WHATIF_EXPLAIN = False：交给评分进程池，页面进程不占用 GIL（默认）
+#   WHATIF_EXPLAIN = True：在页面进程内按 what-if 增量重算（见 whatif.py），
+#     与上一次输入相比只改动少数变量时只重算相关的树，单次更快，但在页面进程内计算
+# WORKER_POOL_SIZE 为 0 时总是使用 what-if 增量重算
+# =========================
+WORKER_POOL_SIZE = 2
+WORKER_RING_SLOTS = 256
+WORKER_MAX_BATCH = 32
+WORKER_TIMEOUT = 30.0
+WHATIF_EXPLAIN = False
+
+
+# =========================
+# 模型内部实际使用的14个变量
+# 顺序必须与训练模型完全一致
+# =========================
+FEATURE_NAMES = [
+    "HDL-C",
+    "TC",
+    "LDL-C",
+    "TG",
+    "Glucose",
+    "lnCu+10",
+    "lnAs+10",
+    "lnPb+10",
+    "GGT",
+    "SF",
+    "ChE",
+    "PTA",
+    "lnCd+10",
+    "Tg"
+]
+
+
+# =========================
+# 网页输入项（原始值）
+# 与 FEATURE_NAMES 一一对应
+# =========================
+INPUT_ORDER = [
+    "HDL-C",
+    "TC",
+    "LDL-C",
+    "TG",
+    "Glucose",
+    "Cu",
+    "As",
+    "Pb",
+    "GGT",
+    "SF",
+    "ChE",
+    "PTA",
+    "Cd",
+    "Tg"
+]
+
+
+# =========================
+# 需要做 ln(x)+10 转换的变量
+# 模型变量名 -> 原始输入名
+# =========================
+LOG_INPUTS = {
+    "lnCu+10": "Cu",
+    "lnAs+10": "As",
+    "lnPb+10": "Pb",
+    "lnCd+10": "Cd"
+}
+
+
+# =========================
+# 网页输入名称（输入原始值）
+# =========================
+INPUT_LABELS = {
+    "HDL-C": "高密度脂蛋白胆固醇（HDL-C）",
+    "TC": "总胆固醇（TC）",
+    "LDL-C": "低密度脂蛋白胆固醇（LDL-C）",
+    "TG": "甘油三酯（TG）",
+    "Glucose": "葡萄糖（Glucose）",
+    "Cu": "铜原始值（Cu）",
+    "As": "砷原始值（As）",
+    "Pb": "铅原始值（Pb）",
+    "GGT": "γ-谷氨酰转肽酶（GGT）",
+    "SF": "铁蛋白（SF）",
+    "ChE": "胆碱酯酶（ChE）",
+    "PTA": "凝血酶原活动度（PTA）",
+    "Cd": "镉原始值（Cd）",
+    "Tg": "甲状腺球蛋白（Tg）"
+}
+
+
+# =========================
+# 模型变量中文名称（SHAP/回显）
+# =========================
+FEATURE_LABELS = {
+    "HDL-C": "高密度脂蛋白胆固醇（HDL-C）",
+    "TC": "总胆固醇（TC）",
+    "LDL-C": "低密度脂蛋白胆固醇（LDL-C）",
+    "TG": "甘油三酯（TG）",
+    "Glucose": "葡萄糖（Glucose）",
+    "lnCu+10": "ln(Cu)+10（铜）",
+    "lnAs+10": "ln(As)+10（砷）",
+    "lnPb+10": "ln(Pb)+10（铅）",
+    "GGT": "γ-谷氨酰转肽酶（GGT）",
+    "SF": "铁蛋白（SF）",
+    "ChE": "胆碱酯酶（ChE）",
+    "PTA": "凝血酶原活动度（PTA）",
+    "lnCd+10": "ln(Cd)+10（镉）",
+    "Tg": "甲状腺球蛋白（Tg）"
+}
+
+
+# =========================
+# 9 变量模型（与 中文数据.xlsx / 英文数据.xlsx 列顺序一致）
+# =========================
+FEATURE_NAMES_9VARS = ["BMI", "As", "Cd", "低密度脂蛋白", "前白蛋白", "淋巴细胞百分比", "胆碱酯酶", "葡萄糖", "年龄"]
+FEATURE_NAMES_9VARS_EN = ["BMI", "As", "Cd", "LDL", "PA", "LY%", "ChE", "Glucose", "Age"]
+
+# 英文表头 -> 中文表头（两份数据表列一一对应）
+FEATURE_ALIASES_9VARS = dict(zip(FEATURE_NAMES_9VARS_EN, FEATURE_NAMES_9VARS))
+
+
+# =========================
+# 模型配置
+# 批量评分等命令行工具通过名称选择
+# =========================
+MODEL_SPECS = {
+    "14vars": {
+        "model_path": MODEL_PATH,
+        "metrics_path": METRICS_PATH,
+        "feature_names": FEATURE_NAMES
+    },
+    "9vars": {
+        "model_path": MODEL_9VARS_PATH,
+        "metrics_path": None,
+        "feature_names": FEATURE_NAMES_9VARS
+    }
+}
@@ -0,0 +1,339 @@
+import time
+from dataclasses import dataclass, field
+from itertools import combinations
+
+import numpy as np
+
+from .config import COUNTERFACTUAL_BUDGET_MS, COUNTERFACTUAL_MAX_CHANGES, INPUT_DECIMALS, LOG_INPUTS
+from .utils import cli_parser, logit, sigmoid
+
+
+# =========================
+# 反事实结果
+# changes：每个改动的变量 (模型变量名, 网页输入名, 原始值, 建议值)，均为原始单位
+# complete：在时间预算内完成搜索（False 时结果为预算内找到的最优解或未找到）
+# =========================
+@dataclass
+class CounterfactualResult:
+    found: bool
+    changes: list
+    proba_before: float
+    proba_after: float
+    threshold: float
+    cost: float
+    complete: bool
+    sets_evaluated: int
+    sets_pruned: int
+    candidates_evaluated: int
+    seconds: float
+    model_input: np.ndarray = field(default=None, repr=False)
+
+    def to_frame(self, labels=None):
+        import pandas as pd
+
+        labels = labels or {}
+        return pd.DataFrame({
+            "指标": [labels.get(raw, raw) for _, raw, _, _ in self.changes],
+            "当前值": [before for _, _, before, _ in self.changes],
+            "建议值": [after for _, _, _, after in self.changes],
+        })
+
+
+# =========================
+# 基于树结构的反事实搜索
+# - 模型对每个变量是分段常数，分段点只可能是该变量上的分裂阈值；
+#   每个分段取离当前值最近的一点（换回网页原始单位并按输入精度取整）作为候选
+# - 按改动变量数 1, 2, 3 ... 依次搜索，找到即停止（改动的变量最少）；
+#   同样个数时取标准化尺度上改动总量最小的组合
+# - 剪枝：变量集合 S 可自由取值、其余变量固定时，每棵树能达到的最小（或最大）叶子值
+#   之和给出 margin 的乐观界；界都无法越过阈值的集合直接跳过
+# - 只重算与 S 相关的树，其余树的贡献固定
+# - 超出时间预算即停止，返回已找到的最优解
+# 前处理只支持按列独立的 SimpleImputer / StandardScaler（与 FlatPreprocessor 相同）
+# =========================
+class CounterfactualEngine:
+    def __init__(self, ensemble, preprocessor, threshold, feature_names):
+        self.ensemble = ensemble
+        self.preprocessor = preprocessor
+        self.threshold = float(threshold)
+        self.threshold_margin = logit(self.threshold)
+        self.feature_names = list(feature_names)
+
+        n_features = ensemble.num_features
+        internal = np.flatnonzero(~ensemble.is_leaf)
+        n_nodes = ensemble.num_nodes
+        roots = ensemble.roots.astype(np.intp)
+        self.tree_of_node = np.repeat(np.arange(ensemble.num_trees), np.diff(np.append(roots, n_nodes)))
+
+        self.thresholds = [np.unique(ensemble.threshold[internal[ensemble.feature[internal] == j]])
+                           for j in range(n_features)]
+        self.trees_by_feature = [np.unique(self.tree_of_node[internal[ensemble.feature[internal] == j]])
+                                 for j in range(n_features)]
+
+        # 标准化（scale）参数：tree 空间 <-> 模型输入
+        self.mean = np.zeros(n_features)
+        self.scale = np.ones(n_features)
+        for op in preprocessor.ops:
+            if op[0] == "scale":
+                self.mean = self.mean + op[1] * self.scale
+                self.scale = self.scale * op[2]
+
+    @classmethod
+    def from_pipeline(cls, model, threshold, feature_names):
+        from .tree_engine import FlatTreeModel
+
+        flat_model = FlatTreeModel.from_pipeline(model)
+        return cls(flat_model.ensemble, flat_model.preprocessor, threshold, feature_names)
+
+    # =========================
+    # 单位换算：网页原始值 <-> 模型输入 <-> tree 空间
+    # =========================
+    def _to_raw(self, j, model_value):
+        feature = self.feature_names[j]
+        return float(np.exp(model_value - 10)) if feature in LOG_INPUTS else float(model_value)
+
+    def _to_model(self, j, raw_value):
+        feature = self.feature_names[j]
+        return float(np.log(raw_value) + 10) if feature in LOG_INPUTS else float(raw_value)
+
+    def _round_raw(self, j, raw_value, direction):
+        # 普通变量按网页输入精度取整；ln 变量（原始值很小）保留 4 位有效数字；向远离当前值的方向取整
+        if self.feature_names[j] in LOG_INPUTS:
+            if raw_value <= 0:
+                return raw_value
+            step = 10.0 ** (np.floor(np.log10(raw_value)) - 3)
+        else:
+            step = 10.0 ** -INPUT_DECIMALS
+        rounded = (np.ceil if direction > 0 else np.floor)(raw_value / step) * step
+        return float(round(rounded, 12))
+
+    # =========================
+    # 变量 j 的候选取值（tree 空间，float32）
+    # 每个不含当前值的分段取一个点，尽量靠近当前值
+    # =========================
+    def _candidates(self, j, x_tree):
+        current = x_tree[j]
+        values, raws = [], []
+        cuts = self.thresholds[j]
+        if len(cuts) == 0 or np.isnan(current):
+            return np.empty(0, dtype=np.float32), []
+
+        bounds = np.concatenate([[-np.inf], cuts, [np.inf]])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            if lo <= current < hi:
+                continue
+            if hi <= current:
+                direction = -1
+                target = np.nextafter(np.float32(hi), np.float32(-np.inf))
+            else:
+                direction = 1
+                target = np.float32(lo)
+
+            raw = self._to_raw(j, float(target) * self.scale[j] + self.mean[j])
+            rounded = self._round_raw(j, raw, direction)
+            if self.feature_names[j] in LOG_INPUTS and rounded <= 0:
+                continue
+            tree_value = np.float32((self._to_model(j, rounded) - self.mean[j]) / self.scale[j])
+            if not (lo <= tree_value < hi):
+                tree_value, rounded = np.float32(target), raw
+            values.append(tree_value)
+            raws.append(rounded)
+        return np.asarray(values, dtype=np.float32), raws
+
+    # 变量集合 S 可自由取值时，margin 能达到的最小 / 最大值（乐观界）
+    def _margin_bound(self, x_tree, free, lower):
+        ens = self.ensemble
+        free = set(free)
+        pick = min if lower else max
+        total = 0.0
+        for t in np.unique(np.concatenate([self.trees_by_feature[j] for j in free])):
+            stack, best = [int(ens.roots[t])], None
+            while stack:
+                node = stack.pop()
+                if ens.is_leaf[node]:
+                    value = float(ens.value[node])
+                    best = value if best is None else pick(best, value)
+                    continue
+                f = int(ens.feature[node])
+                if f in free:
+                    stack.extend([int(ens.left[node]), int(ens.right[node])])
+                else:
+                    xv = x_tree[f]
+                    go_left = ens.default_left[node] if np.isnan(xv) else xv < ens.threshold[node]
+                    stack.append(int(ens.left[node] if go_left else ens.right[node]))
+            total += best
+        return total
+
+    def search(self, user_input, features=None, max_changes=COUNTERFACTUAL_MAX_CHANGES,
+               budget_ms=COUNTERFACTUAL_BUDGET_MS):
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000.0
+        ens = self.ensemble
+
+        x_model = np.asarray(user_input, dtype=float).reshape(-1)
+        x_tree = self.preprocessor.transform(x_model.reshape(1, -1))[0].astype(np.float32)
+        leaves = ens.apply(x_tree)[0]
+        tree_values = ens.value[leaves].astype(np.float64)
+        margin = ens.base_margin + tree_values.sum()
+        proba_before = float(sigmoid(margin))
+
+        # 阳性 -> 找降到阈值以下的改动；阴性 -> 找升到阈值以上的改动
+        lower = margin >= self.threshold_margin
+        flips = (lambda m: m < self.threshold_margin) if lower else (lambda m: m >= self.threshold_margin)
+
+        allowed = [self.feature_names.index(f) for f in features] if features else list(range(len(self.feature_names)))
+        allowed = [j for j in allowed if len(self.thresholds[j]) > 0]
+        candidates = {j: self._candidates(j, x_tree) for j in allowed}
+        allowed = [j for j in allowed if len(candidates[j][0]) > 0]
+
+        stats = {"sets_evaluated": 0, "sets_pruned": 0, "candidates_evaluated": 0}
+        best = None
+        complete = True
+
+        for size in range(1, max_changes + 1):
+            # 按乐观界排序，界最有希望的集合先算；无法越过阈值的集合剪掉
+            sets = []
+            for subset in combinations(allowed, size):
+                trees = np.unique(np.concatenate([self.trees_by_feature[j] for j in subset]))
+                fixed = margin - tree_values[trees].sum()
+                bound = fixed + self._margin_bound(x_tree, subset, lower)
+                if not flips(bound):
+                    stats["sets_pruned"] += 1
+                    continue
+                sets.append((bound if lower else -bound, subset, trees, fixed))
+                if time.perf_counter() > deadline:
+                    complete = False
+                    break
+            sets.sort(key=lambda item: item[0])
+
+            for _, subset, trees, fixed in sets:
+                if time.perf_counter() > deadline:
+                    complete = False
+                    break
+                found, truncated = self._search_subset(x_tree, subset, trees, fixed, candidates, flips, deadline, stats)
+                if found is not None and (best is None or found[0] < best[0]):
+                    best = found
+                if truncated:
+                    complete = False
+                    break
+            if best is not None or not complete:
+                break
+
+        changes, proba_after, cost, model_input = [], proba_before, 0.0, x_model.copy()
+        if best is not None:
+            cost, subset, raws, margin_after = best
+            proba_after = float(sigmoid(margin_after))
+            for j, raw in zip(subset, raws):
+                feature = self.feature_names[j]
+                changes.append((feature, LOG_INPUTS.get(feature, feature), self._to_raw(j, x_model[j]), raw))
+                model_input[j] = self._to_model(j, raw)
+
+        return CounterfactualResult(
+            found=best is not None,
+            changes=changes,
+            proba_before=proba_before,
+            proba_after=proba_after,
+            threshold=self.threshold,
+            cost=float(cost),
+            complete=complete,
+            seconds=time.perf_counter() - start,
+            model_input=model_input,
+            **stats
+        )
+
+    # =========================
+    # 在变量集合上枚举所有候选组合（分块批量评分，只算相关的树）
+    # 返回 (最优解, 是否因超时未枚举完)；最优解为 (改动总量, 变量, 建议原始值, margin) 或 None
+    # =========================
+    def _search_subset(self, x_tree, subset, trees, fixed, candidates, flips, deadline, stats, chunk=20000):
+        ens = self.ensemble
+        roots = ens.roots[trees]
+        grids = [candidates[j][0] for j in subset]
+        costs = [np.abs(candidates[j][0].astype(np.float64) - x_tree[j]) for j in subset]
+        shape = tuple(len(g) for g in grids)
+        total = int(np.prod(shape))
+        stats["sets_evaluated"] += 1
+
+        best = None
+        for lo in range(0, total, chunk):
+            if time.perf_counter() > deadline:
+                return best, True
+            idx = np.unravel_index(np.arange(lo, min(lo + chunk, total)), shape)
+            rows = np.tile(x_tree, (len(idx[0]), 1))
+            cost = np.zeros(len(idx[0]))
+            for j, grid, c, ix in zip(subset, grids, costs, idx):
+                rows[:, j] = grid[ix]
+                cost += c[ix]
+
+            margins = fixed + ens.value.take(ens.apply(rows, roots=roots)).sum(axis=1, dtype=np.float64)
+            stats["candidates_evaluated"] += len(rows)
+            ok = np.flatnonzero(flips(margins))
+            if len(ok):
+                k = ok[np.argmin(cost[ok])]
+                if best is None or cost[k] < best[0]:
+                    raws = [candidates[j][1][ix[k]] for j, ix in zip(subset, idx)]
+                    best = (float(cost[k]), subset, raws, float(margins[k]))
+        return best, False
+
+
+def main(argv=None):
+    from .cohort import load_training_cohort, synthetic_cohort
+    from .predictor import GDMPredictor
+
+    parser = cli_parser(
+        "counterfactual",
+        "反事实搜索：对一批阳性患者找到降到阈值以下所需改动最少的指标组合，统计耗时并用原始 pipeline 复核。",
+        seed=True
+    )
+    parser.add_argument("--rows", type=int, default=0,
+                        help="改用合成数据的行数（默认 0 表示使用训练数据表）")
+    parser.add_argument("--patients", type=int, default=30)
+    parser.add_argument("--max-changes", type=int, default=COUNTERFACTUAL_MAX_CHANGES)
+    parser.add_argument("--budget-ms", type=float, default=COUNTERFACTUAL_BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec, cache=None)
+    engine = CounterfactualEngine.from_pipeline(predictor.model, predictor.threshold, predictor.feature_names)
+
+    if args.rows > 0:
+        X = synthetic_cohort(predictor, args.rows, args.seed)
+        source = f"合成数据 {args.rows} 行"
+    else:
+        cohort = load_training_cohort(predictor.feature_names)
+        if cohort is None:
+            raise SystemExit(f"❌ 没有包含 {args.spec} 模型变量的训练数据表，请用 --rows 指定合成数据行数。")
+        X, source = cohort.X, cohort.source
+
+    rng = np.random.default_rng(args.seed)
+
+    proba, labels = predictor.predict_batch(X)
+    positives = X[labels == 1]
+    positives = positives[rng.permutation(len(positives))[:args.patients]]
+    print(f"模型文件：{predictor.model_path}（阈值 {predictor.threshold:.2f}）；数据：{source}，阳性 {len(positives)} 例")
+    print("各变量分裂阈值个数：" + "，".join(f"{n} {len(t)}" for n, t in zip(predictor.feature_names, engine.thresholds)))
+
+    times, sizes, verified, incomplete = [], [], 0, 0
+    for row in positives:
+        result = engine.search(row, max_changes=args.max_changes, budget_ms=args.budget_ms)
+        times.append(result.seconds)
+        incomplete += not result.complete
+        if result.found:
+            sizes.append(len(result.changes))
+            check = predictor.model.predict_proba(result.model_input.reshape(1, -1))[0, 1]
+            verified += bool(check < predictor.threshold)
+
+    times = np.asarray(times) * 1e3
+    print(f"找到反事实 {len(sizes)}/{len(positives)} 例（原始 pipeline 复核通过 {verified}），"
+          f"改动变量数分布 {dict(zip(*np.unique(sizes, return_counts=True)))}，超出预算 {incomplete} 例")
+    print(f"耗时：中位数 {np.median(times):.1f} ms，P95 {np.percentile(times, 95):.1f} ms，最大 {times.max():.1f} ms"
+          f"（预算 {args.budget_ms:.0f} ms）")
+
+    result = engine.search(positives[0], max_changes=args.max_changes, budget_ms=args.budget_ms)
+    print(f"示例：概率 {result.proba_before:.3f} -> {result.proba_after:.3f}，"
+          f"评估 {result.sets_evaluated} 个变量组合（剪枝 {result.sets_pruned} 个）、{result.candidates_evaluated} 个候选点")
+    for feature, raw, before, after in result.changes:
+        print(f"  {raw}: {before:.4g} -> {after:.4g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from .utils import cli_parser, logit, sigmoid
+
+
+# =========================
+# 提前退出的判定结果（批量）
+# proba_low / proba_high 为概率上下界；全部树都算完时两者相等
+# =========================
+@dataclass
+class EarlyExitResult:
+    labels: np.ndarray
+    proba_low: np.ndarray
+    proba_high: np.ndarray
+    trees_evaluated: np.ndarray
+    num_trees: int
+
+    @property
+    def fraction_evaluated(self):
+        if len(self.trees_evaluated) == 0:
+            return 0.0
+        return float(self.trees_evaluated.mean() / self.num_trees)
+
+
+# =========================
+# 阈值感知的提前退出推理
+# 每棵树的贡献介于其叶子最小值与最大值之间，
+# 预先算好“剩余树”的最小/最大可能 margin（后缀和）：
+#   当前 margin + 剩余最小值 >= 阈值 margin -> 必为阳性
+#   当前 margin + 剩余最大值 <  阈值 margin -> 必为阴性
+# 两种情况都无法再翻转判定，即可停止。
+# 树按叶子值跨度从大到小排序，使不确定区间尽快收窄（求和与顺序无关）。
+# 用于分析判定需要多少棵树：本模型平均仍要评估 65%~75% 的树，逐块检查的开销使实际耗时
+# 高于完整推理（xgboost 批量、FlatTreeEnsemble 单行），因此页面与 GDMPredictor 不使用它
+# =========================
+class EarlyExitEnsemble:
+    def __init__(self, ensemble, threshold, block_size=5, order="range"):
+        if not 0.0 < threshold < 1.0:
+            raise ValueError(f"阈值必须在 (0, 1) 之间：{threshold}")
+
+        self.ensemble = ensemble
+        self.threshold = float(threshold)
+        self.threshold_margin = logit(self.threshold)
+        self.block_size = int(block_size)
+
+        leaf_values = np.where(ensemble.is_leaf, ensemble.value, np.nan).astype(np.float64)
+        roots = ensemble.roots.astype(np.intp)
+        self.tree_min = np.fmin.reduceat(leaf_values, roots)
+        self.tree_max = np.fmax.reduceat(leaf_values, roots)
+
+        if order == "range":
+            self.tree_order = np.argsort(-(self.tree_max - self.tree_min), kind="stable")
+        elif order == "original":
+            self.tree_order = np.arange(ensemble.num_trees)
+        else:
+            raise ValueError(f"未知的树排序方式：{order}")
+
+        # suffix_min[k] / suffix_max[k]：排序后第 k 棵树起剩余树的最小/最大总贡献
+        zero = np.zeros(1)
+        self.suffix_min = np.concatenate([np.cumsum(self.tree_min[self.tree_order][::-1])[::-1], zero])
+        self.suffix_max = np.concatenate([np.cumsum(self.tree_max[self.tree_order][::-1])[::-1], zero])
+        self._ordered_roots = ensemble.roots[self.tree_order]
+
+    @property
+    def num_trees(self):
+        return self.ensemble.num_trees
+
+    def predict(self, X):
+        X = np.array(X, dtype=np.float32, ndmin=2)
+        n_rows = len(X)
+
+        margin = np.full(n_rows, self.ensemble.base_margin, dtype=np.float64)
+        trees_evaluated = np.zeros(n_rows, dtype=np.int64)
+        active = np.arange(n_rows)
+
+        for start in range(0, self.num_trees, self.block_size):
+            if len(active) == 0:
+                break
+            end = min(start + self.block_size, self.num_trees)
+            leaves = self.ensemble.apply(X[active], roots=self._ordered_roots[start:end])
+            margin[active] += self.ensemble.value.take(leaves).sum(axis=1, dtype=np.float64)
+            trees_evaluated[active] = end
+
+            m = margin[active]
+            undecided = ((m + self.suffix_min[end] < self.threshold_margin)
+                         & (m + self.suffix_max[end] >= self.threshold_margin))
+            active = active[undecided]
+
+        margin_low = margin + self.suffix_min[trees_evaluated]
+        margin_high = margin + self.suffix_max[trees_evaluated]
+        return EarlyExitResult(
+            labels=(margin_low >= self.threshold_margin).astype(int),
+            proba_low=sigmoid(margin_low),
+            proba_high=sigmoid(margin_high),
+            trees_evaluated=trees_evaluated,
+            num_trees=self.num_trees
+        )
+
+
+# =========================
+# 前处理 + 提前退出推理
+# =========================
+class EarlyExitModel:
+    def __init__(self, preprocessor, ensemble):
+        self.preprocessor = preprocessor
+        self.ensemble = ensemble
+
+    @classmethod
+    def from_pipeline(cls, model, threshold, **kwargs):
+        from .tree_engine import FlatTreeModel
+
+        flat_model = FlatTreeModel.from_pipeline(model)
+        return cls(flat_model.preprocessor, EarlyExitEnsemble(flat_model.ensemble, threshold, **kwargs))
+
+    @property
+    def threshold(self):
+        return self.ensemble.threshold
+
+    def transform(self, X):
+        return self.preprocessor.transform(X)
+
+    def predict(self, X):
+        return self.ensemble.predict(self.transform(X))
+
+
+def main(argv=None):
+    from .cohort import load_training_cohort
+    from .predictor import GDMPredictor
+
+    parser = cli_parser(
+        "early_exit",
+        "阈值感知的提前退出推理：统计平均评估的树比例，并与完整推理对比判定与耗时。",
+        spec="9vars", spec_help="模型配置（默认 9vars，与内置训练数据表一致）", seed=True
+    )
+    parser.add_argument("--rows", type=int, default=0,
+                        help="改用合成数据的行数（默认 0 表示使用训练数据表）")
+    parser.add_argument("--threshold", type=float, help="判定阈值（默认读取指标文件，缺省 0.30）")
+    parser.add_argument("--block-size", type=int, default=5, help="每评估多少棵树检查一次能否退出")
+    parser.add_argument("--order", default="range", choices=["range", "original"],
+                        help="树的评估顺序：range 按叶子值跨度降序；original 保持训练顺序")
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec, threshold=args.threshold)
+    model = EarlyExitModel.from_pipeline(predictor.model, predictor.threshold,
+                                         block_size=args.block_size, order=args.order)
+
+    if args.rows > 0:
+        rng = np.random.default_rng(args.seed)
+        X = rng.normal(0.0, 1.5, size=(args.rows, len(predictor.feature_names)))
+        source = f"合成数据 {args.rows} 行"
+    else:
+        cohort = load_training_cohort(predictor.feature_names)
+        if cohort is None:
+            raise SystemExit(f"❌ 没有包含 {args.spec} 模型变量的训练数据表，请用 --rows 指定合成数据行数。")
+        X, source = cohort.X, f"{cohort.source} {len(cohort.X)} 行"
+
+    start = time.perf_counter()
+    result = model.predict(X)
+    t_early = time.perf_counter() - start
+
+    start = time.perf_counter()
+    proba, labels = predictor.predict_batch(X)
+    t_full = time.perf_counter() - start
+
+    from .tree_engine import FlatTreeModel
+
+    flat_model = FlatTreeModel.from_pipeline(predictor.model)
+    start = time.perf_counter()
+    flat_model.predict_proba(X)
+    t_flat = time.perf_counter() - start
+
+    within = (proba >= result.proba_low - 1e-6) & (proba <= result.proba_high + 1e-6)
+    mismatched = int((result.labels != labels).sum())
+
+    print(f"模型文件：{predictor.model_path}（阈值：{predictor.threshold:.2f}，树数量：{result.num_trees}）")
+    print(f"数据：{source}")
+    print(f"平均评估树比例：{result.fraction_evaluated:.1%}"
+          f"（全部评估的行占 {np.mean(result.trees_evaluated == result.num_trees):.1%}）")
+    print(f"判定与完整推理不一致：{mismatched} 行；概率落在上下界内：{within.mean():.1%}")
+    print(f"耗时：提前退出 {t_early * 1e3:.1f} ms，完整 predict_proba {t_full * 1e3:.1f} ms，"
+          f"完整展平树推理 {t_flat * 1e3:.1f} ms")
+
+    if mismatched or not within.all():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
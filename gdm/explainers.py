@@ -0,0 +1,170 @@
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .utils import cli_parser, median_ms
+
+
+def _positive_class(value):
+    if isinstance(value, (list, np.ndarray)):
+        value = np.ravel(value)
+        value = value[1] if len(value) > 1 else value[0]
+    return float(value)
+
+
+# =========================
+# 已构建的 TreeExplainer
+# 构建失败时保存异常，之后直接走回退逻辑，不再每次重试
+# lock：同一 explainer 被多个会话并发调用时逐个执行
+# 注意 expected_value 要在 shap_values 之后读取：
+# xgboost 模型计算后会被更新为 pred_contribs 的偏置项
+# =========================
+@dataclass
+class TreeExplainerEntry:
+    explainer: object = None
+    error: Exception | None = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def shap_values(self, input_data):
+        if self.error is not None:
+            raise self.error
+
+        with self.lock:
+            shap_values = self.explainer.shap_values(input_data)
+            expected_value = _positive_class(self.explainer.expected_value)
+
+        if isinstance(shap_values, list):
+            shap_values = shap_values[1] if len(shap_values) > 1 else shap_values[0]
+        return np.asarray(shap_values, dtype=float), expected_value
+
+    # SHAP 交互值：(行数, 变量数, 变量数)，对角线为主效应
+    def shap_interaction_values(self, input_data):
+        if self.error is not None:
+            raise self.error
+
+        with self.lock:
+            interactions = self.explainer.shap_interaction_values(input_data)
+            expected_value = _positive_class(self.explainer.expected_value)
+
+        if isinstance(interactions, list):
+            interactions = interactions[1] if len(interactions) > 1 else interactions[0]
+        return np.asarray(interactions, dtype=np.float32), expected_value
+
+
+# =========================
+# 进程级 explainer 缓存，按模型文件哈希区分
+# 同一模型文件只构建一次，所有页面 / 会话共用
+# =========================
+_explainers = {}
+_explainers_lock = threading.Lock()
+
+
+def _build_tree_explainer(base_model):
+    import shap
+
+    try:
+        return TreeExplainerEntry(explainer=shap.TreeExplainer(base_model))
+    except Exception as e:
+        return TreeExplainerEntry(error=e)
+
+
+def get_tree_explainer(model_hash, base_model):
+    with _explainers_lock:
+        entry = _explainers.get(model_hash)
+        if entry is None:
+            entry = _build_tree_explainer(base_model)
+            _explainers[model_hash] = entry
+        return entry
+
+
+def clear_explainers():
+    with _explainers_lock:
+        _explainers.clear()
+
+
+# =========================
+# XGBoost 原生 TreeSHAP（pred_contribs），不需要导入 shap
+# 返回 (每个特征的贡献, 偏置项)，均为 log-odds 尺度；
+# 偏置项即 TreeExplainer 的 expected_value
+# =========================
+def native_contributions(booster, input_data):
+    import xgboost as xgb
+
+    dmatrix = xgb.DMatrix(np.asarray(input_data, dtype=np.float32), feature_names=booster.feature_names)
+    contribs = booster.predict(dmatrix, pred_contribs=True)
+    return contribs[:, :-1].astype(float), contribs[:, -1].astype(float)
+
+
+# =========================
+# XGBoost 原生 SHAP 交互值（pred_interactions）
+# 返回 (行数 x 变量数 x 变量数 的 float32 张量, 偏置项)
+# =========================
+def native_interactions(booster, input_data):
+    import xgboost as xgb
+
+    dmatrix = xgb.DMatrix(np.asarray(input_data, dtype=np.float32), feature_names=booster.feature_names)
+    interactions = booster.predict(dmatrix, pred_interactions=True)
+    return interactions[:, :-1, :-1].astype(np.float32), interactions[:, -1, -1].astype(float)
+
+
+def main(argv=None):
+    import shap
+
+    from .predictor import GDMPredictor
+
+    parser = cli_parser(
+        "explainers",
+        "对比单次解释耗时（每次新建 TreeExplainer / 复用缓存的 explainer / xgboost 原生 pred_contribs），"
+        "并校验原生贡献与 TreeExplainer 一致。",
+        repeat=20, seed=True
+    )
+    parser.add_argument("--rows", type=int, default=1000, help="一致性校验的合成数据行数")
+    parser.add_argument("--atol", type=float, default=1e-5)
+    args = parser.parse_args(argv)
+
+    tree = GDMPredictor.from_spec(args.spec, cache=None, explain_backend="tree")
+    native = GDMPredictor.from_spec(args.spec, cache=None, explain_backend="native")
+    rng = np.random.default_rng(args.seed)
+    X = rng.normal(0.0, 1.5, size=(args.rows, len(tree.feature_names)))
+    X[rng.random(X.shape) < 0.01] = np.nan
+
+    # 一致性：整批对比 SHAP 向量与基准值
+    # shap 对 xgboost 模型本身就调用 pred_contribs，两者一致不能说明值正确，另外校验可加性：
+    # 贡献之和 + 基准值 = 模型输出（log-odds）
+    input_data = tree.transform(X)
+    expected_values, expected_base = tree.tree_explainer().shap_values(input_data)
+    values, base_values = native_contributions(native.booster, input_data)
+    max_value_diff = float(np.max(np.abs(values - expected_values)))
+    max_base_diff = float(np.max(np.abs(base_values - expected_base)))
+    margin = tree.base_model.predict(input_data, output_margin=True)
+    max_additivity_diff = float(np.max(np.abs(values.sum(axis=1) + base_values - margin)))
+    ok = max(max_value_diff, max_base_diff, max_additivity_diff) <= args.atol
+
+    # 单次解释耗时
+    rows = X[:args.repeat]
+    row_iter = iter(np.tile(rows, (3, 1)))
+
+    def explain_uncached():
+        x = tree.transform(next(row_iter).reshape(1, -1))
+        shap.TreeExplainer(tree.base_model).shap_values(x)
+
+    t_before = median_ms(explain_uncached, args.repeat)
+    tree.explain(rows[:1])
+    t_tree = median_ms(lambda: tree.explain(next(row_iter).reshape(1, -1)), args.repeat)
+    native.explain(rows[:1])
+    t_native = median_ms(lambda: native.explain(next(row_iter).reshape(1, -1)), args.repeat)
+
+    print(f"模型文件：{tree.model_path}（哈希：{tree.model_hash}）")
+    print(f"原生 pred_contribs 与 TreeExplainer（{len(X)} 行）：SHAP 最大误差 {max_value_diff:.3e}，"
+          f"基准值最大误差 {max_base_diff:.3e}，可加性最大误差 {max_additivity_diff:.3e} -> {'通过' if ok else '失败'}")
+    print(f"单次解释（每次新建 TreeExplainer）：{t_before:.2f} ms")
+    print(f"单次解释（复用缓存的 TreeExplainer）：{t_tree:.2f} ms")
+    print(f"单次解释（xgboost 原生 pred_contribs）：{t_native:.2f} ms")
+
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .cohort import load_training_cohort, require_training_cohort
+from .config import CACHE_DIR
+
+
+# =========================
+# 全局 SHAP 汇总（离线计算，按模型文件哈希缓存）
+# 在训练队列数据表（见 cohort.py）上计算一次：
+#   mean |SHAP|、平均 SHAP、SHAP 值与变量值的分位数、
+#   依赖图抽样点（同一批行的变量值与 SHAP 值）
+# 结果保存为 JSON，放在模型文件旁边：
+#   <模型文件名>.shap_summary.<哈希>.json
+# 模型目录不可写时保存到 CACHE_DIR。
+# 页面直接读取缓存显示；缓存不存在时现场计算一次并保存。
+# 只在真实训练数据上计算：没有包含模型变量的训练数据表时不计算，页面不显示全局汇总
+# =========================
+SUMMARY_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+DEPENDENCE_SAMPLES = 400
+
+_summaries = {}
+_summaries_lock = threading.Lock()
+
+
+def summary_paths(model_path, model_hash):
+    model_path = Path(model_path)
+    name = f"{model_path.stem}.shap_summary.{model_hash}.json"
+    return [model_path.parent / name, CACHE_DIR / name]
+
+
+def _nan_quantiles(values):
+    return {str(q): np.nanquantile(values, q, axis=0).round(6).tolist() for q in SUMMARY_QUANTILES}
+
+
+def compute_summary(predictor, X=None, source=None, samples=DEPENDENCE_SAMPLES, seed=0):
+    if X is None:
+        cohort = require_training_cohort(predictor.feature_names)
+        X, source = cohort.X, cohort.source
+    X = np.asarray(X, dtype=float)
+
+    start = time.perf_counter()
+    values, base_values, fallback_reason = predictor.contributions(predictor.transform(X))
+    seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    index = np.sort(rng.choice(len(X), min(samples, len(X)), replace=False))
+    mean_abs = np.abs(values).mean(axis=0)
+
+    return {
+        "model_file": Path(predictor.model_path).name,
+        "model_hash": predictor.model_hash,
+        "explain_backend": predictor.explain_backend,
+        "fallback_reason": fallback_reason,
+        "source": source,
+        "rows": int(len(X)),
+        "seconds": round(seconds, 4),
+        "feature_names": list(predictor.feature_names),
+        "base_value": float(np.mean(base_values)),
+        "mean_abs": mean_abs.round(6).tolist(),
+        "mean": values.mean(axis=0).round(6).tolist(),
+        "order": np.argsort(-mean_abs).tolist(),
+        "shap_quantiles": _nan_quantiles(values),
+        "value_quantiles": _nan_quantiles(X),
+        "dependence": {
+            "rows": index.tolist(),
+            "values": np.where(np.isnan(X[index]), None, X[index].round(6)).tolist(),
+            "shap": values[index].round(6).tolist()
+        }
+    }
+
+
+def save_summary(summary, model_path):
+    text = json.dumps(summary, ensure_ascii=False)
+    for path in summary_paths(model_path, summary["model_hash"]):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(text, encoding="utf-8")
+            tmp.replace(path)
+            return path
+        except OSError:
+            continue
+    raise OSError("无法保存全局 SHAP 汇总：模型目录与缓存目录均不可写。")
+
+
+def load_summary(model_path, model_hash):
+    for path in summary_paths(model_path, model_hash):
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))
+    return None
+
+
+# =========================
+# 页面调用入口：内存 -> 磁盘 -> （compute=True 时）现场计算并保存
+# 没有训练数据表时返回 None
+# =========================
+def get_global_summary(predictor, compute=True):
+    key = predictor.model_hash
+    with _summaries_lock:
+        if key in _summaries:
+            return _summaries[key]
+
+        summary = load_summary(predictor.model_path, key)
+        if summary is None:
+            cohort = load_training_cohort(predictor.feature_names) if compute else None
+            if cohort is None:
+                return None
+            summary = compute_summary(predictor, cohort.X, cohort.source)
+            save_summary(summary, predictor.model_path)
+
+        _summaries[key] = summary
+        return summary
+
+
+# =========================
+# 页面显示用的表格
+# importance：按 mean |SHAP| 降序
+# dependence：某个变量的依赖图抽样点
+# =========================
+def importance_frame(summary, labels=None):
+    import pandas as pd
+
+    labels = labels or {}
+    names = summary["feature_names"]
+    q = summary["shap_quantiles"]
+    rows = []
+    for i in summary["order"]:
+        rows.append({
+            "变量": labels.get(names[i], names[i]),
+            "mean |SHAP|": summary["mean_abs"][i],
+            "平均 SHAP": summary["mean"][i],
+            "SHAP P5": q[str(SUMMARY_QUANTILES[0])][i],
+            "SHAP 中位数": q["0.5"][i],
+            "SHAP P95": q[str(SUMMARY_QUANTILES[-1])][i],
+        })
+    return pd.DataFrame(rows)
+
+
+def dependence_frame(summary, feature):
+    import pandas as pd
+
+    i = summary["feature_names"].index(feature)
+    dep = summary["dependence"]
+    return pd.DataFrame({
+        "变量值": [row[i] for row in dep["values"]],
+        "SHAP 值": [row[i] for row in dep["shap"]]
+    }).dropna()
+
+
+def main(argv=None):
+    from .config import MODEL_SPECS
+    from .predictor import EXPLAIN_BACKENDS, GDMPredictor
+
+    parser = argparse.ArgumentParser(
+        prog="python -m gdm.global_summary",
+        description="离线计算全局 SHAP 汇总（mean |SHAP|、分位数、依赖图抽样点），按模型文件哈希保存在模型旁边。"
+    )
+    parser.add_argument("--spec", nargs="+", default=sorted(MODEL_SPECS), choices=sorted(MODEL_SPECS),
+                        help="要计算的模型配置（默认全部）")
+    parser.add_argument("--explain-backend", default="auto", choices=EXPLAIN_BACKENDS)
+    parser.add_argument("--samples", type=int, default=DEPENDENCE_SAMPLES, help="每个变量的依赖图抽样点数")
+    parser.add_argument("--force", action="store_true", help="已有缓存时也重新计算")
+    args = parser.parse_args(argv)
+
+    for spec in args.spec:
+        predictor = GDMPredictor.from_spec(spec, cache=None, explain_backend=args.explain_backend)
+        cohort = load_training_cohort(predictor.feature_names)
+        if cohort is None:
+            print(f"[{spec}] 没有包含模型变量的训练数据表（config.TRAINING_DATA_PATHS），不计算全局汇总")
+            continue
+        if not args.force and load_summary(predictor.model_path, predictor.model_hash) is not None:
+            print(f"[{spec}] 已有缓存，跳过（--force 重新计算）")
+        else:
+            summary = compute_summary(predictor, cohort.X, cohort.source, samples=args.samples)
+            path = save_summary(summary, predictor.model_path)
+            print(f"[{spec}] {summary['source']}，{summary['rows']} 行，SHAP 计算 {summary['seconds']:.3f} s -> {path}")
+
+        start = time.perf_counter()
+        summary = load_summary(predictor.model_path, predictor.model_hash)
+        t_load = time.perf_counter() - start
+        top = [summary["feature_names"][i] for i in summary["order"][:5]]
+        print(f"[{spec}] 读取缓存 {t_load * 1e3:.2f} ms；mean |SHAP| 前 5：{top}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import threading
+import time
+
+import numpy as np
+
+from .config import CACHE_DIR
+from .utils import cli_parser, median_ms
+
+
+# =========================
+# SHAP 交互值
+# - 训练队列的交互值张量（行数 x 变量数 x 变量数）只计算一次：
+#   多进程分块计算（见 batch_explain.py），按模型文件哈希保存到 CACHE_DIR
+# - 张量对称，只保存上三角（含对角线的主效应），float32：
+#   14 变量时每行 105 个数，约为完整 float64 张量的 27%
+# - 单个患者：复用已缓存的 explainer（native 为 booster 本身），并进入预测缓存
+# - 没有包含模型变量的训练数据表时没有队列交互值，页面只显示患者本人的交互值
+# =========================
+_cohorts = {}
+_cohorts_lock = threading.Lock()
+
+
+def pack_upper(tensor):
+    n_features = tensor.shape[-1]
+    rows, cols = np.triu_indices(n_features)
+    return np.ascontiguousarray(tensor[..., rows, cols], dtype=np.float32)
+
+
+def unpack_upper(packed, n_features):
+    rows, cols = np.triu_indices(n_features)
+    tensor = np.zeros(packed.shape[:-1] + (n_features, n_features), dtype=np.float32)
+    tensor[..., rows, cols] = packed
+    tensor[..., cols, rows] = packed
+    return tensor
+
+
+def interactions_path(model_hash):
+    return CACHE_DIR / f"interactions-{model_hash}.npz"
+
+
+# =========================
+# 训练队列的交互值
+# 返回 dict：packed（上三角，float32）、base_values、data（模型输入）、
+# feature_names、source、mean_abs（变量数 x 变量数，页面排序用）
+# =========================
+def compute_cohort_interactions(predictor, workers=None, chunksize=None, cohort=None):
+    from .batch_explain import DEFAULT_CHUNKSIZE, explain_matrix
+    from .cohort import require_training_cohort
+
+    cohort = cohort or require_training_cohort(predictor.feature_names)
+    X, source = cohort.X, cohort.source
+    tensor, base_values, stats = explain_matrix(
+        predictor, predictor.transform(X), workers=workers or 1,
+        chunksize=chunksize or DEFAULT_CHUNKSIZE, kind="interactions"
+    )
+    return {
+        "packed": pack_upper(tensor),
+        "base_values": base_values,
+        "data": np.asarray(X, dtype=float),
+        "feature_names": np.array(predictor.feature_names),
+        "source": np.array(source),
+        "mean_abs": np.abs(tensor).mean(axis=0)
+    }, stats
+
+
+# 没有训练数据表时返回 None
+def get_cohort_interactions(predictor, workers=None):
+    from .cohort import load_training_cohort
+
+    key = predictor.model_hash
+    with _cohorts_lock:
+        if key in _cohorts:
+            return _cohorts[key]
+
+        path = interactions_path(key)
+        if path.exists():
+            with np.load(path) as data:
+                cohort = {name: data[name] for name in data.files}
+        else:
+            training = load_training_cohort(predictor.feature_names)
+            if training is None:
+                return None
+            cohort, _ = compute_cohort_interactions(predictor, workers, cohort=training)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp.npz")
+            np.savez(tmp, **cohort)
+            tmp.replace(path)
+
+        _cohorts[key] = cohort
+        return cohort
+
+
+# =========================
+# 交互对排序表：按 |交互值| 降序（不含对角线）
+# 交互值在 SHAP 值中对半分摊，这里报告 φ_ij + φ_ji
+# =========================
+def top_pairs(matrix, feature_names, k=10, labels=None, cohort_mean_abs=None):
+    import pandas as pd
+
+    labels = labels or {}
+    n = len(feature_names)
+    rows, cols = np.triu_indices(n, k=1)
+    pair_values = matrix[rows, cols] + matrix[cols, rows]
+    order = np.argsort(-np.abs(pair_values))[:k]
+
+    table = {
+        "变量 1": [labels.get(feature_names[rows[i]], feature_names[rows[i]]) for i in order],
+        "变量 2": [labels.get(feature_names[cols[i]], feature_names[cols[i]]) for i in order],
+        "交互值": pair_values[order].round(4)
+    }
+    if cohort_mean_abs is not None:
+        cohort_pairs = cohort_mean_abs[rows, cols] + cohort_mean_abs[cols, rows]
+        table["队列平均 |交互值|"] = cohort_pairs[order].round(4)
+    return pd.DataFrame(table)
+
+
+def main(argv=None):
+    import os
+
+    import shap
+
+    from .predictor import GDMPredictor
+
+    parser = cli_parser(
+        "interactions",
+        "计算并缓存训练队列的 SHAP 交互值张量，统计单行与整个队列的耗时。",
+        repeat=20, seed=True
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args(argv)
+
+    native = GDMPredictor.from_spec(args.spec, cache=None, explain_backend="native")
+    tree = GDMPredictor.from_spec(args.spec, cache=None, explain_backend="tree")
+    native.booster.set_param({"nthread": 1})
+    rng = np.random.default_rng(args.seed)
+    rows = native.transform(rng.normal(0.0, 1.0, size=(args.repeat * 3, len(native.feature_names))))
+    row_iter = iter(rows)
+
+    print(f"模型文件：{native.model_path}（哈希：{native.model_hash}）")
+
+    # 单行：每次新建 TreeExplainer / 复用缓存的 TreeExplainer / xgboost 原生
+    def uncached():
+        shap.TreeExplainer(tree.base_model).shap_interaction_values(next(row_iter).reshape(1, -1))
+
+    t_uncached = median_ms(uncached, args.repeat)
+    tree.interactions(rows[:1])
+    t_tree = median_ms(lambda: tree.interactions(next(row_iter).reshape(1, -1)), args.repeat)
+    row_iter = iter(rows)
+    t_native = median_ms(lambda: native.interactions(next(row_iter).reshape(1, -1)), args.repeat)
+    t_contrib = median_ms(lambda: native.contributions(rows[:1]), args.repeat)
+    print(f"单行交互值：每次新建 TreeExplainer {t_uncached:.2f} ms，复用 TreeExplainer {t_tree:.2f} ms，"
+          f"原生 pred_interactions {t_native:.2f} ms（对比：单行 SHAP 值 {t_contrib:.2f} ms）")
+
+    # 整个队列
+    from .cohort import load_training_cohort
+
+    if load_training_cohort(native.feature_names) is None:
+        print("没有包含模型变量的训练数据表（config.TRAINING_DATA_PATHS），不计算队列交互值")
+        return
+    for workers in sorted(set(args.workers)):
+        cohort, stats = compute_cohort_interactions(native, workers)
+        print(f"队列交互值（{cohort['source']}，{stats['rows']} 行，进程数 {workers}）："
+              f"启动 {stats['startup_seconds']:.2f} s，计算 {stats['explain_seconds']:.3f} s")
+
+    n = len(native.feature_names)
+    full_mb = stats["rows"] * n * n * 8 / 2 ** 20
+    print(f"存储：上三角 float32 {cohort['packed'].nbytes / 2 ** 20:.2f} MB（完整 float64 张量 {full_mb:.2f} MB）")
+
+    # 一致性：交互值按行求和 = SHAP 值
+    values, _, _ = native.contributions(native.transform(cohort["data"]))
+    tensor = unpack_upper(cohort["packed"], n)
+    print(f"交互值行和 vs SHAP 值：最大误差 {np.max(np.abs(tensor.sum(axis=2) - values)):.2e}")
+
+    # 缓存：首次计算并写入，之后（新进程）直接读取
+    path = interactions_path(native.model_hash)
+    path.unlink(missing_ok=True)
+    timings = []
+    for _ in range(2):
+        _cohorts.pop(native.model_hash, None)
+        start = time.perf_counter()
+        get_cohort_interactions(native)
+        timings.append((time.perf_counter() - start) * 1e3)
+    print(f"缓存 {path}（{path.stat().st_size / 2 ** 20:.2f} MB）：计算并写入 {timings[0]:.1f} ms，读取 {timings[1]:.1f} ms")
+    print(top_pairs(cohort["mean_abs"], list(native.feature_names), k=5).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
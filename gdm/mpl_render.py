@@ -0,0 +1,189 @@
+import io
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import matplotlib
+
+matplotlib.use("Agg", force=True)  # 服务器端只用非交互后端
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from .cache import LRUCache, input_key
+from .config import FIGURE_POOL_SIZE, PNG_CACHE_SIZE
+from .utils import cli_parser
+
+
+# =========================
+# matplotlib 渲染子系统
+# - 强制 Agg 后端
+# - 每次渲染只画在明确的图对象上（show=False），用完只关闭 / 放回这一张图，不动其他会话的图
+# - 瀑布图的图对象从有界池中取用，用完清空放回；超出池容量的图立即关闭
+# - shap 通过 pyplot 的当前图绘制，所有渲染在同一把锁内串行执行
+# - 渲染结果为 PNG 字节，按 (模型, 图类型, 输入, 选项) 缓存
+# 页面用 st.image(png) 显示，不再把 Figure 交给 st.pyplot
+# =========================
+DEFAULT_FIGSIZE = (10, 3)
+
+_render_lock = threading.RLock()
+
+
+class FigurePool:
+    def __init__(self, size=FIGURE_POOL_SIZE):
+        self.size = int(size)
+        self._free = deque()
+        self.created = 0
+        self.reused = 0
+
+    @contextmanager
+    def figure(self, figsize=None):
+        if self._free:
+            fig = self._free.pop()
+            self.reused += 1
+        else:
+            fig = plt.figure()
+            self.created += 1
+
+        fig.clf()
+        fig.set_size_inches(figsize or DEFAULT_FIGSIZE)
+        plt.figure(fig.number)  # 设为当前图，shap 通过 plt.gcf() 绘制
+        try:
+            yield fig
+        finally:
+            fig.clf()
+            if len(self._free) < self.size:
+                self._free.append(fig)
+            else:
+                plt.close(fig)
+
+    def stats(self):
+        return {"size": self.size, "free": len(self._free), "created": self.created, "reused": self.reused}
+
+
+_figure_pool = FigurePool()
+_png_cache = LRUCache(PNG_CACHE_SIZE)
+
+
+def get_figure_pool():
+    return _figure_pool
+
+
+def get_png_cache():
+    return _png_cache
+
+
+def _png_bytes(fig, dpi):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+# =========================
+# 把一次解释渲染为 PNG 字节（不经过缓存）
+# kind："force" 力图 / "waterfall" 瀑布图
+# shap 的这两种图都不接受 ax 参数：
+#   力图内部新建图，show=False 时返回这张图，存为 PNG 后只关闭它；
+#   瀑布图画在当前图上，先把池中的图设为当前图
+# =========================
+def render_explanation_png(explanation, kind="force", feature_names=None, figsize=None,
+                           max_display=10, show_data=True, dpi=100):
+    import shap
+
+    shap_values = shap.Explanation(
+        values=np.asarray(explanation.values, dtype=float),
+        base_values=float(explanation.base_value),
+        data=np.asarray(explanation.data, dtype=float) if show_data else None,
+        feature_names=list(feature_names or explanation.feature_names)
+    )
+
+    if kind not in ("force", "waterfall"):
+        raise ValueError(f"未知的图类型：{kind}")
+
+    with _render_lock:
+        if kind == "force":
+            fig = shap.plots.force(shap_values, matplotlib=True, show=False, figsize=figsize or (20, 3))
+            try:
+                return _png_bytes(fig, dpi)
+            finally:
+                plt.close(fig)
+
+        with _figure_pool.figure(figsize) as fig:
+            shap.plots.waterfall(shap_values, max_display=max_display, show=False)
+            return _png_bytes(fig, dpi)
+
+
+# =========================
+# 页面调用入口：按 (模型, 输入) 缓存 PNG 字节
+# =========================
+def shap_png(predictor, user_input, kind="force", feature_names=None, figsize=None,
+             max_display=10, show_data=True, dpi=100):
+    key = (
+        predictor.model_hash,
+        kind,
+        input_key(user_input),
+        tuple(feature_names) if feature_names is not None else None,
+        tuple(figsize) if figsize is not None else None,
+        max_display,
+        show_data,
+        dpi
+    )
+    png = _png_cache.get(key)
+    if png is None:
+        explanation = predictor.explain(user_input)
+        png = render_explanation_png(explanation, kind, feature_names, figsize, max_display, show_data, dpi)
+        _png_cache.put(key, png)
+    return png
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        import os
+
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(argv=None):
+    from .predictor import GDMPredictor
+
+    parser = cli_parser(
+        "mpl_render",
+        "连续渲染 SHAP 图，观察内存与打开的图数量是否保持平稳，并统计 PNG 缓存命中。",
+        spec="9vars", seed=True
+    )
+    parser.add_argument("--renders", type=int, default=10000, help="渲染请求次数")
+    parser.add_argument("--unique", type=int, default=2000, help="不同输入的个数（超过 PNG 缓存容量时会真正重新渲染）")
+    parser.add_argument("--kind", default="force", choices=["force", "waterfall"])
+    parser.add_argument("--dpi", type=int, default=60)
+    parser.add_argument("--report-every", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec)
+    rng = np.random.default_rng(args.seed)
+    inputs = np.round(rng.normal(0.0, 1.0, size=(args.unique, len(predictor.feature_names))), 2)
+    order = rng.integers(0, args.unique, size=args.renders)
+
+    print(f"模型文件：{predictor.model_path}；图类型：{args.kind}；{args.renders} 次请求，{args.unique} 个不同输入")
+    start = time.perf_counter()
+    rss_start = None
+    for i, k in enumerate(order, start=1):
+        shap_png(predictor, inputs[k:k + 1], args.kind, dpi=args.dpi)
+        if i == min(args.report_every, args.renders):
+            rss_start = _rss_mb()
+        if i % args.report_every == 0 or i == args.renders:
+            print(f"{i:>7} 次：RSS {_rss_mb():7.1f} MB，打开的图 {len(plt.get_fignums())}，"
+                  f"PNG 缓存 {_png_cache.stats()}，图池 {_figure_pool.stats()}，"
+                  f"{(time.perf_counter() - start) / i * 1e3:.1f} ms/次")
+
+    print(f"RSS 变化（第 {min(args.report_every, args.renders)} 次之后）：{_rss_mb() - rss_start:+.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from .cohort import load_training_cohort, require_training_cohort
+from .config import CACHE_DIR, NEIGHBORS_K, NEIGHBORS_LEAF_SIZE
+from .utils import cli_parser, sigmoid
+
+
+# =========================
+# SHAP 空间相似病例检索
+# 训练队列数据表（见 cohort.py）每一行的 SHAP 向量（log-odds 单位）只计算一次，
+# 与原始变量值、真实 GDM 结局一起按模型文件哈希保存到 CACHE_DIR；
+# 启动时在 SHAP 向量上建 KDTree（约 1 ms），当前患者的 SHAP 向量查询 k 个最近邻。
+# 模型文件被替换后哈希改变，自动重新计算并重建索引
+# 没有包含模型变量的训练数据表时不建索引（页面不显示相似病例），不用合成样本充当训练病例
+# =========================
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def neighbors_path(model_hash):
+    return CACHE_DIR / f"neighbors-{model_hash}.npz"
+
+
+@dataclass
+class NeighborIndex:
+    tree: object
+    shap_values: np.ndarray
+    data: np.ndarray
+    outcome: np.ndarray
+    proba: np.ndarray
+    feature_names: list
+    source: str
+    build_seconds: float
+
+    @property
+    def has_outcome(self):
+        return not np.isnan(self.outcome).all()
+
+    # 返回 (距离, 行号)，均为一维数组，按距离升序
+    def query(self, shap_values, k=NEIGHBORS_K):
+        k = min(int(k), len(self.shap_values))
+        dist, index = self.tree.query(np.asarray(shap_values, dtype=float).reshape(1, -1), k=k)
+        return dist[0], index[0]
+
+    # 页面显示用：每个近邻一行（行号、SHAP 距离、真实结局、模型概率、各变量的模型输入值）
+    def to_frame(self, shap_values, k=NEIGHBORS_K, labels=None):
+        import pandas as pd
+
+        labels = labels or {}
+        dist, index = self.query(shap_values, k)
+        frame = pd.DataFrame({
+            "训练数据行号": index + 1,
+            "SHAP 距离": dist.round(4),
+            "真实结局": [
+                "—" if np.isnan(y) else ("GDM" if y >= 0.5 else "非 GDM") for y in self.outcome[index]
+            ],
+            "模型概率": self.proba[index].round(4)
+        })
+        for j, name in enumerate(self.feature_names):
+            frame[labels.get(name, name)] = self.data[index, j]
+        return frame
+
+
+def compute_neighbor_data(predictor, cohort=None):
+    cohort = cohort or require_training_cohort(predictor.feature_names)
+    X, y, source = cohort.X, cohort.outcome, cohort.source
+    values, base_values, _ = predictor.contributions(predictor.transform(X))
+    margin = np.asarray(base_values, dtype=float).reshape(-1) + values.sum(axis=1)
+    return {
+        "shap_values": np.asarray(values, dtype=float),
+        "data": np.asarray(X, dtype=float),
+        "outcome": y,
+        "proba": sigmoid(margin),
+        "feature_names": np.array(predictor.feature_names),
+        "source": np.array(source)
+    }
+
+
+def build_index(arrays, leaf_size=NEIGHBORS_LEAF_SIZE):
+    from sklearn.neighbors import KDTree
+
+    start = time.perf_counter()
+    tree = KDTree(arrays["shap_values"], leaf_size=leaf_size)
+    return NeighborIndex(
+        tree=tree,
+        shap_values=arrays["shap_values"],
+        data=arrays["data"],
+        outcome=arrays["outcome"],
+        proba=arrays["proba"],
+        feature_names=[str(name) for name in arrays["feature_names"]],
+        source=str(arrays["source"]),
+        build_seconds=time.perf_counter() - start
+    )
+
+
+# =========================
+# 页面调用入口：内存 -> 磁盘（SHAP 向量）-> 现场计算并保存；索引在加载后重建
+# 没有训练数据表时返回 None
+# =========================
+def get_neighbor_index(predictor):
+    key = predictor.model_hash
+    with _indexes_lock:
+        if key in _indexes:
+            return _indexes[key]
+
+        path = neighbors_path(key)
+        if path.exists():
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+        else:
+            cohort = load_training_cohort(predictor.feature_names)
+            if cohort is None:
+                return None
+            arrays = compute_neighbor_data(predictor, cohort)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp.npz")
+            np.savez(tmp, **arrays)
+            tmp.replace(path)
+
+        index = build_index(arrays)
+        _indexes[key] = index
+        return index
+
+
+def main(argv=None):
+    from .predictor import GDMPredictor
+
+    parser = cli_parser(
+        "neighbors",
+        "在训练数据的 SHAP 向量上建 KDTree，检索与当前患者最相似的病例，对比暴力检索的耗时。",
+        spec="9vars", repeat=200
+    )
+    parser.add_argument("-k", type=int, default=NEIGHBORS_K)
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec, cache=None)
+    neighbors_path(predictor.model_hash).unlink(missing_ok=True)
+    timings = []
+    for _ in range(2):
+        _indexes.pop(predictor.model_hash, None)
+        start = time.perf_counter()
+        index = get_neighbor_index(predictor)
+        timings.append((time.perf_counter() - start) * 1e3)
+        if index is None:
+            raise SystemExit(f"❌ 没有包含 {args.spec} 模型变量的训练数据表（config.TRAINING_DATA_PATHS），无法检索相似病例。")
+    print(f"模型文件：{predictor.model_path}（哈希：{predictor.model_hash}）")
+    print(f"数据：{index.source}，{len(index.shap_values)} 行，真实结局：{'有' if index.has_outcome else '无'}")
+    print(f"首次（SHAP + 保存 + 建索引）{timings[0]:.1f} ms；之后（读取 + 建索引）{timings[1]:.1f} ms，"
+          f"其中建 KDTree {index.build_seconds * 1e3:.2f} ms")
+
+    # 查询：单个患者的 SHAP 向量 -> k 近邻；与逐行计算距离的暴力检索对照
+    rng = np.random.default_rng(0)
+    queries = index.shap_values[rng.choice(len(index.shap_values), args.repeat)] \
+        + rng.normal(0.0, 0.05, size=(args.repeat, index.shap_values.shape[1]))
+    start = time.perf_counter()
+    results = [index.query(q, args.k)[1] for q in queries]
+    t_tree = (time.perf_counter() - start) / args.repeat
+    start = time.perf_counter()
+    brute = [np.argsort(np.linalg.norm(index.shap_values - q, axis=1))[:args.k] for q in queries]
+    t_brute = (time.perf_counter() - start) / args.repeat
+    same = np.mean([set(a) == set(b) for a, b in zip(results, brute)])
+    print(f"k={args.k} 查询：KDTree {t_tree * 1e3:.3f} ms/次，暴力检索 {t_brute * 1e3:.3f} ms/次；结果一致 {same:.0%}")
+
+    # 端到端：当前患者的 SHAP 向量 + 检索
+    x = index.data[:1]
+    start = time.perf_counter()
+    values, _, _ = predictor.contributions(predictor.transform(x))
+    frame = index.to_frame(values[0], args.k)
+    print(f"单个患者（SHAP + 检索 + 表格）：{(time.perf_counter() - start) * 1e3:.2f} ms")
+    print(frame.to_string(index=False))
+
+    # 留一法：每个训练病例的 k 个近邻（排除自身）中 GDM 的比例，按真实结局分组比较
+    if index.has_outcome:
+        _, rows = index.tree.query(index.shap_values, k=args.k + 1)
+        share = index.outcome[rows[:, 1:]].mean(axis=1)
+        labelled = ~np.isnan(index.outcome)
+        for label, name in ((1, "GDM"), (0, "非 GDM")):
+            mask = labelled & (index.outcome == label)
+            print(f"真实结局为 {name} 的病例（{mask.sum()} 例）：近邻中 GDM 的平均比例 {share[mask].mean():.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from .artifacts import file_hash, load_metrics, load_model, threshold_from_metrics
+from .cache import freeze_explanation, get_prediction_cache, input_key
+from .explainers import get_tree_explainer, native_contributions, native_interactions
+from .config import DEFAULT_THRESHOLD, FEATURE_NAMES, METRICS_PATH, MODEL_PATH, MODEL_SPECS
+from .preprocess import split_pipeline
+
+
+# =========================
+# 单个样本的预测结果
+# =========================
+@dataclass
+class Prediction:
+    proba: float
+    label: int
+    threshold: float
+
+    @property
+    def text(self):
+        return "阳性（GDM）" if self.label == 1 else "阴性（非GDM）"
+
+
+# =========================
+# 单个样本的 SHAP 解释结果
+# base_value / values 均为 log-odds 尺度
+# data 为送入最终模型的（前处理后）输入
+# =========================
+@dataclass
+class Explanation:
+    base_value: float
+    values: np.ndarray
+    data: np.ndarray
+    feature_names: list
+    fallback_reason: str | None = None
+
+    # 转为 shap.Explanation（单行批次，与 explainer(input_data) 的形状一致）
+    def to_shap(self):
+        import shap
+
+        return shap.Explanation(
+            values=self.values.reshape(1, -1),
+            base_values=np.array([self.base_value]),
+            data=self.data.reshape(1, -1),
+            feature_names=self.feature_names
+        )
+
+
+# =========================
+# GDM 预测器
+# 模型与指标文件只加载一次，供所有页面/后端调用
+# engine：
+#   "xgboost" 直接调用 pipeline.predict_proba
+#   "numpy"   使用展平后的树数组推理（见 tree_engine.py），单行延迟更低
+#   "quickscorer" 使用位向量推理（见 quickscorer.py），适合大批量
+# cache：
+#   True 使用进程级共享 LRU 缓存（见 cache.py），单行 predict / explain 命中时直接返回
+#   None 不缓存；也可以传入自己的 LRUCache
+# explain_backend：
+#   "native" 调用 xgboost 原生 pred_contribs（精确 TreeSHAP，无需导入 shap）
+#   "tree"   使用 shap.TreeExplainer
+#   "agnostic" 模型无关的 shap.Explainer + 汇总后的训练背景数据（见 background.py）
+#   "auto"   模型为 xgboost 时用 native，否则用 tree
+# native / tree 失败时也回退到 agnostic
+# =========================
+ENGINES = ("xgboost", "numpy", "quickscorer")
+EXPLAIN_BACKENDS = ("auto", "native", "tree", "agnostic")
+
+
+class GDMPredictor:
+    def __init__(self, model_path=MODEL_PATH, metrics_path=METRICS_PATH,
+                 feature_names=None, threshold=None, engine="xgboost", cache=True,
+                 explain_backend="auto"):
+        if engine not in ENGINES:
+            raise ValueError(f"未知的推理引擎：{engine}，可选：{list(ENGINES)}")
+        if explain_backend not in EXPLAIN_BACKENDS:
+            raise ValueError(f"未知的解释后端：{explain_backend}，可选：{list(EXPLAIN_BACKENDS)}")
+
+        self.model, self.model_path = load_model(model_path)
+        self.model_hash = file_hash(self.model_path)
+        self.metrics, self.metrics_path = load_metrics(metrics_path)
+
+        if not hasattr(self.model, "predict_proba"):
+            raise TypeError("当前模型不支持 predict_proba。")
+
+        if threshold is None:
+            threshold = threshold_from_metrics(self.metrics, DEFAULT_THRESHOLD)
+        self.threshold = float(threshold)
+
+        if feature_names is None and isinstance(self.metrics, dict):
+            feature_names = self.metrics.get("features", None)
+        self.feature_names = list(feature_names or FEATURE_NAMES)
+
+        self.preprocess_steps, self.base_model = split_pipeline(self.model)
+        self.booster = self.base_model.get_booster() if hasattr(self.base_model, "get_booster") else None
+
+        if explain_backend == "auto":
+            explain_backend = "native" if self.booster is not None else "tree"
+        elif explain_backend == "native" and self.booster is None:
+            raise ValueError("当前模型不是 xgboost 模型，无法使用 native 解释后端。")
+        self.explain_backend = explain_backend
+
+        self.engine = engine
+        if engine == "numpy":
+            from .tree_engine import FlatTreeModel
+
+            self.scorer = FlatTreeModel.from_pipeline(self.model)
+        elif engine == "quickscorer":
+            from .quickscorer import QuickScorerModel
+
+            self.scorer = QuickScorerModel.from_pipeline(self.model)
+        else:
+            self.scorer = self.model
+        self._whatif = None
+        self._counterfactual = None
+        self.cache = get_prediction_cache() if cache is True else (cache or None)
+
+    # =========================
+    # 按 config.MODEL_SPECS 中的名称创建（"14vars" / "9vars"）
+    # =========================
+    @classmethod
+    def from_spec(cls, name, **overrides):
+        if name not in MODEL_SPECS:
+            raise KeyError(f"未知的模型配置：{name}，可选：{list(MODEL_SPECS)}")
+        return cls(**{**MODEL_SPECS[name], **overrides})
+
+    # =========================
+    # pipeline 前处理（imputer/scaler）
+    # =========================
+    def transform(self, X):
+        x = np.asarray(X, dtype=float)
+        for step_obj in self.preprocess_steps:
+            if hasattr(step_obj, "transform"):
+                x = step_obj.transform(x)
+        return x
+
+    def predict_batch(self, X):
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        proba = self.scorer.predict_proba(X)[:, 1]
+        labels = (proba >= self.threshold).astype(int)
+        return proba, labels
+
+    # =========================
+    # 缓存键：模型文件哈希 + 阈值 + 精确的模型输入
+    # 输入变量数与模型不符时不缓存（交给模型本身报错）
+    # 评分进程池、敏感性分析等在预测器之外计算的结果也用它放进同一个预测缓存
+    # =========================
+    def cache_key(self, kind, user_input):
+        if self.cache is None or np.size(user_input) != len(self.feature_names):
+            return None
+        return (self.model_hash, self.threshold, kind, input_key(user_input))
+
+    def predict(self, user_input):
+        key = self.cache_key("predict", user_input)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        proba, labels = self.predict_batch(user_input)
+        prediction = Prediction(float(proba[0]), int(labels[0]), self.threshold)
+        if key is not None:
+            self.cache.put(key, prediction)
+        return prediction
+
+    # =========================
+    # what-if 增量重算（见 whatif.py）
+    # previous 为上一次返回的 WhatIfState；只有少数变量改动时只重算相关的树
+    # 返回 (Prediction, Explanation, WhatIfState)
+    # =========================
+    def what_if(self, user_input, previous=None):
+        if self._whatif is None:
+            from .whatif import WhatIfEngine
+
+            self._whatif = WhatIfEngine.from_pipeline(self.model, self.threshold)
+        state = self._whatif.evaluate(user_input, previous)
+
+        prediction = Prediction(state.proba, state.label, self.threshold)
+        explanation = Explanation(
+            base_value=state.base_value,
+            values=state.shap_values,
+            data=state.x.astype(float),
+            feature_names=self.feature_names
+        )
+        return prediction, explanation, state
+
+    # =========================
+    # 反事实：改动最少的指标使判定翻转（见 counterfactual.py）
+    # features 为允许改动的模型变量（None 为全部）；结果进入预测缓存
+    # =========================
+    def counterfactual(self, user_input, features=None, **options):
+        kind = ("counterfactual", tuple(features or ()), tuple(sorted(options.items())))
+        key = self.cache_key(kind, user_input)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        if self._counterfactual is None:
+            from .counterfactual import CounterfactualEngine
+
+            self._counterfactual = CounterfactualEngine.from_pipeline(self.model, self.threshold, self.feature_names)
+        result = self._counterfactual.search(user_input, features, **options)
+        if key is not None and result.complete:
+            self.cache.put(key, result)
+        return result
+
+    # =========================
+    # SHAP 解释
+    # TreeExplainer 失败时，回退到通用 Explainer（背景为汇总后的训练数据）
+    # =========================
+    def explain(self, user_input):
+        key = self.cache_key("explain", user_input)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        explanation = freeze_explanation(self._explain(user_input))
+        if key is not None:
+            self.cache.put(key, explanation)
+        return explanation
+
+    # =========================
+    # TreeExplainer 按模型文件哈希只构建一次，与 st.cache_resource 中的模型一起复用
+    # =========================
+    def tree_explainer(self):
+        return get_tree_explainer(self.model_hash, self.base_model)
+
+    # 通用 Explainer：背景数据按模型文件哈希保存到磁盘，首次使用时生成
+    def agnostic_explainer(self):
+        from .background import get_agnostic_explainer
+
+        return get_agnostic_explainer(self)
+
+    # 页面加载模型时调用：需要 TreeExplainer / 通用 Explainer 的后端在此提前构建
+    def prepare_explainer(self):
+        if self.explain_backend == "tree":
+            self.tree_explainer()
+        elif self.explain_backend == "agnostic":
+            self.agnostic_explainer()
+
+    # =========================
+    # 多行 SHAP 值（输入为前处理后的数据）
+    # 返回 (values: 行数 x 变量数, base_values: 每行的基准值, 回退原因)
+    # =========================
+    def contributions(self, input_data):
+        input_data = np.asarray(input_data, dtype=float)
+        fallback_reason = None
+        try:
+            if self.explain_backend == "native":
+                values, base_values = native_contributions(self.booster, input_data)
+            elif self.explain_backend == "tree":
+                values, base_values = self.tree_explainer().shap_values(input_data)
+            else:
+                values, base_values = self.agnostic_explainer().shap_values(input_data)
+
+        except Exception as e1:
+            if self.explain_backend == "agnostic":
+                raise
+            values, base_values = self.agnostic_explainer().shap_values(input_data)
+            fallback_reason = str(e1)
+
+        base_values = np.broadcast_to(np.asarray(base_values, dtype=float), (len(input_data),))
+        return np.asarray(values, dtype=float), base_values, fallback_reason
+
+    # =========================
+    # SHAP 交互值（输入为前处理后的数据）
+    # 返回 (行数 x 变量数 x 变量数 的 float32 张量, 每行的基准值)
+    # 通用 Explainer 不支持交互值
+    # =========================
+    def interactions(self, input_data):
+        input_data = np.asarray(input_data, dtype=float)
+        if self.explain_backend == "native":
+            values, base_values = native_interactions(self.booster, input_data)
+        elif self.explain_backend == "tree":
+            values, base_values = self.tree_explainer().shap_interaction_values(input_data)
+        else:
+            raise ValueError("通用 Explainer 后端不支持 SHAP 交互值，请使用 native 或 tree。")
+        return values, np.broadcast_to(np.asarray(base_values, dtype=float), (len(input_data),))
+
+    # 单个患者的交互值矩阵（变量数 x 变量数），进入预测缓存
+    def explain_interactions(self, user_input):
+        key = self.cache_key("interactions", user_input)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        input_data = self.transform(np.asarray(user_input, dtype=float).reshape(1, -1))
+        matrix = self.interactions(input_data)[0][0]
+        matrix.flags.writeable = False
+        if key is not None:
+            self.cache.put(key, matrix)
+        return matrix
+
+    def _explain(self, user_input):
+        input_data = self.transform(np.asarray(user_input, dtype=float).reshape(1, -1))
+        values, base_values, fallback_reason = self.contributions(input_data)
+
+        return Explanation(
+            base_value=float(base_values[0]),
+            values=values[0],
+            data=input_data[0],
+            feature_names=self.feature_names,
+            fallback_reason=fallback_reason
+        )
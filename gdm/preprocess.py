@@ -0,0 +1,101 @@
+import numpy as np
+
+from .config import FEATURE_ALIASES_9VARS, FEATURE_NAMES, INPUT_DECIMALS, LOG_INPUT_DECIMALS, LOG_INPUTS
+
+
+# =========================
+# 原始值转换为 ln(x)+10
+# =========================
+def transform_ln_plus_10(x, var_name):
+    if x <= 0:
+        raise ValueError(f"{var_name} 原始值必须大于 0，才能进行 ln(x)+10 转换。")
+    return np.log(x) + 10
+
+
+# =========================
+# 网页原始输入按控件显示精度取整
+# Cu / As / Pb / Cd 保留 4 位小数，其余保留 2 位
+# 显示相同的输入得到相同的模型输入（以及相同的缓存键）
+# =========================
+def quantize_raw_inputs(raw_inputs):
+    log_raw_names = set(LOG_INPUTS.values())
+    return {
+        name: round(float(value), LOG_INPUT_DECIMALS if name in log_raw_names else INPUT_DECIMALS) + 0.0
+        for name, value in raw_inputs.items()
+    }
+
+
+# =========================
+# 网页原始输入 -> 模型输入（单行）
+# Cu / As / Pb / Cd 会自动转成 ln(x)+10
+# =========================
+def build_model_input(raw_inputs, feature_names=FEATURE_NAMES):
+    model_inputs = []
+    for feature in feature_names:
+        if feature in LOG_INPUTS:
+            raw_name = LOG_INPUTS[feature]
+            model_inputs.append(transform_ln_plus_10(raw_inputs[raw_name], raw_name))
+        else:
+            model_inputs.append(raw_inputs[feature])
+    return np.array([model_inputs], dtype=float)
+
+
+# =========================
+# 原始值转换为 ln(x)+10（整列向量化）
+# =========================
+def transform_ln_plus_10_array(values, var_name):
+    values = np.asarray(values, dtype=float)
+    invalid = ~(values > 0) & ~np.isnan(values)
+    if invalid.any():
+        rows = np.flatnonzero(invalid)[:5].tolist()
+        raise ValueError(
+            f"{var_name} 原始值必须大于 0，才能进行 ln(x)+10 转换"
+            f"（共 {int(invalid.sum())} 行不满足，前几行位置：{rows}）。"
+        )
+    return np.log(values) + 10
+
+
+# =========================
+# 数据表 -> 模型输入（多行）
+# 列名可以是模型变量名、别名（英文表头），
+# 或 ln 变量对应的原始值列（如 Cu -> lnCu+10）
+# 空值保留为 NaN，交给 pipeline 里的 imputer 处理
+# =========================
+def transform_frame(df, feature_names=FEATURE_NAMES, aliases=FEATURE_ALIASES_9VARS):
+    reverse_aliases = {v: k for k, v in aliases.items()}
+    columns = []
+    for feature in feature_names:
+        if feature in df.columns:
+            columns.append(df[feature].to_numpy(dtype=float))
+        elif reverse_aliases.get(feature) in df.columns:
+            columns.append(df[reverse_aliases[feature]].to_numpy(dtype=float))
+        elif feature in LOG_INPUTS and LOG_INPUTS[feature] in df.columns:
+            raw_name = LOG_INPUTS[feature]
+            columns.append(transform_ln_plus_10_array(df[raw_name].to_numpy(dtype=float), raw_name))
+        else:
+            raise KeyError(f"数据表缺少变量列：{feature}")
+    return np.column_stack(columns) if columns else np.empty((len(df), 0))
+
+
+# =========================
+# 拆分 pipeline：前处理步骤 + 最终模型
+# =========================
+def split_pipeline(model):
+    if hasattr(model, "named_steps"):
+        step_names = list(model.named_steps.keys())
+        steps = [model.named_steps[name] for name in step_names[:-1]]
+        return steps, model.named_steps[step_names[-1]]
+    return [], model
+
+
+# =========================
+# 对 pipeline 做前处理
+# SHAP 时要先经过 imputer/scaler，再送到最终模型
+# =========================
+def transform_for_base_model(model, user_input):
+    steps, base_model = split_pipeline(model)
+    x = user_input.copy()
+    for step_obj in steps:
+        if hasattr(step_obj, "transform"):
+            x = step_obj.transform(x)
+    return base_model, x
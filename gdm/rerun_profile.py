@@ -0,0 +1,97 @@
+import argparse
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+
+# =========================
+# 页面重跑统计（streamlit AppTest，无需浏览器）
+# 模拟一个患者的完整操作：
+#   逐个修改 14 项指标 -> 点击预测 -> 若干次与预测无关的操作（切换 PDP / 依赖图变量）
+# 每个页面先完整操作一个患者预热，不计入统计。
+# 表单内的控件修改时不会重跑；无关操作后结果消失时，按用户的做法再点一次预测。
+# 统计每个患者的脚本重跑次数与 CPU 时间（含后台解释线程）
+# =========================
+def _is_predict_button(button):
+    return "预测" in str(button.label)
+
+
+def _result_shown(at):
+    return any("预测结果" in str(m.value) for m in at.markdown)
+
+
+def _run(at, stats):
+    start = time.process_time()
+    at.run()
+    stats["cpu"] += time.process_time() - start
+    stats["reruns"] += 1
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+
+def _click_predict(at, stats):
+    button = next(b for b in at.button if _is_predict_button(b))
+    button.click()
+    _run(at, stats)
+
+
+def profile_page(path, patients=3, unrelated=2, timeout=120):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(path), default_timeout=timeout)
+    start = time.process_time()
+    at.run()
+    load_cpu = time.process_time() - start
+
+    # 第一个患者用于预热（解释器、各项缓存），不计入统计
+    results = []
+    for p in range(-1, patients):
+        stats = {"reruns": 0, "cpu": 0.0, "kept": 0, "unrelated": 0}
+        for i in range(len(at.number_input)):
+            widget = at.number_input[i]
+            widget.set_value(round(1.0 + 0.1 * p + 0.01 * i, 2))
+            if not widget.form_id:
+                _run(at, stats)
+        _click_predict(at, stats)
+
+        selectboxes = [s for s in at.selectbox if not s.form_id]
+        for k in range(unrelated if selectboxes else 0):
+            box = selectboxes[k % len(selectboxes)]
+            box.set_value(box.options[(p + k + 1) % len(box.options)])
+            _run(at, stats)
+            stats["unrelated"] += 1
+            if _result_shown(at):
+                stats["kept"] += 1
+            else:
+                _click_predict(at, stats)
+            selectboxes = [s for s in at.selectbox if not s.form_id]
+        if p >= 0:
+            results.append(stats)
+    return load_cpu, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m gdm.rerun_profile",
+        description="模拟患者操作，统计页面每个患者的脚本重跑次数与 CPU 时间。"
+    )
+    parser.add_argument("pages", nargs="+", help="页面脚本，例如 7.py；可同时给出修改前的版本对比")
+    parser.add_argument("--patients", type=int, default=3)
+    parser.add_argument("--unrelated", type=int, default=2, help="每个患者预测后的无关操作次数")
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings("ignore")
+    for page in args.pages:
+        load_cpu, results = profile_page(Path(page).resolve(), args.patients, args.unrelated)
+        reruns = np.mean([r["reruns"] for r in results])
+        cpu = np.mean([r["cpu"] for r in results]) * 1e3
+        kept = sum(r["kept"] for r in results)
+        total = sum(r["unrelated"] for r in results)
+        print(f"{page}：首次加载 CPU {load_cpu * 1e3:.0f} ms；每个患者重跑 {reruns:.1f} 次，CPU {cpu:.0f} ms；"
+              f"无关操作后结果保留 {kept}/{total}")
+
+
+if __name__ == "__main__":
+    main()
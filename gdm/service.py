@@ -0,0 +1,381 @@
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .config import (
+    INPUT_ORDER,
+    LOG_INPUTS,
+    SERVICE_HOST,
+    SERVICE_MAX_BATCH,
+    SERVICE_MAX_WAIT_MS,
+    SERVICE_PORT,
+)
+from .utils import sigmoid
+
+
+# =========================
+# HTTP JSON 评分服务（标准库 asyncio，无需 web 框架）
+#   POST /predict  {"inputs": {网页原始值}} 或 {"features": [模型输入，FEATURE_NAMES 顺序]}
+#                  -> {"proba", "label", "threshold", "batch_size"}
+#   POST /explain  同上 -> 另加 {"base_value", "shap": {变量: SHAP 值}}
+#   GET  /health   -> 模型哈希与各端点的批次统计
+# 模型与 metrics.json 启动时加载一次。
+# 微批：几毫秒内同时到达的请求合并为一批，一次 predict_proba / contributions；
+# 计算在线程池中进行，期间到达的请求排队进入下一批
+# =========================
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch=SERVICE_MAX_BATCH, max_wait_ms=SERVICE_MAX_WAIT_MS, executor=None):
+        if max_batch < 1:
+            raise ValueError(f"每批最多行数必须至少为 1：{max_batch}")
+        self.fn = fn
+        self.max_batch = int(max_batch)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1e3
+        self.executor = executor
+        self.queue = None
+        self.batches = 0
+        self.rows = 0
+        self._task = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    # 返回 (整批结果, 本行在批中的位置, 批大小)
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        items = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch:
+            if not self.queue.empty():
+                items.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            X = np.vstack([row for row, _ in items])
+            try:
+                results = await loop.run_in_executor(self.executor, self.fn, X)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(items)
+            for i, (_, future) in enumerate(items):
+                if not future.done():
+                    future.set_result((results, i, len(items)))
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1e3
+        }
+
+
+class ScoringService:
+    def __init__(self, predictor, max_batch=SERVICE_MAX_BATCH, max_wait_ms=SERVICE_MAX_WAIT_MS):
+        self.predictor = predictor
+        # 单线程执行批次：xgboost 自身按行并行，多个批次同时计算只会互相争抢
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gdm-service")
+        self.batchers = {
+            "/predict": MicroBatcher(self._predict_batch, max_batch, max_wait_ms, self.executor),
+            "/explain": MicroBatcher(self._explain_batch, max_batch, max_wait_ms, self.executor)
+        }
+
+    def _predict_batch(self, X):
+        return self.predictor.predict_batch(X)
+
+    def _explain_batch(self, X):
+        values, base_values, fallback_reason = self.predictor.contributions(self.predictor.transform(X))
+        margin = base_values + values.sum(axis=1)
+        proba = sigmoid(margin)
+        return proba, (proba >= self.predictor.threshold).astype(int), values, base_values, fallback_reason
+
+    # 请求体 -> 模型输入（1 行）
+    def parse_input(self, payload):
+        from .preprocess import build_model_input
+
+        if not isinstance(payload, dict):
+            raise ValueError("请求体必须是 JSON 对象。")
+        names = self.predictor.feature_names
+        if "features" in payload:
+            features = payload["features"]
+            if isinstance(features, dict):
+                missing = [name for name in names if name not in features]
+                if missing:
+                    raise ValueError(f"features 缺少变量：{missing}")
+                features = [features[name] for name in names]
+            row = np.asarray(features, dtype=float).reshape(1, -1)
+            if row.shape[1] != len(names):
+                raise ValueError(f"features 需要 {len(names)} 个值，收到 {row.shape[1]} 个。")
+            return row
+        if "inputs" in payload:
+            missing = [LOG_INPUTS.get(name, name) for name in names
+                       if LOG_INPUTS.get(name, name) not in payload["inputs"]]
+            if missing:
+                raise ValueError(f"inputs 缺少输入项：{missing}")
+            return build_model_input({k: float(v) for k, v in payload["inputs"].items()}, names)
+        raise ValueError(f"请求体需要 inputs（网页原始值：{INPUT_ORDER}）或 features（模型输入）。")
+
+    async def dispatch(self, method, path, body):
+        if path == "/health":
+            return 200, {
+                "model_path": str(self.predictor.model_path),
+                "model_hash": self.predictor.model_hash,
+                "threshold": self.predictor.threshold,
+                "batches": {name: batcher.stats() for name, batcher in self.batchers.items()}
+            }
+        if path not in self.batchers:
+            return 404, {"error": f"未知的路径：{path}"}
+        if method != "POST":
+            return 405, {"error": "请使用 POST。"}
+
+        try:
+            row = self.parse_input(json.loads(body or b"{}"))
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"输入错误：{e}"}
+
+        results, i, batch_size = await self.batchers[path].submit(row)
+        response = {
+            "proba": float(results[0][i]),
+            "label": int(results[1][i]),
+            "threshold": self.predictor.threshold,
+            "batch_size": batch_size
+        }
+        if path == "/explain":
+            response["base_value"] = float(results[3][i])
+            response["shap"] = dict(zip(self.predictor.feature_names, results[2][i].round(6).tolist()))
+            # 首选解释器失败、改用通用 Explainer 时的原因（整批相同），否则为 null
+            response["fallback_reason"] = results[4]
+        return 200, response
+
+    # 请求行 + 请求头 -> (method, path, headers, 请求体长度)；连接已结束时返回 None
+    # 格式不对（请求行不完整、Content-Length 不是非负整数、行过长）时抛出 ValueError
+    async def _read_request_head(self, reader):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise ValueError(f"无法解析的请求行：{request_line.decode('latin-1').strip()!r}")
+        length = headers.get("content-length", "0")
+        if not length.isdigit():
+            raise ValueError(f"Content-Length 必须是非负整数：{length!r}")
+        return parts[0], parts[1], headers, int(length)
+
+    @staticmethod
+    async def _write_response(writer, status, payload, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            + ("" if keep_alive else "Connection: close\r\n")
+            + "\r\n"
+        )
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await self._read_request_head(reader)
+                except ValueError as e:
+                    # 请求格式不对时无法确定请求体的边界：返回 400 后关闭连接
+                    await self._write_response(writer, 400, {"error": f"请求格式错误：{e}"}, keep_alive=False)
+                    break
+                if head is None:
+                    break
+                method, path, headers, length = head
+                body = await reader.readexactly(length)
+
+                try:
+                    status, payload = await self.dispatch(method, path.split("?", 1)[0], body)
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT, ready=None):
+        for batcher in self.batchers.values():
+            batcher.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"GDM 评分服务：http://{host}:{port}（/predict、/explain、/health）", flush=True)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+
+# =========================
+# 负载生成：concurrency 个保持连接的客户端，共发送 requests 个请求
+# 返回 (每个请求的延迟（秒）, 总耗时)
+# =========================
+async def _client(host, port, bodies, path, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            start = time.perf_counter()
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+            length = 0
+            status = await reader.readline()
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            payload = await reader.readexactly(length)
+            if not status.startswith(b"HTTP/1.1 200"):
+                raise RuntimeError(f"{status.decode().strip()}：{payload.decode('utf-8')}")
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, rows, path="/predict", concurrency=32, requests=2000):
+    bodies = [json.dumps({"features": rows[i % len(rows)].tolist()}).encode("utf-8") for i in range(requests)]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(host, port, bodies[c::concurrency], path, latencies) for c in range(concurrency)
+    ])
+    return np.array(latencies), time.perf_counter() - start
+
+
+def _get_json(host, port, path):
+    import urllib.request
+
+    with urllib.request.urlopen(f"http://{host}:{port}{path}", timeout=5) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def _wait_ready(host, port, process, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("评分服务启动失败。")
+        try:
+            return _get_json(host, port, "/health")
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError("等待评分服务启动超时。")
+
+
+def main(argv=None):
+    from .config import MODEL_SPECS
+
+    parser = argparse.ArgumentParser(
+        prog="python -m gdm.service",
+        description="HTTP JSON 评分服务（/predict、/explain，微批合并并发请求）与本地负载测试。"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="启动服务")
+    serve.add_argument("--spec", default="14vars", choices=sorted(MODEL_SPECS))
+    serve.add_argument("--host", default=SERVICE_HOST)
+    serve.add_argument("--port", type=int, default=SERVICE_PORT)
+    serve.add_argument("--max-batch", type=int, default=SERVICE_MAX_BATCH)
+    serve.add_argument("--max-wait-ms", type=float, default=SERVICE_MAX_WAIT_MS)
+
+    bench = sub.add_parser("bench", help="负载测试：每组参数各启动一个服务进程，统计吞吐量与延迟")
+    bench.add_argument("--spec", default="14vars", choices=sorted(MODEL_SPECS))
+    bench.add_argument("--host", default=SERVICE_HOST)
+    bench.add_argument("--port", type=int, default=SERVICE_PORT + 1)
+    bench.add_argument("--endpoint", nargs="+", default=["/predict", "/explain"])
+    bench.add_argument("--max-batch", type=int, nargs="+", default=[1, SERVICE_MAX_BATCH])
+    bench.add_argument("--max-wait-ms", type=float, default=SERVICE_MAX_WAIT_MS)
+    bench.add_argument("--concurrency", type=int, default=32)
+    bench.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    from .predictor import GDMPredictor
+
+    if args.command == "serve":
+        predictor = GDMPredictor.from_spec(args.spec, cache=None)
+        service = ScoringService(predictor, args.max_batch, args.max_wait_ms)
+        try:
+            asyncio.run(service.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    from .cohort import synthetic_cohort
+
+    predictor = GDMPredictor.from_spec(args.spec, cache=None)
+    rows = synthetic_cohort(predictor, 500)
+    print(f"模型文件：{predictor.model_path}；并发客户端 {args.concurrency}，每组 {args.requests} 个请求")
+    for max_batch in args.max_batch:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gdm.service", "serve", "--spec", args.spec, "--host", args.host,
+             "--port", str(args.port), "--max-batch", str(max_batch), "--max-wait-ms", str(args.max_wait_ms)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            _wait_ready(args.host, args.port, process)
+            for path in args.endpoint:
+                asyncio.run(load_test(args.host, args.port, rows, path, args.concurrency, min(args.requests, 100)))
+                before = _get_json(args.host, args.port, "/health")["batches"][path]
+                latencies, seconds = asyncio.run(
+                    load_test(args.host, args.port, rows, path, args.concurrency, args.requests)
+                )
+                after = _get_json(args.host, args.port, "/health")["batches"][path]
+                batches = after["batches"] - before["batches"]
+                mean_batch = (after["rows"] - before["rows"]) / batches if batches else 0.0
+                print(f"  {path:<9} 每批最多 {max_batch:>3} 行：吞吐量 {len(latencies) / seconds:7.0f} 请求/s，"
+                      f"p50 {np.percentile(latencies, 50) * 1e3:6.2f} ms，p99 {np.percentile(latencies, 99) * 1e3:6.2f} ms，"
+                      f"平均批大小 {mean_batch:.1f}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
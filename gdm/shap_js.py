@@ -0,0 +1,79 @@
+import hashlib
+import importlib.util
+import os
+from pathlib import Path
+
+from .config import STATIC_DIR
+
+
+# =========================
+# SHAP 前端脚本（bundle.js）作为静态文件发布
+# 原来每次渲染都用 shap.getjs() 把约 350 KB 的脚本内联进 HTML；
+# 现在复制到 static/ 下（文件名带内容哈希，可被浏览器长期缓存），
+# 每次结果只发送 <script src> 与力图本身的小段 HTML。
+# 需要在 .streamlit/config.toml 中开启 server.enableStaticServing；
+# 未开启或不在 streamlit 中运行时，自动回退为 shap.getjs() 内联。
+# =========================
+SHAP_BUNDLE_PREFIX = "shap_bundle"
+
+_published = {}
+
+
+def shap_bundle_source():
+    spec = importlib.util.find_spec("shap")
+    if spec is None or spec.origin is None:
+        raise ModuleNotFoundError("未安装 shap，无法获取 SHAP 前端脚本。")
+    return Path(spec.origin).parent / "plots" / "resources" / "bundle.js"
+
+
+# =========================
+# 复制 bundle.js 到静态目录，返回文件名
+# 同一进程只做一次；文件已存在（内容哈希相同）时不重复写入
+# =========================
+def publish_shap_bundle(static_dir=STATIC_DIR):
+    static_dir = Path(static_dir)
+    if static_dir in _published:
+        return _published[static_dir]
+
+    data = shap_bundle_source().read_bytes()
+    name = f"{SHAP_BUNDLE_PREFIX}.{hashlib.sha256(data).hexdigest()[:12]}.js"
+    target = static_dir / name
+    if not target.exists():
+        static_dir.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+
+    _published[static_dir] = name
+    return name
+
+
+def static_serving_enabled():
+    try:
+        import streamlit as st
+
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+
+def static_url(name):
+    import streamlit as st
+
+    base = (st.get_option("server.baseUrlPath") or "").strip("/")
+    return f"/{base}/app/static/{name}" if base else f"/app/static/{name}"
+
+
+# =========================
+# 替代 shap.getjs()：返回引用静态脚本的 <script> 标签
+# =========================
+def shap_js():
+    if static_serving_enabled():
+        try:
+            return f"<script charset='utf-8' src='{static_url(publish_shap_bundle())}'></script>"
+        except OSError:
+            pass
+
+    import shap
+
+    return shap.getjs()
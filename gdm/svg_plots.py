@@ -0,0 +1,306 @@
+import math
+import time
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from .utils import cli_parser, median_ms, sigmoid
+
+
+# =========================
+# 轻量 SVG 力图 / 瀑布图
+# 只依赖 numpy，服务器端直接生成静态 SVG 字符串：
+# 不需要 SHAP 前端脚本，也不需要导入 matplotlib。
+# 颜色与 shap 一致：红色推高风险，蓝色降低风险。
+# 坐标为 log-odds（与 SHAP 值同一尺度），f(x) 处同时标出概率。
+# =========================
+RED = "#ff0051"
+BLUE = "#008bfb"
+GRAY = "#888888"
+FONT = "font-family='Arial, \"Microsoft YaHei\", sans-serif'"
+
+
+def _fmt(value, digits=2):
+    return f"{value:+.{digits}f}".replace("-", "−")
+
+
+def _feature_text(label, value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return str(label)
+    return f"{label} = {value:.3g}"
+
+
+def _nice_ticks(lo, hi, n=5):
+    span = hi - lo
+    if span <= 0:
+        return [lo]
+    step = 10 ** math.floor(math.log10(span / n))
+    for mult in (1, 2, 5, 10):
+        if span / (step * mult) <= n:
+            step *= mult
+            break
+    start = math.ceil(lo / step) * step
+    return [start + i * step for i in range(int((hi - start) / step) + 1)]
+
+
+def _prepare(base_value, values, feature_labels, data):
+    values = np.asarray(values, dtype=float).ravel()
+    labels = [str(x) for x in (feature_labels if feature_labels is not None else range(len(values)))]
+    if data is None:
+        data = [None] * len(values)
+    else:
+        data = [float(x) for x in np.asarray(data, dtype=float).ravel()]
+    return float(base_value), values, labels, data
+
+
+# =========================
+# 力图：红色段从左推向 f(x)，蓝色段从右推回 f(x)
+# 贡献最大的段紧挨 f(x)，过窄的段不标文字
+# =========================
+def force_svg(base_value, values, feature_labels=None, data=None, width=900, height=150,
+              min_label_px=60):
+    base_value, values, labels, data = _prepare(base_value, values, feature_labels, data)
+    output = base_value + float(values.sum())
+
+    pos = [i for i in np.argsort(-values) if values[i] > 0]
+    neg = [i for i in np.argsort(values) if values[i] < 0]
+    lo = output - float(values[pos].sum()) if pos else output
+    hi = output - float(values[neg].sum()) if neg else output
+    lo, hi = min(lo, base_value), max(hi, base_value)
+    pad = max(hi - lo, 1e-6) * 0.08
+    lo, hi = lo - pad, hi + pad
+
+    margin_x = 20
+    scale = (width - 2 * margin_x) / (hi - lo)
+
+    def sx(v):
+        return margin_x + (v - lo) * scale
+
+    bar_top, bar_bottom = 62, 86
+    bar_mid = (bar_top + bar_bottom) / 2
+    notch = 6
+
+    parts = [
+        f"<svg xmlns='http://www.w3.org/2000/svg' width='{width}' height='{height}' "
+        f"viewBox='0 0 {width} {height}' {FONT} font-size='11'>"
+    ]
+
+    # 坐标轴与刻度
+    axis_y = 40
+    parts.append(f"<line x1='{margin_x}' y1='{axis_y}' x2='{width - margin_x}' y2='{axis_y}' stroke='#ccc'/>")
+    for tick in _nice_ticks(lo, hi):
+        x = sx(tick)
+        parts.append(f"<line x1='{x:.1f}' y1='{axis_y - 4}' x2='{x:.1f}' y2='{axis_y}' stroke='#ccc'/>")
+        parts.append(f"<text x='{x:.1f}' y='{axis_y - 7}' text-anchor='middle' fill='{GRAY}'>{tick:.3g}</text>")
+
+    # 基准值与 f(x) 标记
+    xb, xo = sx(base_value), sx(output)
+    parts.append(f"<line x1='{xb:.1f}' y1='{axis_y}' x2='{xb:.1f}' y2='{bar_top}' stroke='{GRAY}' stroke-dasharray='3,2'/>")
+    parts.append(f"<text x='{xb:.1f}' y='12' text-anchor='middle' fill='{GRAY}'>base value {base_value:.2f}</text>")
+    parts.append(f"<text x='{xo:.1f}' y='26' text-anchor='middle' font-weight='bold'>"
+                 f"f(x) = {output:.2f}（概率 {sigmoid(output) * 100:.1f}%）</text>")
+
+    def chevron(x0, x1, color, rightward):
+        a = min(notch, abs(x1 - x0) / 2)
+        if rightward:
+            pts = [(x0, bar_top), (x1 - a, bar_top), (x1, bar_mid), (x1 - a, bar_bottom),
+                   (x0, bar_bottom), (x0 + a, bar_mid)]
+        else:
+            pts = [(x1, bar_top), (x0 + a, bar_top), (x0, bar_mid), (x0 + a, bar_bottom),
+                   (x1, bar_bottom), (x1 - a, bar_mid)]
+        return (f"<polygon points='{' '.join(f'{x:.1f},{y:.1f}' for x, y in pts)}' "
+                f"fill='{color}' stroke='white' stroke-width='1'/>")
+
+    # 红色：从 f(x) 向左依次排列（最大贡献最靠近 f(x)）
+    right = output
+    for i in pos:
+        left = right - values[i]
+        parts.append(chevron(sx(left), sx(right), RED, rightward=True))
+        if (right - left) * scale >= min_label_px:
+            parts.append(f"<text x='{sx((left + right) / 2):.1f}' y='{bar_bottom + 16}' text-anchor='middle' "
+                         f"fill='{RED}'>{escape(_feature_text(labels[i], data[i]))}</text>")
+        right = left
+
+    # 蓝色：从 f(x) 向右依次排列
+    left = output
+    for i in neg:
+        right = left - values[i]
+        parts.append(chevron(sx(left), sx(right), BLUE, rightward=False))
+        if (right - left) * scale >= min_label_px:
+            parts.append(f"<text x='{sx((left + right) / 2):.1f}' y='{bar_bottom + 16}' text-anchor='middle' "
+                         f"fill='{BLUE}'>{escape(_feature_text(labels[i], data[i]))}</text>")
+        left = right
+
+    parts.append(f"<line x1='{xo:.1f}' y1='{axis_y}' x2='{xo:.1f}' y2='{bar_bottom + 4}' stroke='black'/>")
+    parts.append(f"<text x='{margin_x}' y='{height - 10}' fill='{RED}'>▶ 推高风险</text>")
+    parts.append(f"<text x='{width - margin_x}' y='{height - 10}' text-anchor='end' fill='{BLUE}'>降低风险 ◀</text>")
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+# =========================
+# 瀑布图：自下而上从基准值累加到 f(x)
+# 贡献最大的特征在最上方，其余特征合并为一行
+# =========================
+def waterfall_svg(base_value, values, feature_labels=None, data=None, max_display=10, width=900,
+                  row_height=24, label_width=230):
+    base_value, values, labels, data = _prepare(base_value, values, feature_labels, data)
+    output = base_value + float(values.sum())
+
+    order = list(np.argsort(-np.abs(values)))
+    if len(order) > max_display:
+        shown, rest = order[:max_display - 1], order[max_display - 1:]
+        rows = [(_feature_text(labels[i], data[i]), float(values[i])) for i in shown]
+        rows.append((f"其余 {len(rest)} 个特征", float(values[rest].sum())))
+    else:
+        rows = [(_feature_text(labels[i], data[i]), float(values[i])) for i in order]
+
+    # 自下而上累加：最下面一行从基准值开始
+    starts = []
+    current = base_value
+    for _, value in reversed(rows):
+        starts.append(current)
+        current += value
+    starts.reverse()
+
+    ends = [s + v for s, (_, v) in zip(starts, rows)]
+    lo = min(starts + ends + [base_value, output])
+    hi = max(starts + ends + [base_value, output])
+    pad = max(hi - lo, 1e-6) * 0.12
+    lo, hi = lo - pad, hi + pad
+
+    top, bottom_axis = 30, 30 + row_height * len(rows)
+    height = bottom_axis + 42
+    plot_left, plot_right = label_width, width - 20
+    scale = (plot_right - plot_left) / (hi - lo)
+
+    def sx(v):
+        return plot_left + (v - lo) * scale
+
+    parts = [
+        f"<svg xmlns='http://www.w3.org/2000/svg' width='{width}' height='{height}' "
+        f"viewBox='0 0 {width} {height}' {FONT} font-size='11'>"
+    ]
+    xo, xb = sx(output), sx(base_value)
+    parts.append(f"<text x='{xo:.1f}' y='14' text-anchor='middle' font-weight='bold'>"
+                 f"f(x) = {output:.2f}（概率 {sigmoid(output) * 100:.1f}%）</text>")
+    parts.append(f"<line x1='{xo:.1f}' y1='18' x2='{xo:.1f}' y2='{bottom_axis}' stroke='#ddd' stroke-dasharray='3,2'/>")
+    parts.append(f"<line x1='{xb:.1f}' y1='{top}' x2='{xb:.1f}' y2='{bottom_axis}' stroke='#ddd' stroke-dasharray='3,2'/>")
+
+    for k, ((text, value), start) in enumerate(zip(rows, starts)):
+        y = top + k * row_height
+        x0, x1 = sorted((sx(start), sx(start + value)))
+        color = RED if value > 0 else BLUE
+        parts.append(f"<line x1='{plot_left - 6}' y1='{y + row_height - 1}' x2='{plot_right}' "
+                     f"y2='{y + row_height - 1}' stroke='#f0f0f0'/>")
+        parts.append(f"<text x='{plot_left - 8}' y='{y + row_height / 2 + 4:.1f}' text-anchor='end'>"
+                     f"{escape(text)}</text>")
+        parts.append(f"<rect x='{x0:.1f}' y='{y + 4}' width='{max(x1 - x0, 1):.1f}' height='{row_height - 8}' "
+                     f"fill='{color}'/>")
+        if value > 0:
+            parts.append(f"<text x='{x1 + 4:.1f}' y='{y + row_height / 2 + 4:.1f}' fill='{color}'>{_fmt(value)}</text>")
+        else:
+            parts.append(f"<text x='{x0 - 4:.1f}' y='{y + row_height / 2 + 4:.1f}' text-anchor='end' "
+                         f"fill='{color}'>{_fmt(value)}</text>")
+
+    parts.append(f"<line x1='{plot_left}' y1='{bottom_axis}' x2='{plot_right}' y2='{bottom_axis}' stroke='#999'/>")
+    for tick in _nice_ticks(lo, hi):
+        x = sx(tick)
+        parts.append(f"<line x1='{x:.1f}' y1='{bottom_axis}' x2='{x:.1f}' y2='{bottom_axis + 4}' stroke='#999'/>")
+        parts.append(f"<text x='{x:.1f}' y='{bottom_axis + 16}' text-anchor='middle' fill='{GRAY}'>{tick:.3g}</text>")
+    parts.append(f"<text x='{xb:.1f}' y='{bottom_axis + 32}' text-anchor='middle' fill='{GRAY}'>"
+                 f"E[f(X)] = {base_value:.2f}</text>")
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+# =========================
+# 由 predictor.explain() 的结果直接生成
+# =========================
+def explanation_svg(explanation, feature_labels=None, kind="force", **kwargs):
+    labels = feature_labels if feature_labels is not None else explanation.feature_names
+    if kind == "force":
+        return force_svg(explanation.base_value, explanation.values, labels, explanation.data, **kwargs)
+    if kind == "waterfall":
+        return waterfall_svg(explanation.base_value, explanation.values, labels, explanation.data, **kwargs)
+    raise ValueError(f"未知的图类型：{kind}")
+
+
+def main(argv=None):
+    from pathlib import Path
+
+    from .config import FEATURE_LABELS
+    from .predictor import GDMPredictor
+
+    parser = cli_parser(
+        "svg_plots",
+        "对比 SVG 渲染与现有两种渲染方式（SHAP JS 力图 / matplotlib 静态图）的耗时与输出大小。",
+        repeat=20, seed=True
+    )
+    parser.add_argument("--out", help="把示例 SVG 写到该目录")
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec, cache=None)
+    rng = np.random.default_rng(args.seed)
+    explanation = predictor.explain(rng.normal(0.0, 1.0, size=(1, len(predictor.feature_names))))
+    labels = [FEATURE_LABELS.get(f, f) for f in predictor.feature_names]
+
+    results = {}
+
+    results["SVG 力图"] = (median_ms(lambda: explanation_svg(explanation, labels), args.repeat),
+                          len(explanation_svg(explanation, labels).encode()))
+    results["SVG 瀑布图"] = (median_ms(lambda: explanation_svg(explanation, labels, "waterfall"), args.repeat),
+                            len(explanation_svg(explanation, labels, "waterfall").encode()))
+
+    start = time.perf_counter()
+    import shap
+    import_shap = time.perf_counter() - start
+
+    def js_force():
+        plot = shap.force_plot(explanation.base_value, explanation.values, explanation.data,
+                               feature_names=labels, matplotlib=False)
+        return shap.getjs() + plot.html()
+
+    results["SHAP JS 力图（内联脚本）"] = (median_ms(js_force, args.repeat), len(js_force().encode()))
+
+    start = time.perf_counter()
+    import io
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import_mpl = time.perf_counter() - start
+
+    def mpl_png(kind):
+        def render():
+            if kind == "force":
+                shap.force_plot(explanation.base_value, explanation.values, explanation.data,
+                                feature_names=labels, matplotlib=True, show=False)
+                fig = plt.gcf()
+            else:
+                fig = plt.figure(figsize=(10, 3))
+                shap.plots.waterfall(explanation.to_shap()[0], max_display=10, show=False)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png", bbox_inches="tight")
+            plt.close("all")
+            return buffer.getvalue()
+        return render
+
+    results["matplotlib 力图（PNG）"] = (median_ms(mpl_png("force"), args.repeat), len(mpl_png("force")()))
+    results["matplotlib 瀑布图（PNG）"] = (median_ms(mpl_png("waterfall"), args.repeat), len(mpl_png("waterfall")()))
+
+    print(f"模型文件：{predictor.model_path}")
+    print(f"首次导入：shap {import_shap * 1e3:.0f} ms，matplotlib {import_mpl * 1e3:.0f} ms（SVG 渲染无需导入）")
+    for name, (ms, size) in results.items():
+        print(f"{name:<24} {ms:8.2f} ms/次  {size / 1024:8.1f} KB")
+
+    if args.out:
+        out = Path(args.out)
+        out.mkdir(parents=True, exist_ok=True)
+        (out / "force.svg").write_text(explanation_svg(explanation, labels), encoding="utf-8")
+        (out / "waterfall.svg").write_text(explanation_svg(explanation, labels, "waterfall"), encoding="utf-8")
+        print(f"示例 SVG 已写入：{out}")
+
+
+if __name__ == "__main__":
+    main()
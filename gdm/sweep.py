@@ -0,0 +1,231 @@
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from .config import LOG_INPUTS
+from .utils import cli_parser
+
+
+# =========================
+# 单个患者的敏感性分析（1 个或 2 个变量）
+# 其余变量固定为当前输入；网格为原始单位（网页输入值），
+# ln 变量（Cu / As / Pb / Cd）在原始值上取等距网格再转成 ln(x)+10。
+# 整个网格拼成一个批次，一次 predict_proba 完成；
+# 结果进入预测缓存，键中包含取整后的当前输入
+# =========================
+DEFAULT_POINTS = {1: 60, 2: 30}
+RANGE_SD = 2.5  # 默认范围：训练分布均值 ± 2.5 个标准差（StandardScaler 统计量）
+
+
+@dataclass
+class SweepResult:
+    features: tuple
+    raw_names: tuple
+    grids: tuple
+    proba: np.ndarray
+    current: tuple
+    current_proba: float
+    threshold: float
+    seconds: float
+
+    # 1 维：长表（原始值, 概率）；2 维：长表（原始值 1, 原始值 2, 概率），便于画热力图
+    def to_frame(self):
+        import pandas as pd
+
+        if len(self.grids) == 1:
+            return pd.DataFrame({self.raw_names[0]: self.grids[0], "GDM 概率": self.proba})
+        g0, g1 = np.meshgrid(self.grids[0], self.grids[1], indexing="ij")
+        return pd.DataFrame({
+            self.raw_names[0]: g0.ravel(),
+            self.raw_names[1]: g1.ravel(),
+            "GDM 概率": self.proba.ravel()
+        })
+
+
+def raw_name(feature):
+    return LOG_INPUTS.get(feature, feature)
+
+
+def to_model_value(feature, raw_values):
+    raw_values = np.asarray(raw_values, dtype=float)
+    if feature in LOG_INPUTS:
+        return np.log(raw_values) + 10
+    return raw_values
+
+
+def to_raw_value(feature, model_values):
+    model_values = np.asarray(model_values, dtype=float)
+    if feature in LOG_INPUTS:
+        return np.exp(model_values - 10)
+    return model_values
+
+
+# =========================
+# 默认范围（原始单位）
+# 有 StandardScaler 时取训练分布均值 ± RANGE_SD 个标准差（ln 变量在 ln 尺度上取，再换回原始值），
+# 同时保证包含当前值；否则取当前值的 0.5 ~ 1.5 倍
+# =========================
+def default_range(predictor, feature, current_model_value):
+    j = predictor.feature_names.index(feature)
+    lo = hi = None
+    for step_obj in predictor.preprocess_steps:
+        if hasattr(step_obj, "mean_") and hasattr(step_obj, "scale_"):
+            lo = step_obj.mean_[j] - RANGE_SD * step_obj.scale_[j]
+            hi = step_obj.mean_[j] + RANGE_SD * step_obj.scale_[j]
+    if lo is None or not np.isfinite(current_model_value):
+        span = max(abs(current_model_value), 1.0) * 0.5 if np.isfinite(current_model_value) else 1.0
+        lo, hi = current_model_value - span, current_model_value + span
+    lo, hi = min(lo, current_model_value), max(hi, current_model_value)
+
+    raw_lo, raw_hi = (float(v) for v in to_raw_value(feature, [lo, hi]))
+    if feature not in LOG_INPUTS:
+        return raw_lo, raw_hi
+    return max(raw_lo, 1e-6), raw_hi
+
+
+def _raw_grid(feature, lo, hi, points):
+    if feature in LOG_INPUTS and lo <= 0:
+        raise ValueError(f"{raw_name(feature)} 原始值必须大于 0，才能进行 ln(x)+10 转换。")
+    return np.linspace(lo, hi, points)
+
+
+# =========================
+# 敏感性分析
+# user_input：模型输入（1 行，ln 变量已转换）
+# features：1 或 2 个模型变量名；ranges：对应的 (最小值, 最大值)（原始单位），None 为默认范围
+# scorer：网格的批量评分交给谁（页面传入评分进程池，见 worker_pool.get_scorer），默认为 predictor 本身
+# =========================
+def sweep(predictor, user_input, features, ranges=None, points=None, scorer=None):
+    features = tuple(features)
+    if len(features) not in (1, 2) or len(set(features)) != len(features):
+        raise ValueError("敏感性分析需要 1 个或 2 个不同的变量。")
+    unknown = [f for f in features if f not in predictor.feature_names]
+    if unknown:
+        raise KeyError(f"未知的模型变量：{unknown}")
+
+    x = np.asarray(user_input, dtype=float).reshape(-1)
+    columns = [predictor.feature_names.index(f) for f in features]
+    ranges = tuple(
+        tuple(float(v) for v in (r if r is not None else default_range(predictor, f, x[j])))
+        for f, j, r in zip(features, columns, ranges or (None,) * len(features))
+    )
+    points = int(points or DEFAULT_POINTS[len(features)])
+
+    kind = ("sweep", features, tuple(np.round(ranges, 6).ravel()), points)
+    key = predictor.cache_key(kind, x)
+    if key is not None:
+        cached = predictor.cache.get(key)
+        if cached is not None:
+            return cached
+
+    start = time.perf_counter()
+    grids = tuple(_raw_grid(f, lo, hi, points) for f, (lo, hi) in zip(features, ranges))
+    mesh = np.meshgrid(*grids, indexing="ij")
+    # 网格各点 + 最后一行当前输入，一次 predict_proba
+    batch = np.tile(x, (mesh[0].size + 1, 1))
+    for f, j, values in zip(features, columns, mesh):
+        batch[:-1, j] = to_model_value(f, values.ravel())
+
+    proba, _ = (scorer or predictor).predict_batch(batch)
+    result = SweepResult(
+        features=features,
+        raw_names=tuple(raw_name(f) for f in features),
+        grids=grids,
+        proba=proba[:-1].reshape(mesh[0].shape),
+        current=tuple(float(to_raw_value(f, x[j])) for f, j in zip(features, columns)),
+        current_proba=float(proba[-1]),
+        threshold=predictor.threshold,
+        seconds=time.perf_counter() - start
+    )
+    result.proba.flags.writeable = False
+    if key is not None:
+        predictor.cache.put(key, result)
+    return result
+
+
+# =========================
+# 页面显示：1 维为曲线（附阈值线与当前值），2 维为热力图
+# 返回 altair 图表
+# =========================
+def sweep_chart(result, labels=None):
+    import altair as alt
+
+    labels = labels or {}
+    df = result.to_frame()
+    titles = [labels.get(name, name) for name in result.raw_names]
+
+    if len(result.grids) == 1:
+        name = result.raw_names[0]
+        line = alt.Chart(df).mark_line().encode(
+            x=alt.X(f"{name}:Q", title=titles[0]),
+            y=alt.Y("GDM 概率:Q", scale=alt.Scale(domain=[0, 1])),
+            tooltip=[name, "GDM 概率"]
+        )
+        rule = alt.Chart({"values": [{"t": result.threshold}]}).mark_rule(strokeDash=[4, 4], color="gray").encode(y="t:Q")
+        point = alt.Chart({"values": [{"x": result.current[0], "p": result.current_proba}]}).mark_point(
+            color="red", size=80, filled=True
+        ).encode(x="x:Q", y="p:Q")
+        return line + rule + point
+
+    n0, n1 = result.raw_names
+    heat = alt.Chart(df).mark_rect().encode(
+        x=alt.X(f"{n0}:O", title=titles[0], axis=alt.Axis(format=".3g", labelOverlap=True)),
+        y=alt.Y(f"{n1}:O", title=titles[1], sort="descending", axis=alt.Axis(format=".3g", labelOverlap=True)),
+        color=alt.Color("GDM 概率:Q", scale=alt.Scale(scheme="redblue", reverse=True, domainMid=result.threshold)),
+        tooltip=[n0, n1, "GDM 概率"]
+    )
+    return heat
+
+
+def main(argv=None):
+    from .predictor import ENGINES, GDMPredictor
+
+    parser = cli_parser(
+        "sweep",
+        "单个患者的敏感性分析：对比逐点单行调用与整网格一次批量评分的耗时。"
+    )
+    parser.add_argument("--engine", default="xgboost", choices=ENGINES)
+    parser.add_argument("--features", nargs="+", help="1 或 2 个模型变量名（默认前两个变量，分别做 1 维与 2 维）")
+    parser.add_argument("--points", type=int, help="每个维度的网格点数")
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec, engine=args.engine)
+    rng = np.random.default_rng(0)
+    x = rng.normal(0.0, 1.0, size=(1, len(predictor.feature_names)))
+    for step_obj in predictor.preprocess_steps:
+        if hasattr(step_obj, "mean_") and hasattr(step_obj, "scale_"):
+            x = x * step_obj.scale_ + step_obj.mean_
+
+    feature_sets = [tuple(args.features)] if args.features else [
+        (predictor.feature_names[4 % len(predictor.feature_names)],),
+        tuple(predictor.feature_names[:2])
+    ]
+    print(f"模型文件：{predictor.model_path}（引擎：{predictor.engine}）")
+    for features in feature_sets:
+        result = sweep(predictor, x, features, points=args.points)
+        n = result.proba.size
+
+        # 对照：逐点单行调用
+        columns = [predictor.feature_names.index(f) for f in features]
+        mesh = np.meshgrid(*result.grids, indexing="ij")
+        start = time.perf_counter()
+        for idx in np.ndindex(*result.proba.shape):
+            row = x.copy()
+            for f, j, values in zip(features, columns, mesh):
+                row[0, j] = to_model_value(f, values[idx])
+            predictor.predict_batch(row)
+        t_loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sweep(predictor, x, features, points=args.points)
+        t_cached = time.perf_counter() - start
+
+        ranges = "，".join(f"{name} {g[0]:.4g} ~ {g[-1]:.4g}" for name, g in zip(result.raw_names, result.grids))
+        print(f"{len(features)} 维（{ranges}，{n} 个点）：逐点调用 {t_loop * 1e3:.1f} ms，"
+              f"批量 {result.seconds * 1e3:.2f} ms（{t_loop / result.seconds:.0f}x），缓存命中 {t_cached * 1e3:.3f} ms；"
+              f"概率范围 {result.proba.min():.3f} ~ {result.proba.max():.3f}")
+
+
+if __name__ == "__main__":
+    main()
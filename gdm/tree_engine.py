@@ -0,0 +1,328 @@
+import json
+import time
+
+import numpy as np
+
+from .utils import cli_parser, sigmoid
+
+
+# =========================
+# XGBoost 树模型展平为数组
+# 所有树的节点按顺序拼接，left/right 为全局节点下标，叶子节点为 -1
+# 比较与 XGBoost 一致：float32 下 x < threshold 走左，缺失值按 default_left
+# =========================
+class FlatTreeEnsemble:
+    def __init__(self, feature, threshold, left, right, default_left, value, cover,
+                 roots, base_margin, num_features):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float32)
+        self.cover = np.asarray(cover, dtype=np.float32)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.base_margin = float(base_margin)
+        self.num_features = int(num_features)
+
+        self.is_leaf = self.left < 0
+        # 叶子节点指向自身，遍历时到达叶子后原地不动
+        # 走右子树时：下一节点 = _left + _delta
+        node_ids = np.arange(len(self.left), dtype=np.int32)
+        self._left = np.where(self.is_leaf, node_ids, self.left)
+        self._delta = np.where(self.is_leaf, node_ids, self.right) - self._left
+        self.max_depth = self._compute_max_depth()
+
+    @property
+    def num_trees(self):
+        return len(self.roots)
+
+    @property
+    def num_nodes(self):
+        return len(self.feature)
+
+    # =========================
+    # 从 xgboost.Booster 导出
+    # =========================
+    @classmethod
+    def from_booster(cls, booster):
+        model = json.loads(booster.save_raw("json"))
+        learner = model["learner"]
+        objective = learner["objective"]["name"]
+        if objective != "binary:logistic":
+            raise ValueError(f"暂不支持的目标函数：{objective}")
+
+        gbm = learner["gradient_booster"]
+        if gbm["name"] != "gbtree":
+            raise ValueError(f"暂不支持的 booster 类型：{gbm['name']}")
+
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+        base_margin = np.log(base_score / (1.0 - base_score))
+        num_features = int(learner["learner_model_param"]["num_feature"])
+
+        feature, threshold, left, right, default_left, value, cover, roots = ([] for _ in range(8))
+        offset = 0
+        for tree in gbm["model"]["trees"]:
+            lc = np.asarray(tree["left_children"], dtype=np.int64)
+            rc = np.asarray(tree["right_children"], dtype=np.int64)
+            leaf = lc < 0
+
+            roots.append(offset)
+            feature.append(np.where(leaf, 0, tree["split_indices"]))
+            threshold.append(np.where(leaf, 0.0, tree["split_conditions"]))
+            value.append(np.where(leaf, tree["split_conditions"], 0.0))
+            left.append(np.where(leaf, -1, lc + offset))
+            right.append(np.where(leaf, -1, rc + offset))
+            default_left.append(np.asarray(tree["default_left"], dtype=bool))
+            cover.append(tree["sum_hessian"])
+            offset += len(lc)
+
+        return cls(
+            feature=np.concatenate(feature),
+            threshold=np.concatenate(threshold),
+            left=np.concatenate(left),
+            right=np.concatenate(right),
+            default_left=np.concatenate(default_left),
+            value=np.concatenate(value),
+            cover=np.concatenate(cover),
+            roots=roots,
+            base_margin=base_margin,
+            num_features=num_features
+        )
+
+    def _compute_max_depth(self):
+        depth = 0
+        nodes = self.roots
+        while True:
+            nodes = nodes[~self.is_leaf[nodes]]
+            if len(nodes) == 0:
+                return depth
+            nodes = np.concatenate([self.left[nodes], self.right[nodes]])
+            depth += 1
+
+    # =========================
+    # 每行、每棵树到达的叶子节点（全局下标），形状 (n_rows, n_trees)
+    # roots 可只传部分树的根节点，只遍历这些树
+    # =========================
+    def apply(self, X, roots=None):
+        X = np.array(X, dtype=np.float32, ndmin=2)
+        n_rows, n_cols = X.shape
+        roots = self.roots if roots is None else np.asarray(roots, dtype=np.int32)
+
+        flat = X.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.int32) * n_cols)[:, None]
+        has_missing = np.isnan(flat).any()
+
+        nodes = np.broadcast_to(roots, (n_rows, len(roots))).copy()
+        for _ in range(self.max_depth):
+            x = flat.take(row_offset + self.feature.take(nodes))
+            go_right = x >= self.threshold.take(nodes)
+            if has_missing:
+                go_right = np.where(np.isnan(x), ~self.default_left.take(nodes), go_right)
+            nodes = self._left.take(nodes) + go_right * self._delta.take(nodes)
+        return nodes
+
+    def predict_margin(self, X, chunk_size=16384):
+        X = np.array(X, dtype=np.float32, ndmin=2)
+        margin = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), chunk_size):
+            leaves = self.apply(X[start:start + chunk_size])
+            margin[start:start + chunk_size] = self.value.take(leaves).sum(axis=1, dtype=np.float64)
+        return margin + self.base_margin
+
+    def predict_proba(self, X):
+        p = sigmoid(self.predict_margin(X))
+        return np.column_stack([1.0 - p, p])
+
+
+# =========================
+# 每个叶子到根的路径（what-if / PDP 等按 cover 加权的计算共用）
+# 返回 (叶子下标, path_node, path_right, path_ratio)，后三者形状 (叶子数, 最大深度)：
+#   path_node  路径上的分裂节点（由下至上，不足深度处为 -1）
+#   path_right 叶子在该节点的右子树中
+#   path_ratio cover(子) / cover(该节点)，不足深度处为 1
+# 叶子按全局下标排序，同一棵树的叶子连续
+# =========================
+def leaf_paths(ensemble):
+    n_nodes = ensemble.num_nodes
+    parent = np.full(n_nodes, -1, dtype=np.intp)
+    internal = np.flatnonzero(~ensemble.is_leaf)
+    parent[ensemble.left[internal]] = internal
+    parent[ensemble.right[internal]] = internal
+
+    leaves = np.flatnonzero(ensemble.is_leaf)
+    depth = max(1, ensemble.max_depth)
+    path_node = np.full((len(leaves), depth), -1, dtype=np.intp)
+    path_right = np.zeros((len(leaves), depth), dtype=bool)
+    path_ratio = np.ones((len(leaves), depth), dtype=np.float64)
+    cover = ensemble.cover.astype(np.float64)
+    for i, leaf in enumerate(leaves):
+        child, d = leaf, 0
+        while parent[child] >= 0:
+            node = parent[child]
+            path_node[i, d] = node
+            path_right[i, d] = ensemble.right[node] == child
+            path_ratio[i, d] = cover[child] / cover[node] if cover[node] > 0 else 0.0
+            child, d = node, d + 1
+    return leaves, path_node, path_right, path_ratio
+
+
+# =========================
+# pipeline 前处理的数组版本（SimpleImputer / StandardScaler）
+# 按 pipeline 顺序保存为 ("fill", 值) / ("scale", 均值, 标准差)
+# =========================
+class FlatPreprocessor:
+    def __init__(self, ops=()):
+        self.ops = list(ops)
+
+    @classmethod
+    def from_steps(cls, steps):
+        ops = []
+        for step_obj in steps:
+            name = type(step_obj).__name__
+            if name == "SimpleImputer":
+                ops.append(("fill", np.asarray(step_obj.statistics_, dtype=float)))
+            elif name == "StandardScaler":
+                mean = step_obj.mean_ if step_obj.with_mean else 0.0
+                scale = step_obj.scale_ if step_obj.with_std else 1.0
+                ops.append(("scale", np.asarray(mean, dtype=float), np.asarray(scale, dtype=float)))
+            else:
+                raise TypeError(f"无法展平的前处理步骤：{name}")
+        return cls(ops)
+
+    def transform(self, X):
+        x = np.array(X, dtype=float, ndmin=2)
+        for op in self.ops:
+            if op[0] == "fill":
+                missing = np.isnan(x)
+                if missing.any():
+                    x[missing] = np.broadcast_to(op[1], x.shape)[missing]
+            else:
+                x -= op[1]
+                x /= op[2]
+        return x
+
+
+# =========================
+# 前处理 + 展平树模型，接口与 pipeline.predict_proba 一致
+# =========================
+class FlatTreeModel:
+    def __init__(self, preprocessor, ensemble):
+        self.preprocessor = preprocessor
+        self.ensemble = ensemble
+
+    @classmethod
+    def from_pipeline(cls, model):
+        from .preprocess import split_pipeline
+
+        steps, base_model = split_pipeline(model)
+        booster = base_model.get_booster() if hasattr(base_model, "get_booster") else base_model
+        return cls(FlatPreprocessor.from_steps(steps), FlatTreeEnsemble.from_booster(booster))
+
+    def transform(self, X):
+        return self.preprocessor.transform(X)
+
+    def predict_proba(self, X):
+        return self.ensemble.predict_proba(self.transform(X))
+
+    # =========================
+    # 保存 / 读取为 npz（前处理参数与树数组放在同一文件）
+    # =========================
+    def save(self, path):
+        arrays = {"pre_kinds": np.array([op[0] for op in self.preprocessor.ops])}
+        for i, op in enumerate(self.preprocessor.ops):
+            for j, values in enumerate(op[1:]):
+                arrays[f"pre_{i}_{j}"] = values
+        for name in ("feature", "threshold", "left", "right", "default_left", "value", "cover", "roots"):
+            arrays[name] = getattr(self.ensemble, name)
+        np.savez(path, base_margin=self.ensemble.base_margin,
+                 num_features=self.ensemble.num_features, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            ops = []
+            for i, kind in enumerate(data["pre_kinds"]):
+                n_values = 1 if kind == "fill" else 2
+                ops.append((str(kind), *[data[f"pre_{i}_{j}"] for j in range(n_values)]))
+            ensemble = FlatTreeEnsemble(**{
+                k: data[k] for k in data.files if k != "pre_kinds" and not k.startswith("pre_")
+            })
+        return cls(FlatPreprocessor(ops), ensemble)
+
+
+# =========================
+# 与原始模型 predict_proba 对比
+# =========================
+def check_equivalence(model, flat_model, X, atol=1e-6):
+    expected = model.predict_proba(X)[:, 1]
+    actual = flat_model.predict_proba(X)[:, 1]
+    max_abs_diff = float(np.max(np.abs(expected - actual))) if len(X) else 0.0
+    return max_abs_diff <= atol, max_abs_diff
+
+
+def _time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(argv=None):
+    from .cohort import load_training_cohort
+    from .predictor import GDMPredictor
+
+    parser = cli_parser(
+        "tree_engine",
+        "校验展平树模型与 pickle 中 XGBoost 模型的一致性，并对比推理耗时。",
+        seed=True
+    )
+    parser.add_argument("--rows", type=int, default=100000, help="合成批量数据行数")
+    parser.add_argument("--atol", type=float, default=1e-6)
+    parser.add_argument("--export", help="导出展平模型到 npz 文件（之后可用 FlatTreeModel.load 读取，无需 xgboost）")
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec)
+    flat_model = FlatTreeModel.from_pipeline(predictor.model)
+    n_features = len(predictor.feature_names)
+
+    rng = np.random.default_rng(args.seed)
+    X = rng.normal(0.0, 1.5, size=(args.rows, n_features))
+    X[rng.random(X.shape) < 0.01] = np.nan
+    cohort = load_training_cohort(predictor.feature_names)
+    if cohort is not None:
+        X = np.vstack([cohort.X, X])
+
+    print(f"模型文件：{predictor.model_path}")
+    print(f"树数量：{flat_model.ensemble.num_trees}，节点数：{flat_model.ensemble.num_nodes}，"
+          f"最大深度：{flat_model.ensemble.max_depth}")
+
+    # 整个 pipeline 对比；再直接对比最终模型（输入保留缺失值，检验 default_left）
+    ok, max_abs_diff = check_equivalence(predictor.model, flat_model, X, args.atol)
+    print(f"pipeline：{len(X)} 行最大概率误差 {max_abs_diff:.3e}（容差 {args.atol:g}）-> {'通过' if ok else '失败'}")
+
+    X_base = predictor.transform(np.nan_to_num(X))
+    X_base[rng.random(X_base.shape) < 0.05] = np.nan
+    ok_base, max_abs_diff = check_equivalence(predictor.base_model, flat_model.ensemble, X_base, args.atol)
+    print(f"含缺失值：{len(X)} 行最大概率误差 {max_abs_diff:.3e}（容差 {args.atol:g}）-> {'通过' if ok_base else '失败'}")
+    ok = ok and ok_base
+
+    if args.export:
+        flat_model.save(args.export)
+        print(f"已导出：{args.export}")
+
+    row = X[:1]
+    t_xgb = _time_per_call(lambda: predictor.model.predict_proba(row), 200)
+    t_flat = _time_per_call(lambda: flat_model.predict_proba(row), 200)
+    print(f"单行延迟：xgboost {t_xgb * 1e6:.0f} µs，numpy {t_flat * 1e6:.0f} µs")
+
+    t_xgb = _time_per_call(lambda: predictor.model.predict_proba(X), 3)
+    t_flat = _time_per_call(lambda: flat_model.predict_proba(X), 3)
+    print(f"批量吞吐（{len(X)} 行）：xgboost {len(X) / t_xgb:.0f} 行/秒，numpy {len(X) / t_flat:.0f} 行/秒")
+
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import time
+
+import numpy as np
+
+
+# =========================
+# log-odds <-> 概率（标量或数组）
+# =========================
+def sigmoid(margin):
+    return 1.0 / (1.0 + np.exp(-margin))
+
+
+def logit(p):
+    return np.log(p / (1.0 - p))
+
+
+# =========================
+# 命令行测速工具（python -m gdm.<模块>）
+# median_ms：重复调用 fn，返回耗时中位数（毫秒）
+# cli_parser：公共参数 --spec（模型配置），按需加 --repeat（重复次数）与 --seed（随机种子）
+# =========================
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1e3
+
+
+def cli_parser(module, description, spec="14vars", spec_help=None, repeat=None, seed=False):
+    from .config import MODEL_SPECS
+
+    parser = argparse.ArgumentParser(prog=f"python -m gdm.{module}", description=description)
+    parser.add_argument("--spec", default=spec, choices=sorted(MODEL_SPECS), help=spec_help)
+    if repeat is not None:
+        parser.add_argument("--repeat", type=int, default=repeat)
+    if seed:
+        parser.add_argument("--seed", type=int, default=0)
+    return parser
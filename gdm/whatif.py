@@ -0,0 +1,306 @@
+from dataclasses import dataclass, field
+from math import factorial
+
+import numpy as np
+
+from .tree_engine import leaf_paths
+from .utils import cli_parser, median_ms, sigmoid
+
+
+# =========================
+# 单个患者的 what-if 状态
+# 缓存每棵树到达的叶子、每棵树的 margin 贡献与 SHAP 贡献，
+# 改动一个变量时只重算在该变量上分裂的树
+# x_raw：前处理前的模型输入；x：前处理后（送入树模型）
+# =========================
+@dataclass
+class WhatIfState:
+    x_raw: np.ndarray
+    x: np.ndarray
+    leaves: np.ndarray
+    tree_values: np.ndarray
+    tree_shap: np.ndarray
+    base_value: float
+    base_margin: float
+    threshold: float
+    trees_evaluated: int = 0
+    history: list = field(default_factory=list)
+
+    @property
+    def margin(self):
+        return self.base_margin + float(self.tree_values.sum())
+
+    @property
+    def proba(self):
+        return float(sigmoid(self.margin))
+
+    @property
+    def label(self):
+        return int(self.proba >= self.threshold)
+
+    @property
+    def shap_values(self):
+        return self.tree_shap.sum(axis=0)
+
+
+# =========================
+# what-if 引擎
+# SHAP 按树线性可加：总 SHAP = 各树 TreeSHAP 之和。
+# 每棵树的 TreeSHAP（path-dependent，与 xgboost pred_contribs 相同的定义）
+# 按该树用到的变量子集直接枚举：
+#   E_S = Σ_叶子 value · Π_路径节点 (变量在 S 中 ? 1[x 走向该叶子] : cover(子) / cover(父))
+#   φ_k = Σ_S w(|S|) · (E_{S∪k} − E_S)
+# 每棵树最多 max_tree_features 个不同变量（深度 2 的树不超过 3 个）；
+# 不足的位置当作不影响结果的“空变量”，所有树共用一个系数矩阵，整体向量化。
+# E_∅ 与输入无关，其和加上 base_margin 即基准值（与 pred_contribs 偏置项一致）。
+# =========================
+class WhatIfEngine:
+    def __init__(self, ensemble, preprocessor, threshold, max_tree_features=10):
+        self.ensemble = ensemble
+        self.preprocessor = preprocessor
+        self.threshold = float(threshold)
+
+        n_nodes = ensemble.num_nodes
+        n_trees = ensemble.num_trees
+        roots = ensemble.roots.astype(np.intp)
+        tree_of_node = np.repeat(np.arange(n_trees), np.diff(np.append(roots, n_nodes)))
+        internal = np.flatnonzero(~ensemble.is_leaf)
+
+        # 每棵树用到的变量 -> 树内局部编号
+        self.tree_features = []
+        local_index = np.full(n_nodes, -1, dtype=np.intp)
+        for t in range(n_trees):
+            nodes = internal[tree_of_node[internal] == t]
+            features = np.unique(ensemble.feature[nodes])
+            self.tree_features.append(features)
+            local_index[nodes] = np.searchsorted(features, ensemble.feature[nodes])
+        self.num_local = max(1, max(len(f) for f in self.tree_features))
+        if self.num_local > max_tree_features:
+            raise ValueError(f"单棵树用到 {self.num_local} 个变量，超过上限 {max_tree_features}。")
+
+        # 叶子到根的路径（按树顺序排列，同一棵树的叶子连续）
+        leaves, self.path_node, self.path_right, self.path_ratio = leaf_paths(ensemble)
+        self.leaf_nodes = leaves
+        self.leaf_tree = tree_of_node[leaves]
+        self.leaf_value = ensemble.value[leaves].astype(np.float64)
+        self.path_valid = self.path_node >= 0
+        self._path_node_safe = np.where(self.path_valid, self.path_node, 0)
+        self.path_local = np.where(self.path_valid, local_index[self._path_node_safe], 0)
+
+        # 子集掩码与 Shapley 系数：phi_local = coef @ E
+        k = self.num_local
+        masks = np.arange(2 ** k)
+        self.mask_bits = ((masks[:, None] >> np.arange(k)) & 1).astype(bool)
+        sizes = self.mask_bits.sum(axis=1)
+        weight = np.array([factorial(s) * factorial(k - s - 1) / factorial(k) for s in range(k)] + [0.0])
+        self.coef = np.where(self.mask_bits.T, weight[np.maximum(sizes - 1, 0)], -weight[sizes])
+
+        # 变量 -> 在其上分裂的树；每棵树的叶子区间
+        self.trees_by_feature = [
+            np.array([t for t, f in enumerate(self.tree_features) if j in f], dtype=np.intp)
+            for j in range(ensemble.num_features)
+        ]
+        self.tree_leaf_start = np.searchsorted(self.leaf_tree, np.arange(n_trees))
+        self.tree_leaf_end = np.searchsorted(self.leaf_tree, np.arange(n_trees), side="right")
+        self._tree_feature_matrix = np.full((n_trees, k), -1, dtype=np.intp)
+        for t, f in enumerate(self.tree_features):
+            self._tree_feature_matrix[t, :len(f)] = f
+
+        self._leaf_groups = {}
+        expected_empty = self._expected_values(np.zeros(ensemble.num_features, dtype=np.float32),
+                                               np.arange(n_trees))[0]
+        self.base_value = ensemble.base_margin + float(expected_empty.sum())
+
+    @classmethod
+    def from_pipeline(cls, model, threshold):
+        from .tree_engine import FlatTreeModel
+
+        flat_model = FlatTreeModel.from_pipeline(model)
+        return cls(flat_model.ensemble, flat_model.preprocessor, threshold)
+
+    @property
+    def num_trees(self):
+        return self.ensemble.num_trees
+
+    # 指定树的叶子下标与每棵树在其中的起点；按树集合缓存（每个变量对应的树集合只算一次）
+    def _tree_leaves(self, trees):
+        key = trees.tobytes()
+        cached = self._leaf_groups.get(key)
+        if cached is None:
+            counts = self.tree_leaf_end[trees] - self.tree_leaf_start[trees]
+            leaf_index = np.concatenate([np.arange(self.tree_leaf_start[t], self.tree_leaf_end[t]) for t in trees])
+            cached = (leaf_index, np.concatenate([[0], np.cumsum(counts)[:-1]]))
+            if len(self._leaf_groups) < 256:
+                self._leaf_groups[key] = cached
+        return cached
+
+    # E[mask, tree]：每个子集下、指定树的期望输出
+    def _expected_values(self, x, trees):
+        leaf_index, starts = self._tree_leaves(trees)
+        nodes = self._path_node_safe[leaf_index]
+        xv = x[self.ensemble.feature[nodes]]
+        go_right = xv >= self.ensemble.threshold[nodes]
+        missing = np.isnan(xv)
+        if missing.any():
+            go_right = np.where(missing, ~self.ensemble.default_left[nodes], go_right)
+        follow = (go_right == self.path_right[leaf_index]).astype(np.float64)
+
+        valid = self.path_valid[leaf_index]
+        in_subset = self.mask_bits[:, self.path_local[leaf_index]]
+        factor = np.where(in_subset, follow, self.path_ratio[leaf_index])
+        factor = np.where(valid, factor, 1.0)
+        leaf_weight = factor.prod(axis=2) * self.leaf_value[leaf_index]
+        return np.add.reduceat(leaf_weight, starts, axis=1)
+
+    def _evaluate_trees(self, state, trees):
+        if len(trees) == 0:
+            return
+        state.leaves[trees] = self.ensemble.apply(state.x, roots=self.ensemble.roots[trees])[0]
+        state.tree_values[trees] = self.ensemble.value[state.leaves[trees]]
+
+        phi_local = (self.coef @ self._expected_values(state.x, trees)).T
+        features = self._tree_feature_matrix[trees]
+        rows = np.repeat(np.arange(len(trees)), features.shape[1])
+        keep = features.ravel() >= 0
+        tree_shap = np.zeros((len(trees), self.ensemble.num_features))
+        tree_shap[rows[keep], features.ravel()[keep]] = phi_local.ravel()[keep]
+        state.tree_shap[trees] = tree_shap
+        state.trees_evaluated += len(trees)
+
+    # =========================
+    # 新患者：所有树完整计算一次
+    # =========================
+    def start(self, user_input):
+        x_raw = np.array(user_input, dtype=float).reshape(-1)
+        x = self.preprocessor.transform(x_raw.reshape(1, -1))[0].astype(np.float32)
+        n_trees = self.num_trees
+        state = WhatIfState(
+            x_raw=x_raw,
+            x=x,
+            leaves=np.zeros(n_trees, dtype=np.intp),
+            tree_values=np.zeros(n_trees, dtype=np.float64),
+            tree_shap=np.zeros((n_trees, self.ensemble.num_features)),
+            base_value=self.base_value,
+            base_margin=self.ensemble.base_margin,
+            threshold=self.threshold
+        )
+        self._evaluate_trees(state, np.arange(n_trees))
+        return state
+
+    # =========================
+    # 改动一个变量（前处理前的值）：只重算在该变量上分裂的树
+    # 前处理（imputer / scaler）按列独立，只影响这一列
+    # =========================
+    def update(self, state, feature, value):
+        j = int(feature)
+        state.x_raw[j] = float(value)
+        x_new = self.preprocessor.transform(state.x_raw.reshape(1, -1))[0].astype(np.float32)
+        changed = np.flatnonzero(~((x_new == state.x) | (np.isnan(x_new) & np.isnan(state.x))))
+        state.x = x_new
+
+        trees = np.unique(np.concatenate([self.trees_by_feature[c] for c in changed])) if len(changed) else []
+        before = state.trees_evaluated
+        self._evaluate_trees(state, np.asarray(trees, dtype=np.intp))
+        state.history.append((j, float(value), state.trees_evaluated - before))
+        return state
+
+    # =========================
+    # 页面调用：与上一次状态对比，逐个更新变化的变量；
+    # 没有上一次状态或变化过多时完整重算
+    # =========================
+    def evaluate(self, user_input, previous=None, max_changes=None):
+        x_raw = np.array(user_input, dtype=float).reshape(-1)
+        if previous is None or previous.x_raw.shape != x_raw.shape:
+            return self.start(x_raw)
+
+        same = (x_raw == previous.x_raw) | (np.isnan(x_raw) & np.isnan(previous.x_raw))
+        changed = np.flatnonzero(~same)
+        if len(changed) > (max_changes if max_changes is not None else len(x_raw) // 2):
+            return self.start(x_raw)
+
+        state = WhatIfState(
+            x_raw=previous.x_raw.copy(),
+            x=previous.x.copy(),
+            leaves=previous.leaves.copy(),
+            tree_values=previous.tree_values.copy(),
+            tree_shap=previous.tree_shap.copy(),
+            base_value=previous.base_value,
+            base_margin=previous.base_margin,
+            threshold=previous.threshold
+        )
+        for j in changed:
+            self.update(state, j, x_raw[j])
+        return state
+
+
+def main(argv=None):
+    from .explainers import native_contributions
+    from .predictor import GDMPredictor
+
+    parser = cli_parser(
+        "whatif",
+        "what-if 增量重算：校验与完整计算（xgboost 原生）一致，并对比单变量改动时的耗时。",
+        repeat=200, seed=True
+    )
+    parser.add_argument("--patients", type=int, default=50)
+    parser.add_argument("--atol", type=float, default=1e-5)
+    args = parser.parse_args(argv)
+
+    predictor = GDMPredictor.from_spec(args.spec, cache=None, explain_backend="native")
+    predictor.booster.set_param({"nthread": 1})
+    engine = WhatIfEngine.from_pipeline(predictor.model, predictor.threshold)
+    n_features = len(predictor.feature_names)
+
+    print(f"模型文件：{predictor.model_path}；{engine.num_trees} 棵树，每棵树最多 {engine.num_local} 个变量")
+    print("在各变量上分裂的树数：" + "，".join(
+        f"{name} {len(trees)}" for name, trees in zip(predictor.feature_names, engine.trees_by_feature)))
+
+    # 一致性：随机患者 + 随机单变量改动，与完整计算对比
+    rng = np.random.default_rng(args.seed)
+    X = predictor.preprocess_steps[-1].inverse_transform(rng.normal(0.0, 1.0, size=(args.patients, n_features))) \
+        if predictor.preprocess_steps else rng.normal(0.0, 1.0, size=(args.patients, n_features))
+    max_shap, max_proba = 0.0, 0.0
+    for row in X:
+        state = engine.start(row)
+        for _ in range(5):
+            j = rng.integers(n_features)
+            row = row.copy()
+            row[j] = row[j] + rng.normal(0.0, 1.0) * max(abs(row[j]), 1.0) * 0.3
+            engine.update(state, j, row[j])
+
+            full = predictor.transform(row.reshape(1, -1))
+            values, base_values = native_contributions(predictor.booster, full)
+            proba = predictor.model.predict_proba(row.reshape(1, -1))[0, 1]
+            max_shap = max(max_shap, float(np.max(np.abs(state.shap_values - values[0]))))
+            max_shap = max(max_shap, abs(state.base_value - float(base_values[0])))
+            max_proba = max(max_proba, abs(state.proba - proba))
+    ok = max_shap <= args.atol and max_proba <= args.atol
+    print(f"与 xgboost 完整计算对比（{args.patients} 位患者 x 5 次改动）：SHAP / 基准值最大误差 {max_shap:.2e}，"
+          f"概率最大误差 {max_proba:.2e} -> {'通过' if ok else '失败'}")
+
+    # 耗时：单变量改动后 概率 + SHAP
+    row = X[0].copy()
+    state = engine.start(row)
+
+    def full_xgboost():
+        x = predictor.transform(row.reshape(1, -1))
+        predictor.base_model.predict_proba(x)
+        native_contributions(predictor.booster, x)
+
+    t_full = median_ms(full_xgboost, args.repeat) * 1e3
+    t_start = median_ms(lambda: engine.start(row), args.repeat) * 1e3
+    print(f"完整计算：xgboost predict_proba + pred_contribs {t_full:.0f} µs；what-if 引擎完整计算 {t_start:.0f} µs")
+    for j, name in enumerate(predictor.feature_names):
+        values = row[j] + rng.normal(0.0, 1.0, size=args.repeat) * max(abs(row[j]), 1.0) * 0.3
+        it = iter(values)
+        t_update = median_ms(lambda: engine.update(state, j, next(it)), args.repeat) * 1e3
+        print(f"  改动 {name:<8}：重算 {len(engine.trees_by_feature[j]):>3}/{engine.num_trees} 棵树，"
+              f"{t_update:7.0f} µs（相对 xgboost 完整计算 {t_full / t_update:5.1f}x，"
+              f"相对引擎完整计算 {t_start / t_update:5.1f}x）")
+
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,480 @@
+import atexit
+import itertools
+import multiprocessing as mp
+import multiprocessing.spawn as mp_spawn
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from .batch_explain import SharedArray
+from .cache import freeze_explanation
+from .config import WORKER_MAX_BATCH, WORKER_POOL_SIZE, WORKER_RING_SLOTS, WORKER_TIMEOUT
+from .predictor import Explanation, Prediction
+from .utils import cli_parser
+
+
+# =========================
+# 评分进程池
+# 推理与 SHAP 都会长时间占用 GIL，在 streamlit 服务进程里算，一个会话的解释会拖慢所有会话的页面更新。
+# 这里预先启动若干评分进程，每个进程只加载一次模型；页面进程只负责控件与图表：
+#   - 请求环：页面各会话的线程写入 [请求号, 操作, 模型输入（前处理前）]，评分进程读取
+#   - 结果环：评分进程写入 [请求号, 状态, 概率, 判定, 基准值, SHAP 值, 前处理后输入]，
+#     页面进程的一个分发线程读取，按请求号交给等待中的 Future
+# 两个环都是共享内存中的定长槽位（float64 行），读写位置也在共享内存中，
+# 用信号量计数（空槽 / 待读），不经过 pickle 与管道
+# 评分进程每次取出环中已有的请求（最多 WORKER_MAX_BATCH 条）合并为一次 predict_proba / contributions
+# =========================
+OP_STOP = -1
+OP_PREDICT = 0
+OP_EXPLAIN = 1
+
+
+class SharedRing:
+    def __init__(self, ctx, slots, width):
+        self.slots = SharedArray((slots, width))
+        # 写入位置 head / 读取位置 tail（只增不减，对槽位数取模）
+        self.counters = SharedArray((2,), np.int64)
+        self.counters.array[:] = 0
+        self.items = ctx.Semaphore(0)
+        self.spaces = ctx.Semaphore(slots)
+        self.put_lock = ctx.Lock()
+        self.get_lock = ctx.Lock()
+
+    # 传给评分进程：共享内存名称 + 信号量与锁
+    def handle(self):
+        return self.slots.spec(), self.counters.spec(), self.items, self.spaces, self.put_lock, self.get_lock
+
+    @classmethod
+    def attach(cls, handle):
+        ring = cls.__new__(cls)
+        slots_spec, counters_spec, ring.items, ring.spaces, ring.put_lock, ring.get_lock = handle
+        ring.slots = SharedArray.attach(slots_spec)
+        ring.counters = SharedArray.attach(counters_spec)
+        return ring
+
+    @property
+    def capacity(self):
+        return self.slots.shape[0]
+
+    def put(self, row, timeout=None):
+        if not self.spaces.acquire(timeout=timeout):
+            raise TimeoutError(f"共享内存环已满（{self.capacity} 个槽位）")
+        with self.put_lock:
+            head = int(self.counters.array[0])
+            self.slots.array[head % self.capacity] = row
+            self.counters.array[0] = head + 1
+        self.items.release()
+
+    # 没有待读的行时返回 None（block=False 或超时）
+    def get(self, block=True, timeout=None):
+        if not self.items.acquire(block, timeout):
+            return None
+        with self.get_lock:
+            tail = int(self.counters.array[1])
+            row = self.slots.array[tail % self.capacity].copy()
+            self.counters.array[1] = tail + 1
+        self.spaces.release()
+        return row
+
+    def close(self):
+        self.slots.close()
+        self.counters.close()
+
+
+# =========================
+# 评分进程
+# =========================
+def _respond(predictor, batch, responses):
+    p = len(predictor.feature_names)
+    out = np.zeros((len(batch), responses.slots.shape[1]))
+    out[:, 0] = batch[:, 0]
+    X = batch[:, 2:]
+    try:
+        out[:, 2], out[:, 3] = predictor.predict_batch(X)
+        explain = batch[:, 1] == OP_EXPLAIN
+        if explain.any():
+            input_data = predictor.transform(X[explain])
+            values, base_values, _ = predictor.contributions(input_data)
+            out[explain, 4] = np.asarray(base_values, dtype=float).reshape(-1)
+            out[explain, 5:5 + p] = values
+            out[explain, 5 + p:] = input_data
+    except Exception:
+        traceback.print_exc()
+        out[:, 1] = 1
+    for row in out:
+        responses.put(row)
+
+
+def _worker_main(predictor_kwargs, request_handle, response_handle, max_batch, ready):
+    from .predictor import GDMPredictor
+
+    predictor = GDMPredictor(cache=None, **predictor_kwargs)
+    if predictor.booster is not None:
+        predictor.booster.set_param({"nthread": 1})
+    predictor.prepare_explainer()
+    requests = SharedRing.attach(request_handle)
+    responses = SharedRing.attach(response_handle)
+    ready.wait()
+
+    try:
+        while True:
+            rows = [requests.get()]
+            while len(rows) < max_batch:
+                row = requests.get(block=False)
+                if row is None:
+                    break
+                rows.append(row)
+            batch = np.vstack(rows)
+            stop = batch[:, 1] == OP_STOP
+            if (~stop).any():
+                _respond(predictor, batch[~stop], responses)
+            if stop.any():
+                # 多取到的结束标记放回，留给其他评分进程
+                for _ in range(int(stop.sum()) - 1):
+                    requests.put(batch[stop][0])
+                break
+    finally:
+        requests.close()
+        responses.close()
+
+
+# =========================
+# streamlit 把页面脚本作为 __main__ 运行，spawn 启动的子进程默认会按路径重新执行这个脚本。
+# 评分进程只需要导入 gdm：按进程名去掉评分进程启动参数中的 __main__ 脚本路径，
+# 不改动全局的 sys.modules["__main__"]（其他会话可能正在使用）。
+# python -m 运行的模块按模块名导入，保留不变（python -m gdm.worker_pool 时入口就在 __main__ 中）
+# =========================
+WORKER_NAME_PREFIX = "gdm-worker-"
+_get_preparation_data = mp_spawn.get_preparation_data
+
+
+def _preparation_data(name):
+    data = _get_preparation_data(name)
+    if name.startswith(WORKER_NAME_PREFIX):
+        data.pop("init_main_from_path", None)
+    return data
+
+
+mp_spawn.get_preparation_data = _preparation_data
+
+
+# =========================
+# 页面进程一侧：提交请求、等待结果
+# 接口与 GDMPredictor 的 predict / explain 相同，结果进入同一个预测缓存
+# =========================
+class WorkerPool:
+    def __init__(self, predictor, workers=WORKER_POOL_SIZE, slots=WORKER_RING_SLOTS, max_batch=WORKER_MAX_BATCH,
+                 timeout=WORKER_TIMEOUT, start_method="spawn"):
+        if workers < 1:
+            raise ValueError(f"评分进程数必须至少为 1：{workers}")
+        self.predictor = predictor
+        self.feature_names = predictor.feature_names
+        self.threshold = predictor.threshold
+        self.model_hash = predictor.model_hash
+        self.timeout = timeout
+        self.processes = []
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._monitor = None
+        self._closed = False
+        self.broken = None
+
+        p = len(self.feature_names)
+        ctx = mp.get_context(start_method)
+        self.requests = SharedRing(ctx, slots, 2 + p)
+        self.responses = SharedRing(ctx, slots, 5 + 2 * p)
+        predictor_kwargs = {
+            "model_path": predictor.model_path,
+            "metrics_path": predictor.metrics_path,
+            "feature_names": predictor.feature_names,
+            "threshold": predictor.threshold,
+            "explain_backend": predictor.explain_backend
+        }
+
+        start = time.perf_counter()
+        ready = ctx.Barrier(workers + 1)
+        args = (predictor_kwargs, self.requests.handle(), self.responses.handle(), max_batch, ready)
+        try:
+            for i in range(workers):
+                process = ctx.Process(target=_worker_main, args=args, name=f"{WORKER_NAME_PREFIX}{i}", daemon=True)
+                process.start()
+                self.processes.append(process)
+            ready.wait(timeout)
+        except Exception as e:
+            self.close()
+            raise RuntimeError(f"评分进程启动失败：{e!r}") from e
+        self.startup_seconds = time.perf_counter() - start
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name="gdm-worker-results", daemon=True)
+        self._dispatcher.start()
+        self._monitor = threading.Thread(target=self._watch, name="gdm-worker-monitor", daemon=True)
+        self._monitor.start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _dispatch(self):
+        while True:
+            row = self.responses.get(timeout=0.2)
+            if row is None:
+                if self._closed:
+                    break
+                continue
+            request_id = int(row[0])
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is not None:
+                future.set_result(row)
+
+    # =========================
+    # 任一评分进程退出（被杀、崩溃）时整个进程池作废：
+    # 等待中的请求立即报错，进程池从 get_scorer 的登记中移除，下次调用时重新启动；
+    # 环中未处理的请求随进程池一起丢弃
+    # =========================
+    def _watch(self):
+        ready = wait([process.sentinel for process in self.processes])
+        if self._closed:
+            return
+        dead = next(process for process in self.processes if process.sentinel in ready)
+        dead.join()
+        self.broken = f"评分进程 {dead.name} 意外退出（退出码 {dead.exitcode}）"
+        _discard_pool(self)
+        self.close()
+
+    def submit(self, op, user_input):
+        x = np.asarray(user_input, dtype=float).reshape(-1)
+        if len(x) != len(self.feature_names):
+            raise ValueError(f"输入变量数 {len(x)} 与模型变量数 {len(self.feature_names)} 不符")
+        request_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(self.broken or "评分进程池已关闭")
+            self._pending[request_id] = future
+        # 先登记再写入（结果可能在 put 返回前就被分发）；写入失败（环满超时）时撤销登记
+        try:
+            self.requests.put(np.concatenate([[request_id, op], x]), self.timeout)
+        except BaseException:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise
+        future.request_id = request_id
+        return future
+
+    def result(self, future):
+        try:
+            row = future.result(self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self._pending.pop(future.request_id, None)
+            raise TimeoutError(f"评分进程 {self.timeout:.0f} 秒内没有返回结果") from None
+        if row[1] != 0:
+            raise RuntimeError("评分进程计算失败（详见服务器日志）")
+        return row
+
+    def _cached(self, kind, user_input, compute):
+        key = self.predictor.cache_key(kind, user_input)
+        if key is not None:
+            cached = self.predictor.cache.get(key)
+            if cached is not None:
+                return cached
+        value = compute(self.result(self.submit(OP_EXPLAIN if kind == "explain" else OP_PREDICT, user_input)))
+        if key is not None:
+            self.predictor.cache.put(key, value)
+        return value
+
+    def predict(self, user_input):
+        return self._cached("predict", user_input, lambda row: Prediction(float(row[2]), int(row[3]), self.threshold))
+
+    # 多行判定（敏感性分析的网格等）：逐行写入请求环，评分进程按 WORKER_MAX_BATCH 合并计算
+    # 返回 (概率, 判定)，与 GDMPredictor.predict_batch 相同
+    def predict_batch(self, X):
+        X = np.asarray(X, dtype=float).reshape(-1, len(self.feature_names))
+        futures = [self.submit(OP_PREDICT, x) for x in X]
+        rows = np.array([self.result(future)[2:4] for future in futures]).reshape(-1, 2)
+        return rows[:, 0], rows[:, 1].astype(int)
+
+    def explain(self, user_input):
+        p = len(self.feature_names)
+        return self._cached("explain", user_input, lambda row: freeze_explanation(Explanation(
+            base_value=float(row[4]),
+            values=row[5:5 + p].copy(),
+            data=row[5 + p:].copy(),
+            feature_names=self.feature_names
+        )))
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError(self.broken or "评分进程池已关闭"))
+
+        # 有进程意外退出时，环上的锁可能由它持有，不再写入结束标记，直接结束其余进程
+        if self.broken is None:
+            stop = np.zeros(self.requests.slots.shape[1])
+            stop[1] = OP_STOP
+            for process in self.processes:
+                if process.is_alive():
+                    try:
+                        self.requests.put(stop, timeout=1.0)
+                    except TimeoutError:
+                        break
+        for process in self.processes:
+            process.join(5.0 if self.broken is None else 0.0)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        self.requests.close()
+        self.responses.close()
+
+
+# =========================
+# 页面调用入口：每个模型文件 + 阈值一个进程池，服务器进程内共用，退出时关闭
+# 模型文件被替换（哈希改变）或评分进程意外退出后，下次调用时重新启动
+# WORKER_POOL_SIZE 为 0 时返回预测器本身（在页面进程内计算）
+# =========================
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_scorer(predictor, workers=WORKER_POOL_SIZE):
+    if workers < 1:
+        return predictor
+    key = (str(predictor.model_path), predictor.threshold, tuple(predictor.feature_names))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and (pool.closed or pool.model_hash != predictor.model_hash):
+            pool.close()
+            pool = None
+        if pool is None:
+            pool = _pools[key] = WorkerPool(predictor, workers)
+        return pool
+
+
+def _discard_pool(pool):
+    with _pools_lock:
+        for key in [key for key, value in _pools.items() if value is pool]:
+            del _pools[key]
+
+
+@atexit.register
+def _close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+# =========================
+# 响应性演示
+# 若干会话线程各自连续提交 判定 + SHAP 解释；同时一个“页面线程”每 tick_ms 毫秒醒来，
+# 做一小段纯 Python 的渲染工作，记录比预定时刻晚了多少（即其他会话等待页面更新的时间）。
+# 对比在页面进程内计算与交给评分进程池两种方式
+# =========================
+def _heartbeat(stop, lags, tick_ms, work):
+    interval = tick_ms / 1e3
+    next_tick = time.perf_counter() + interval
+    while not stop.is_set():
+        time.sleep(max(next_tick - time.perf_counter(), 0.0))
+        lags.append(max(time.perf_counter() - next_tick, 0.0))
+        sum(i * i for i in range(work))
+        next_tick = max(next_tick + interval, time.perf_counter())
+
+
+def _session(scorer, rows, latencies):
+    for x in rows:
+        start = time.perf_counter()
+        scorer.predict(x)
+        scorer.explain(x)
+        latencies.append(time.perf_counter() - start)
+
+
+def run_demo(scorer, rows, sessions, tick_ms=5.0, work=2000):
+    stop = threading.Event()
+    lags, latencies = [], []
+    heartbeat = threading.Thread(target=_heartbeat, args=(stop, lags, tick_ms, work))
+    heartbeat.start()
+    time.sleep(0.2)
+    idle = len(lags)
+
+    threads = [
+        threading.Thread(target=_session, args=(scorer, rows[s::sessions], latencies))
+        for s in range(sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    stop.set()
+    heartbeat.join()
+
+    lags = np.array(lags[idle:]) * 1e3
+    latencies = np.array(latencies) * 1e3
+    return {
+        "throughput": len(latencies) / seconds,
+        "latency_p50": np.percentile(latencies, 50),
+        "latency_p99": np.percentile(latencies, 99),
+        "lag_p50": np.percentile(lags, 50),
+        "lag_p99": np.percentile(lags, 99),
+        "lag_max": lags.max(),
+        "ticks": len(lags)
+    }
+
+
+def main(argv=None):
+    from .cohort import synthetic_cohort
+    from .predictor import EXPLAIN_BACKENDS, GDMPredictor
+
+    parser = cli_parser(
+        "worker_pool",
+        "对比在页面进程内计算与交给评分进程池时，并发会话下页面线程的响应延迟。"
+    )
+    parser.add_argument("--explain-backend", default="auto", choices=EXPLAIN_BACKENDS)
+    parser.add_argument("--workers", type=int, default=max(WORKER_POOL_SIZE, 1))
+    parser.add_argument("--sessions", type=int, default=8, help="并发会话数")
+    parser.add_argument("--requests", type=int, default=400, help="所有会话合计的 判定 + 解释 次数")
+    parser.add_argument("--tick-ms", type=float, default=5.0, help="页面线程的唤醒间隔")
+    args = parser.parse_args(argv)
+
+    # 演示中每个请求的输入都不同，不使用预测缓存
+    predictor = GDMPredictor.from_spec(args.spec, cache=None, explain_backend=args.explain_backend)
+    predictor.prepare_explainer()
+    rows = synthetic_cohort(predictor, args.requests + 1, seed=0)
+    predictor.explain(rows[:1])
+
+    pool = WorkerPool(predictor, args.workers)
+    try:
+        # 两种方式结果一致
+        diff = max(
+            max(abs(pool.predict(x).proba - predictor.predict(x).proba),
+                np.abs(pool.explain(x).values - predictor.explain(x).values).max())
+            for x in rows[:20]
+        )
+        print(f"模型文件：{predictor.model_path}（解释后端：{predictor.explain_backend}）；"
+              f"{args.workers} 个评分进程，启动 {pool.startup_seconds:.2f} s；与页面进程内结果的最大差异 {diff:.1e}")
+        print(f"{args.sessions} 个会话并发，合计 {args.requests} 次 判定 + 解释；页面线程每 {args.tick_ms:g} ms 唤醒一次")
+        for name, scorer in (("页面进程内", predictor), ("评分进程池", pool)):
+            r = run_demo(scorer, rows[1:], args.sessions, args.tick_ms)
+            print(f"  {name}：{r['throughput']:6.0f} 次/s，请求 p50 {r['latency_p50']:6.2f} ms / "
+                  f"p99 {r['latency_p99']:6.2f} ms；页面线程延迟 p50 {r['lag_p50']:5.2f} ms / "
+                  f"p99 {r['lag_p99']:6.2f} ms / 最大 {r['lag_max']:6.2f} ms（{r['ticks']} 次唤醒）")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,22 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-import joblib
 import shap
 import matplotlib.pyplot as plt
 
+from gdm import GDMPredictor, FEATURE_NAMES_9VARS
+
 # 设置页面标题
 st.set_page_config(page_title="GDM 风险预测工具", layout="centered")
 st.title("🤰 GDM 妊娠糖尿病风险预测工具")
 st.markdown("本工具基于机器学习模型（XGBoost）预测个体是否患有 GDM。")
 
-# 加载模型
+# 加载预测器
 @st.cache_resource
-def load_model():
-    return joblib.load(r"E:/deck/GDM/分析用的数据及代码/网页/best_model_xgboost.pkl")
+def load_predictor():
+    return GDMPredictor(r"E:/deck/GDM/分析用的数据及代码/网页/best_model_xgboost.pkl", metrics_path=None, feature_names=FEATURE_NAMES_9VARS)
 
-model = load_model()
+predictor = load_predictor()
 
 # 加载特征名（中文列名对应你Excel的内容）
 feature_names = ['BMI', 'As', 'Cd', '低密度脂蛋白', '前白蛋白', '淋巴细胞百分比', '胆碱酯酶', '葡萄糖', '年龄']
@@ -34,7 +35,7 @@ user_input = get_input()
 
 # 预测逻辑
 if st.button("🔍 预测 GDM 风险"):
-    proba = model.predict_proba(user_input)[0][1]
+    proba = predictor.predict(user_input).proba
     threshold = 0.3
     pred = "阳性 (GDM)" if proba >= threshold else "阴性 (非GDM)"
 
@@ -45,8 +46,8 @@ if st.button("🔍 预测 GDM 风险"):
     st.markdown("---")
     st.markdown("🎯 **特征贡献力图（SHAP）**")
 
-    explainer = shap.Explainer(model.named_steps["clf"])
-    shap_values = explainer(user_input)
+    explanation = predictor.explain(user_input)
+    shap_values = explanation.to_shap()
 
     fig = shap.plots.force(shap_values[0], matplotlib=True, show=False)
     st.pyplot(fig)
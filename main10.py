@@ -1,16 +1,17 @@
 import streamlit as st
 import shap
-import joblib
 import numpy as np
 import matplotlib.pyplot as plt
 import streamlit.components.v1 as components
 
-# 加载模型
+from gdm import GDMPredictor, FEATURE_NAMES_9VARS
+
+# 加载预测器
 @st.cache_resource
-def load_model():
-    return joblib.load("best_model_xgboost.pkl")
+def load_predictor():
+    return GDMPredictor("best_model_xgboost.pkl", metrics_path=None, feature_names=FEATURE_NAMES_9VARS)
 
-model = load_model()
+predictor = load_predictor()
 
 # 特征名
 feature_names = ['BMI', 'As', 'Cd', '低密度脂蛋白', '前白蛋白', '淋巴细胞百分比', '胆碱酯酶', '葡萄糖', '年龄']
@@ -25,25 +26,17 @@ user_input = np.array([inputs])
 
 # 预测
 if st.button("🔍 预测 GDM 风险"):
-    proba = model.predict_proba(user_input)[0][1]
+    proba = predictor.predict(user_input).proba
     pred = "阳性 (GDM)" if proba >= 0.3 else "阴性 (非GDM)"
     st.markdown(f"### 🧪 预测结果：**{proba*100:.2f}%** GDM 概率")
     st.markdown(f"### 🩺 判定：**{pred}** （阈值：0.3）")
 
-    # 生成 SHAP 力图并嵌入 HTML
-    if hasattr(model, "named_steps") and "clf" in model.named_steps:
-        base_model = model.named_steps["clf"]
-        input_data = model.named_steps["scaler"].transform(user_input)
-    else:
-        base_model = model
-        input_data = user_input
-
-    explainer = shap.Explainer(base_model)
-    shap_values = explainer(input_data)
+    explanation = predictor.explain(user_input)
+    shap_values = explanation.to_shap()
 
     st.markdown("### 🎯 特征贡献力图（SHAP 力图）")
     force_html = shap.force_plot(
-        explainer.expected_value,
+        explanation.base_value,
         shap_values.values,
         feature_names=feature_names,
         matplotlib=False
@@ -1,20 +1,21 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-import joblib
 import shap
 
+from gdm import GDMPredictor, FEATURE_NAMES_9VARS_EN, shap_js
+
 # Set page title
 st.set_page_config(page_title="GDM Risk Prediction Tool", layout="centered")
 st.title("🤰 GDM Gestational Diabetes Mellitus Risk Prediction Tool")
 st.markdown("This tool uses a machine learning model (XGBoost) to predict whether an individual has GDM.")
 
-# Load model
+# Load predictor
 @st.cache_resource
-def load_model():
-    return joblib.load("best_model_xgboost.pkl")
+def load_predictor():
+    return GDMPredictor("best_model_xgboost.pkl", metrics_path=None, feature_names=FEATURE_NAMES_9VARS_EN)
 
-model = load_model()
+predictor = load_predictor()
 
 # Feature names
 feature_names = ['BMI', 'As', 'Cd', 'LDL', 'PA', 'LY%', 'ChE', 'Glucose', 'Age']
@@ -35,11 +36,7 @@ user_input = get_input()
 if st.button("🔍 Predict GDM Risk"):
     try:
         # Predict probability
-        if hasattr(model, "predict_proba"):
-            proba = model.predict_proba(user_input)[0][1]
-        else:
-            st.error("❌ The model does not support predict_proba().")
-            st.stop()
+        proba = predictor.predict(user_input).proba
 
         threshold = 0.3
         pred = "Positive (GDM)" if proba >= threshold else "Negative (Non-GDM)"
@@ -51,28 +48,20 @@ if st.button("🔍 Predict GDM Risk"):
         st.markdown("---")
         st.markdown("🎯 **Feature Contribution Plot (SHAP Force Plot)**")
 
-        # Extract classifier
-        if hasattr(model, "named_steps") and "clf" in model.named_steps:
-            base_model = model.named_steps["clf"]
-            input_data = model.named_steps["scaler"].transform(user_input)
-        else:
-            base_model = model
-            input_data = user_input
-
-        explainer = shap.Explainer(base_model)
-        shap_values = explainer(input_data)
+        explanation = predictor.explain(user_input)
+        shap_values = explanation.to_shap()
 
         # Generate force plot and adjust width
         force_plot = shap.force_plot(
-            explainer.expected_value,
+            explanation.base_value,
             shap_values.values[0],
-            input_data[0],
+            explanation.data,
             feature_names=feature_names,
             matplotlib=False
         )
 
         st.components.v1.html(
-            shap.getjs() + force_plot.html(),
+            shap_js() + force_plot.html(),
             height=300,  # Height
             width=700    # Width close to the input box width
         )
@@ -1,21 +1,22 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-import joblib
 import shap
 import matplotlib.pyplot as plt
 
+from gdm import GDMPredictor, FEATURE_NAMES_9VARS
+
 # 设置页面标题
 st.set_page_config(page_title="GDM 风险预测工具", layout="centered")
 st.title("🤰 GDM 妊娠糖尿病风险预测工具")
 st.markdown("本工具基于机器学习模型（XGBoost）预测个体是否患有 GDM。")
 
-# 加载模型
+# 加载预测器
 @st.cache_resource
-def load_model():
-    return joblib.load("best_model_xgboost.pkl")  # 添加 return
+def load_predictor():
+    return GDMPredictor("best_model_xgboost.pkl", metrics_path=None, feature_names=FEATURE_NAMES_9VARS)
 
-model = load_model()
+predictor = load_predictor()
 
 # 加载特征名（中文列名对应你Excel的内容）
 feature_names = ['BMI', 'As', 'Cd', '低密度脂蛋白', '前白蛋白', '淋巴细胞百分比', '胆碱酯酶', '葡萄糖', '年龄']
@@ -35,11 +36,7 @@ user_input = get_input()
 # 预测逻辑
 if st.button("🔍 预测 GDM 风险"):
     try:
-        if hasattr(model, "predict_proba"):
-            proba = model.predict_proba(user_input)[0][1]
-        else:
-            st.error("❌ 模型不支持概率预测（predict_proba）。")
-            st.stop()
+        proba = predictor.predict(user_input).proba
 
         threshold = 0.3
         pred = "阳性 (GDM)" if proba >= threshold else "阴性 (非GDM)"
@@ -51,8 +48,8 @@ if st.button("🔍 预测 GDM 风险"):
         st.markdown("---")
         st.markdown("🎯 **特征贡献力图（SHAP）**")
 
-        explainer = shap.Explainer(model)
-        shap_values = explainer(user_input)
+        explanation = predictor.explain(user_input)
+        shap_values = explanation.to_shap()
 
         fig, ax = plt.subplots()
         shap.plots.bar(shap_values[0], show=False)
@@ -1,21 +1,22 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-import joblib
 import shap
 import matplotlib.pyplot as plt
 
+from gdm import GDMPredictor, FEATURE_NAMES_9VARS
+
 # 设置页面标题
 st.set_page_config(page_title="GDM 风险预测工具", layout="centered")
 st.title("🤰 GDM 妊娠糖尿病风险预测工具")
 st.markdown("本工具基于机器学习模型（XGBoost）预测个体是否患有 GDM。")
 
-# 加载模型
+# 加载预测器
 @st.cache_resource
-def load_model():
-    return joblib.load("best_model_xgboost.pkl")  # 记得 return！
+def load_predictor():
+    return GDMPredictor("best_model_xgboost.pkl", metrics_path=None, feature_names=FEATURE_NAMES_9VARS)
 
-model = load_model()
+predictor = load_predictor()
 
 # 中文特征名（需与你模型训练时一致）
 feature_names = ['BMI', 'As', 'Cd', '低密度脂蛋白', '前白蛋白', '淋巴细胞百分比', '胆碱酯酶', '葡萄糖', '年龄']
@@ -36,11 +37,7 @@ user_input = get_input()
 if st.button("🔍 预测 GDM 风险"):
     try:
         # 预测概率
-        if hasattr(model, "predict_proba"):
-            proba = model.predict_proba(user_input)[0][1]
-        else:
-            st.error("❌ 模型不支持 predict_proba 方法。")
-            st.stop()
+        proba = predictor.predict(user_input).proba
 
         threshold = 0.3
         pred = "阳性 (GDM)" if proba >= threshold else "阴性 (非GDM)"
@@ -52,12 +49,8 @@ if st.button("🔍 预测 GDM 风险"):
         st.markdown("---")
         st.markdown("🎯 **特征贡献力图（SHAP）**")
 
-        # 提取 Pipeline 中的 xgb 模型
-        xgb_model = model.named_steps["clf"]
-
-        # 用 SHAP 解释模型（背景数据用单一样本也行）
-        explainer = shap.Explainer(xgb_model, user_input)
-        shap_values = explainer(user_input)
+        explanation = predictor.explain(user_input)
+        shap_values = explanation.to_shap()
 
         fig, ax = plt.subplots()
         shap.plots.bar(shap_values[0], show=False)
@@ -1,23 +1,20 @@
 import streamlit as st
 import numpy as np
-import joblib
-import shap
-import matplotlib.pyplot as plt
-import matplotlib
 
-matplotlib.use('Agg')  # 使用非交互后端，避免服务器绘图报错
+from gdm import GDMPredictor, FEATURE_NAMES_9VARS
+from gdm.mpl_render import shap_png
 
 # 设置页面
 st.set_page_config(page_title="GDM 风险预测工具", layout="centered")
 st.title("🤰 GDM 妊娠糖尿病风险预测工具")
 st.markdown("本工具基于机器学习模型（XGBoost）预测个体是否患有 GDM。")
 
-# 加载模型
+# 加载预测器
 @st.cache_resource
-def load_model():
-    return joblib.load("best_model_xgboost.pkl")
+def load_predictor():
+    return GDMPredictor("best_model_xgboost.pkl", metrics_path=None, feature_names=FEATURE_NAMES_9VARS)
 
-model = load_model()
+predictor = load_predictor()
 
 # 特征名
 feature_names = ['BMI', 'As', 'Cd', '低密度脂蛋白', '前白蛋白', '淋巴细胞百分比', '胆碱酯酶', '葡萄糖', '年龄']
@@ -37,20 +34,8 @@ user_input = get_input()
 # 预测并显示 SHAP 力图
 if st.button("🔍 预测 GDM 风险"):
     try:
-        # 若模型是管道（如有 scaler）
-        if hasattr(model, "named_steps") and "clf" in model.named_steps:
-            base_model = model.named_steps["clf"]
-            input_data = model.named_steps["scaler"].transform(user_input)
-        else:
-            base_model = model
-            input_data = user_input
-
         # 预测概率
-        if hasattr(model, "predict_proba"):
-            proba = model.predict_proba(user_input)[0][1]
-        else:
-            st.error("❌ 模型不支持 predict_proba。")
-            st.stop()
+        proba = predictor.predict(user_input).proba
 
         threshold = 0.3
         pred = "阳性 (GDM)" if proba >= threshold else "阴性 (非GDM)"
@@ -62,12 +47,8 @@ if st.button("🔍 预测 GDM 风险"):
         st.markdown("---")
         st.markdown("🎯 **特征贡献力图（SHAP Force Plot）**")
 
-        explainer = shap.Explainer(base_model)
-        shap_values = explainer(input_data)
-
-        fig = plt.figure()
-        shap.plots.force(shap_values[0], matplotlib=True, show=False)
-        st.pyplot(fig)
+        # matplotlib 渲染：Agg + 图对象池 + PNG 缓存（见 gdm/mpl_render.py）
+        st.image(shap_png(predictor, user_input, "force"))
 
         st.caption("🔴 红色特征推动预测为 GDM，🔵 蓝色特征推动预测为非 GDM。")
 
@@ -1,10 +1,11 @@
 import streamlit as st
 import numpy as np
-import joblib
 import shap
 import matplotlib.pyplot as plt
 import streamlit.components.v1 as components
 
+from gdm import GDMPredictor, FEATURE_NAMES_9VARS
+
 # 初始化 JS 绘图
 shap.initjs()
 
@@ -13,12 +14,12 @@ st.set_page_config(page_title="GDM 风险预测工具", layout="centered")
 st.title("🤰 GDM 妊娠糖尿病风险预测工具")
 st.markdown("本工具基于机器学习模型（XGBoost）预测个体是否患有 GDM。")
 
-# 加载模型
+# 加载预测器
 @st.cache_resource
-def load_model():
-    return joblib.load("best_model_xgboost.pkl")
+def load_predictor():
+    return GDMPredictor("best_model_xgboost.pkl", metrics_path=None, feature_names=FEATURE_NAMES_9VARS)
 
-model = load_model()
+predictor = load_predictor()
 
 # 特征名
 feature_names = ['BMI', 'As', 'Cd', '低密度脂蛋白', '前白蛋白', '淋巴细胞百分比', '胆碱酯酶', '葡萄糖', '年龄']
@@ -38,16 +39,8 @@ user_input = get_input()
 # 预测逻辑
 if st.button("🔍 预测 GDM 风险"):
     try:
-        # 是否为管道模型
-        if hasattr(model, "named_steps") and "clf" in model.named_steps:
-            base_model = model.named_steps["clf"]
-            input_data = model.named_steps["scaler"].transform(user_input)
-        else:
-            base_model = model
-            input_data = user_input
-
         # 预测
-        proba = model.predict_proba(user_input)[0][1]
+        proba = predictor.predict(user_input).proba
         threshold = 0.3
         pred = "阳性 (GDM)" if proba >= threshold else "阴性 (非GDM)"
 
@@ -58,8 +51,8 @@ if st.button("🔍 预测 GDM 风险"):
         st.markdown("---")
         st.markdown("🎯 **特征贡献力图（SHAP Force Plot）**")
 
-        explainer = shap.Explainer(base_model)
-        shap_values = explainer(input_data)
+        explanation = predictor.explain(user_input)
+        shap_values = explanation.to_shap()
 
         # 生成 HTML 力图
         force_plot_html = shap.plots.force(shap_values[0], feature_names=feature_names, matplotlib=False)
@@ -1,23 +1,20 @@
 import streamlit as st
 import numpy as np
-import joblib
-import shap
-import matplotlib.pyplot as plt
 
-# ✅ 重要：强制使用 matplotlib 后端
-shap.initjs()  # 可删除，因 matplotlib 不用 JS
+from gdm import GDMPredictor, FEATURE_NAMES_9VARS
+from gdm.mpl_render import shap_png
 
 # 页面设置
 st.set_page_config(page_title="GDM 风险预测工具", layout="centered")
 st.title("🤰 GDM 妊娠糖尿病风险预测工具")
 st.markdown("本工具基于机器学习模型（XGBoost）预测个体是否患有 GDM。")
 
-# 加载模型
+# 加载预测器
 @st.cache_resource
-def load_model():
-    return joblib.load("best_model_xgboost.pkl")
+def load_predictor():
+    return GDMPredictor("best_model_xgboost.pkl", metrics_path=None, feature_names=FEATURE_NAMES_9VARS)
 
-model = load_model()
+predictor = load_predictor()
 
 # 特征名
 feature_names = ['BMI', 'As', 'Cd', '低密度脂蛋白', '前白蛋白', '淋巴细胞百分比', '胆碱酯酶', '葡萄糖', '年龄']
@@ -37,33 +34,19 @@ user_input = get_input()
 # 预测逻辑
 if st.button("🔍 预测 GDM 风险"):
     try:
-        # 获取模型与输入
-        if hasattr(model, "named_steps") and "clf" in model.named_steps:
-            base_model = model.named_steps["clf"]
-            input_data = model.named_steps["scaler"].transform(user_input)
-        else:
-            base_model = model
-            input_data = user_input
-
         # 概率预测
-        proba = model.predict_proba(user_input)[0][1]
-        threshold = 0.3
-        pred = "阳性 (GDM)" if proba >= threshold else "阴性 (非GDM)"
+        prediction = predictor.predict(user_input)
+        pred = "阳性 (GDM)" if prediction.label == 1 else "阴性 (非GDM)"
 
-        st.markdown(f"### 🧪 预测结果：**{proba*100:.2f}%** GDM 概率")
-        st.markdown(f"### 🩺 判定：**{pred}** （阈值：0.3）")
+        st.markdown(f"### 🧪 预测结果：**{prediction.proba*100:.2f}%** GDM 概率")
+        st.markdown(f"### 🩺 判定：**{pred}** （阈值：{predictor.threshold:.2f}）")
 
         # SHAP force_plot 可视化（静态图）
         st.markdown("---")
         st.markdown("🎯 **特征贡献力图（SHAP 力图）**")
 
-        explainer = shap.Explainer(base_model)
-        shap_values = explainer(input_data)
-
-        # force_plot 生成 matplotlib 图像
-        shap.plots.force(shap_values[0], matplotlib=True, show=False)
-        fig = plt.gcf()
-        st.pyplot(fig)
+        # matplotlib 渲染：Agg + 图对象池 + PNG 缓存（见 gdm/mpl_render.py）
+        st.image(shap_png(predictor, user_input, "force"))
 
         st.caption("🔴 红色特征推动预测为 GDM，🔵 蓝色特征推动预测为非 GDM。")
 
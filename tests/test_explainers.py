@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from gdm.cohort import synthetic_cohort
+from gdm.config import MODEL_SPECS
+from gdm.explainers import native_contributions, native_interactions
+from gdm.predictor import GDMPredictor
+
+# SHAP 值按 float32 累加，与模型输出的误差在 1e-6 量级
+ATOL = 1e-4
+
+
+@pytest.fixture(scope="module", params=sorted(MODEL_SPECS))
+def predictor(request):
+    return GDMPredictor.from_spec(request.param, cache=None, explain_backend="native")
+
+
+# 前处理后的输入（合成数据 + 随机缺失）
+@pytest.fixture(scope="module")
+def input_data(predictor):
+    rng = np.random.default_rng(0)
+    X = synthetic_cohort(predictor, 300, seed=0)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    return predictor.transform(X)
+
+
+def _margin(predictor, input_data):
+    import xgboost as xgb
+
+    dmatrix = xgb.DMatrix(np.asarray(input_data, dtype=np.float32), feature_names=predictor.booster.feature_names)
+    return predictor.booster.predict(dmatrix, output_margin=True)
+
+
+# =========================
+# 可加性：贡献之和 + 基准值 = 模型输出（log-odds）
+# =========================
+def test_native_contributions_are_additive(predictor, input_data):
+    values, base_values = native_contributions(predictor.booster, input_data)
+
+    np.testing.assert_allclose(values.sum(axis=1) + base_values, _margin(predictor, input_data), rtol=0.0, atol=ATOL)
+
+
+def test_tree_explainer_contributions_are_additive(predictor, input_data):
+    values, base_value = predictor.tree_explainer().shap_values(input_data)
+
+    np.testing.assert_allclose(values.sum(axis=1) + base_value, _margin(predictor, input_data), rtol=0.0, atol=ATOL)
+
+
+def test_contributions_backend_matches_margin(predictor, input_data):
+    values, base_values, fallback_reason = predictor.contributions(input_data)
+
+    assert fallback_reason is None
+    np.testing.assert_allclose(values.sum(axis=1) + base_values, _margin(predictor, input_data), rtol=0.0, atol=ATOL)
+
+
+# =========================
+# 交互值：与 TreeExplainer 一致；对称；每行按列求和等于该变量的贡献；全部求和 + 基准值 = 模型输出
+# =========================
+def test_native_interactions_match_tree_explainer(predictor, input_data):
+    interactions, base_values = native_interactions(predictor.booster, input_data)
+    expected, expected_base = predictor.tree_explainer().shap_interaction_values(input_data)
+
+    np.testing.assert_allclose(interactions, expected, rtol=0.0, atol=ATOL)
+    np.testing.assert_allclose(base_values, expected_base, rtol=0.0, atol=ATOL)
+
+
+def test_native_interactions_sum_to_contributions(predictor, input_data):
+    interactions, base_values = native_interactions(predictor.booster, input_data)
+    values, _ = native_contributions(predictor.booster, input_data)
+
+    np.testing.assert_allclose(interactions, np.swapaxes(interactions, 1, 2), rtol=0.0, atol=ATOL)
+    np.testing.assert_allclose(interactions.sum(axis=2), values, rtol=0.0, atol=ATOL)
+    np.testing.assert_allclose(
+        interactions.sum(axis=(1, 2)) + base_values, _margin(predictor, input_data), rtol=0.0, atol=ATOL
+    )
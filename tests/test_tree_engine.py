@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from gdm.cohort import load_training_cohort, synthetic_cohort
+from gdm.config import MODEL_SPECS
+from gdm.predictor import GDMPredictor
+from gdm.quickscorer import QuickScorerModel
+from gdm.tree_engine import FlatTreeModel
+
+ATOL = 1e-6
+
+
+@pytest.fixture(scope="module", params=sorted(MODEL_SPECS))
+def predictor(request):
+    return GDMPredictor.from_spec(request.param, cache=None)
+
+
+# =========================
+# 合成数据（按 scaler 的均值 / 标准差）+ 随机缺失 + 整行缺失 + 真实训练数据（有时）
+# =========================
+@pytest.fixture(scope="module")
+def rows(predictor):
+    rng = np.random.default_rng(0)
+    X = synthetic_cohort(predictor, 2000, seed=0)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    X[:5] = np.nan
+    cohort = load_training_cohort(predictor.feature_names)
+    if cohort is not None:
+        X = np.vstack([X, cohort.X])
+    return X
+
+
+@pytest.mark.parametrize("engine", [FlatTreeModel, QuickScorerModel], ids=["flat", "quickscorer"])
+def test_predict_proba_matches_pipeline(predictor, rows, engine):
+    scorer = engine.from_pipeline(predictor.model)
+    expected = predictor.model.predict_proba(rows)
+    actual = scorer.predict_proba(rows)
+
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=0.0, atol=ATOL)
+
+
+@pytest.mark.parametrize("engine", [FlatTreeModel, QuickScorerModel], ids=["flat", "quickscorer"])
+def test_predict_proba_matches_pipeline_on_missing_values(predictor, rows, engine):
+    scorer = engine.from_pipeline(predictor.model)
+    missing = rows[np.isnan(rows).any(axis=1)]
+
+    assert len(missing) > 0
+    np.testing.assert_allclose(
+        scorer.predict_proba(missing), predictor.model.predict_proba(missing), rtol=0.0, atol=ATOL
+    )